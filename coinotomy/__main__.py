@@ -0,0 +1,19 @@
+import sys
+
+from coinotomy.utils import convert
+
+COMMANDS = {
+    'convert': convert.main,
+}
+
+
+def main(argv):
+    if not argv or argv[0] not in COMMANDS:
+        print("usage: python -m coinotomy {%s} ..." % ','.join(sorted(COMMANDS)))
+        return 2
+    COMMANDS[argv[0]](argv[1:])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,197 @@
+"""
+OHLCV bars, maintained while trades are appended.
+
+Every resolution is stored in its own file next to the trade file, for example
+kraken.btc_usd.1m.bars, as fixed width records:
+
+    start, open, high, low, close, volume, price * volume, number of trades
+
+A bar is written once a trade for a later bar arrives; the bar in progress is
+kept in memory. On startup it is rebuilt from the trades after the last
+written bar, so history isn't processed again; the first start reads all
+stored trades.
+
+Other processes can read the bars with read_bars(), which returns
+(start, open, high, low, close, volume, vwap, count) tuples.
+"""
+
+import bisect
+import math
+import os
+import os.path
+import struct
+
+from coinotomy.backend.filepool import POOL
+
+# (name, seconds)
+RESOLUTIONS = (('1m', 60), ('5m', 5*60), ('1h', 60*60), ('1d', 24*60*60))
+
+BAR = struct.Struct(b"<dddddddQ")
+
+
+def bar_filename(name, resolution_name):
+    return os.path.expandvars(name) + '.' + resolution_name + '.bars'
+
+
+def read_bars(name, resolution_name, ts_from=None, ts_to=None):
+    """
+    return the written bars of a symbol with ts_from <= start < ts_to
+    """
+    return _select(_read_file(bar_filename(name, resolution_name)), ts_from, ts_to)
+
+
+def _read_file(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, 'rb') as fd:
+        data = fd.read()
+    data = data[:len(data) - len(data) % BAR.size]
+    return [_public(bar) for bar in BAR.iter_unpack(data)]
+
+
+def _public(bar):
+    start, o, h, l, c, v, pv, n = bar
+    return start, o, h, l, c, v, pv / v if v else c, n
+
+
+def _select(bars, ts_from, ts_to):
+    starts = [bar[0] for bar in bars]
+    lo = 0 if ts_from is None else bisect.bisect_left(starts, ts_from)
+    hi = len(bars) if ts_to is None else bisect.bisect_left(starts, ts_to)
+    return bars[lo:hi]
+
+
+class CandleFile(object):
+    """
+    Bars of a single resolution.
+    """
+
+    def __init__(self, filename, resolution):
+        self.filename = filename
+        self.resolution = resolution
+        self.bar = None  # the bar in progress, as a list
+        self.late = 0  # trades for bars that were already written, ignored
+
+        # the start of the last written bar
+        self.last_start = None
+        if os.path.exists(filename):
+            size = os.path.getsize(filename)
+            if size % BAR.size:
+                os.truncate(filename, size - size % BAR.size)  # torn write
+            if size >= BAR.size:
+                with open(filename, 'rb') as fd:
+                    fd.seek((size // BAR.size - 1) * BAR.size)
+                    self.last_start = BAR.unpack(fd.read(BAR.size))[0]
+
+    def resume_from(self):
+        """
+        return the timestamp from which trades must be replayed to rebuild the bar in progress
+        """
+        return None if self.last_start is None else self.last_start + self.resolution
+
+    def add(self, timestamp, price, vol):
+        start = math.floor(timestamp / self.resolution) * self.resolution
+        bar = self.bar
+        if bar is not None and start == bar[0]:
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += vol
+            bar[6] += price * vol
+            bar[7] += 1
+        elif (bar is None or start > bar[0]) and (self.last_start is None or start > self.last_start):
+            if bar is not None:
+                self._write(bar)
+            self.bar = [start, price, price, price, price, vol, price * vol, 1]
+        else:
+            self.late += 1
+
+    def flush(self):
+        POOL.flush(self.filename)
+
+    def sync(self):
+        POOL.sync(self.filename)
+
+    def close(self):
+        POOL.close(self.filename)
+
+    def bars(self, ts_from=None, ts_to=None):
+        """
+        return the written bars and the bar in progress with ts_from <= start < ts_to
+        """
+        self.flush()
+        bars = _read_file(self.filename)
+        if self.bar is not None:
+            bars.append(_public(self.bar))
+        return _select(bars, ts_from, ts_to)
+
+    def _write(self, bar):
+        with POOL.open(self.filename) as fd:
+            fd.write(BAR.pack(*bar))
+        self.last_start = bar[0]
+
+
+class CandleBackend(object):
+    """
+    Storage backend wrapper that maintains bars of all RESOLUTIONS for the appended trades.
+
+    Everything not defined here is passed to the wrapped backend.
+    """
+
+    def __init__(self, backend, name, resolutions=RESOLUTIONS):
+        self.backend = backend
+        self.candles = {resolution_name: CandleFile(bar_filename(name, resolution_name), seconds)
+                        for resolution_name, seconds in resolutions}
+        self._replay()
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def append(self, timestamp, price, vol):
+        self.backend.append(timestamp, price, vol)
+        for candles in self.candles.values():
+            candles.add(timestamp, price, vol)
+
+    def append_many(self, trades):
+        trades = list(trades)
+        self.backend.append_many(trades)
+        for candles in self.candles.values():
+            for row in trades:
+                candles.add(*row)
+
+    def flush(self):
+        self.backend.flush()
+        for candles in self.candles.values():
+            candles.flush()
+
+    def sync(self):
+        self.backend.sync()
+        for candles in self.candles.values():
+            candles.sync()
+
+    def unload(self):
+        self.backend.unload()
+        for candles in self.candles.values():
+            candles.close()
+
+    def bars(self, resolution_name, ts_from=None, ts_to=None):
+        """
+        return (start, open, high, low, close, volume, vwap, count) tuples with ts_from <= start < ts_to,
+        including the bar in progress
+        """
+        return self.candles[resolution_name].bars(ts_from, ts_to)
+
+    def _replay(self):
+        starts = {candles: candles.resume_from() for candles in self.candles.values()}
+        if not starts:
+            return
+        start = None if None in starts.values() else min(starts.values())
+
+        if hasattr(self.backend, 'range'):
+            rows = self.backend.range(start)
+        else:
+            rows = (row for row in self.backend.lines() if start is None or row[0] >= start)
+        for row in rows:
+            for candles, resume_from in starts.items():
+                if resume_from is None or row[0] >= resume_from:
+                    candles.add(*row)
@@ -0,0 +1,68 @@
+import json
+import os
+import os.path
+
+
+class Checkpoint(object):
+    """
+    Resume state of a watcher, stored in a sidecar file next to the backend.
+
+    The state is written together with a marker that describes the data file
+    at that moment (normally its size). If the data file has changed since,
+    for example because the process died between writing trades and writing
+    the checkpoint, load() returns None and the watcher has to fall back to
+    scanning the backend.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.pending = None
+        self.written = None  # contents of the last write
+
+    def set(self, state):
+        """
+        remember state, it is written by the next call to write()
+        """
+        if state is not None:
+            self.pending = state
+
+    def write(self, marker, fsync=False):
+        """
+        atomically replace the checkpoint file with the pending state, if any
+        and if it differs from the last one written. With fsync the file and
+        its directory are synced, so the checkpoint survives an os crash.
+        """
+        if self.pending is None:
+            return
+        data = json.dumps({'marker': marker, 'state': self.pending})
+        self.pending = None
+        if data == self.written:
+            return
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as fd:
+            fd.write(data)
+            if fsync:
+                fd.flush()
+                os.fsync(fd.fileno())
+        os.replace(tmp, self.filename)
+        if fsync:
+            _sync_directory(os.path.dirname(self.filename))
+        self.written = data
+
+    def load(self, marker):
+        try:
+            with open(self.filename, 'r') as fd:
+                js = json.load(fd)
+        except (IOError, ValueError):
+            return None
+        if js.get('marker') != marker:
+            return None
+        return js.get('state')
+
+
+def _sync_directory(directory):
+    fd = os.open(directory or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -0,0 +1,436 @@
+import os
+import os.path
+import struct
+import zlib
+
+from coinotomy.backend.checkpoint import Checkpoint
+from coinotomy.backend.filepool import POOL
+
+# rows per block, only full blocks are written to the data file
+BLOCK_ROWS = 4096
+
+MAGIC = b"COL1"
+HEADER = struct.Struct(b"<4sIIdd")  # magic, rows, payload size, min timestamp, max timestamp
+FOOTER = struct.Struct(b"<I")  # payload size, used to walk the file backwards
+
+TAIL_SUFFIX = '.tail'
+TAIL_MAGIC = b"COLT"
+TAIL_HEADER = struct.Struct(b"<4sQ")  # magic, size of the data file the rows follow
+TAIL_ROW = struct.Struct(b"<ddd")
+
+MASK = (1 << 64) - 1
+
+
+class ColumnarStorageBackend(object):
+    """
+    Store trades in compressed column blocks.
+
+    Every block holds up to BLOCK_ROWS trades. Timestamps are stored as the
+    delta-of-delta of their bit patterns, prices and volumes as the XOR with
+    the previous value (like Gorilla). The columns are byte-shuffled and
+    compressed together with zlib. All values are stored losslessly as doubles.
+
+    The header of every block holds its min and max timestamp, so range() can
+    skip blocks without decompressing them.
+
+    Trades of the unfinished block are kept in memory, flush() appends them
+    uncompressed to a tail file next to the data file (kraken.btc_usd.col.tail).
+    The tail is emptied when the block is full and written, and it is read
+    back on startup, so flushing often doesn't fill the file with small blocks.
+    """
+
+    def __init__(self, name):
+        self.template = os.path.expandvars(name)
+        assert self.template
+        self.pending = []
+        self.pool = POOL
+        self.loaded = True
+        self._repair()
+        with self._open() as fd:
+            self.size = fd.tell()
+        self.tail_rows = 0  # rows of pending that are in the tail file
+        self._load_tail()
+        self.checkpoint = Checkpoint(self.template + '.checkpoint')
+
+    def __del__(self):
+        self.unload()
+
+    @staticmethod
+    def extension():
+        return ".col"
+
+    def unload(self):
+        if self.loaded:
+            self.flush()
+            self.pool.close(self._get_filename())
+            self.pool.close(self._get_tail_filename())
+        self.loaded = False
+
+    def append(self, timestamp, price, vol):
+        self.pending.append((timestamp, price, vol))
+        if len(self.pending) >= BLOCK_ROWS:
+            self._write_block()
+
+    def append_many(self, trades):
+        self.pending.extend(trades)
+        while len(self.pending) >= BLOCK_ROWS:
+            self._write_block()
+
+    def flush(self):
+        self._flush()
+        self.checkpoint.write(self._marker())
+
+    def sync(self):
+        """
+        flush and fsync the trades to disk
+        """
+        self._flush()
+        self.pool.sync(self._get_filename())
+        self.pool.sync(self._get_tail_filename())
+        self.checkpoint.write(self._marker(), fsync=True)
+
+    def _flush(self):
+        if len(self.pending) > self.tail_rows:
+            rows = self.pending[self.tail_rows:]
+            with self.pool.open(self._get_tail_filename()) as fd:
+                fd.write(b''.join(TAIL_ROW.pack(*row) for row in rows))
+            self.tail_rows = len(self.pending)
+        self.pool.flush(self._get_filename())
+        self.pool.flush(self._get_tail_filename())
+
+    def save_state(self, state):
+        """
+        store the resume state of a watcher, written on the next flush()
+        """
+        self.checkpoint.set(state)
+
+    def load_state(self):
+        """
+        return the last saved resume state, or None if it is missing or outdated
+        """
+        return self.checkpoint.load(self._marker())
+
+    @staticmethod
+    def roundtrip(timestamp, price, vol):
+        """
+        return a trade as it will be read back from this backend
+        """
+        return float(timestamp), float(price), float(vol)
+
+    def _get_filename(self):
+        return self.template + self.extension()
+
+    def _get_tail_filename(self):
+        return self._get_filename() + TAIL_SUFFIX
+
+    def _open(self):
+        return self.pool.open(self._get_filename())
+
+    def _marker(self):
+        return [self.size, len(self.pending)]
+
+    def _write_block(self):
+        rows = self.pending[:BLOCK_ROWS]
+        self.pending = self.pending[BLOCK_ROWS:]
+        block = _encode_block(rows)
+        with self._open() as fd:
+            fd.write(block)
+        self.size += len(block)
+        # the block must reach the file before the tail that holds its rows is dropped
+        self.pool.flush(self._get_filename())
+        self._reset_tail()
+
+    def _reset_tail(self):
+        """
+        replace the tail file with an empty one that follows the current end of the data file
+        """
+        self.pool.close(self._get_tail_filename())
+        tmp = self._get_tail_filename() + '.tmp'
+        with open(tmp, 'wb') as fd:
+            fd.write(TAIL_HEADER.pack(TAIL_MAGIC, self.size))
+        os.replace(tmp, self._get_tail_filename())
+        self.tail_rows = 0
+
+    def _load_tail(self):
+        """
+        read back the trades of the unfinished block. A tail that belongs to
+        another end of the data file was already written as a block, or is
+        left from a block that was lost, and is dropped.
+        """
+        rows = _read_tail(self._get_tail_filename(), self.size)
+        if rows is None:
+            self._reset_tail()
+            return
+        # cut off a partially written row
+        os.truncate(self._get_tail_filename(), TAIL_HEADER.size + len(rows) * TAIL_ROW.size)
+        self.pending = rows
+        self.tail_rows = len(rows)
+
+    def _repair(self):
+        """
+        cut off a partially written block at the end of the file, if any.
+        """
+        filename = self._get_filename()
+        if not os.path.exists(filename):
+            return
+        with open(filename, 'rb') as fd:
+            size = os.fstat(fd.fileno()).st_size
+            if _block_before(fd, size) is not None:
+                return
+            end = 0
+            for start, header in _blocks(fd, size):
+                end = start + HEADER.size + header[2] + FOOTER.size
+        if end != size:
+            os.truncate(filename, end)
+
+    def lines(self):
+        self.flush()
+        pending = list(self.pending)
+        with open(self._get_filename(), 'rb') as fd:
+            for start, header in _blocks(fd, self.size):
+                yield from _read_block(fd, start, header)
+        yield from pending
+
+    def rlines(self):
+        self.flush()
+        yield from self.pending[::-1]
+        with open(self._get_filename(), 'rb') as fd:
+            for start, header in _rblocks(fd, self.size):
+                yield from _read_block(fd, start, header)[::-1]
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+
+        Blocks are skipped based on their min and max timestamp, so unlike the
+        other backends this doesn't require the timestamps to be sorted.
+        """
+        self.flush()
+        pending = list(self.pending)
+        with open(self._get_filename(), 'rb') as fd:
+            yield from _range(fd, self.size, ts_from, ts_to)
+        for row in pending:
+            if (ts_from is None or row[0] >= ts_from) and (ts_to is None or row[0] < ts_to):
+                yield row
+
+
+def _range(fd, end, ts_from, ts_to):
+    for start, header in _blocks(fd, end):
+        magic, n, size, min_ts, max_ts = header
+        if ts_from is not None and max_ts < ts_from:
+            continue
+        if ts_to is not None and min_ts >= ts_to:
+            continue
+        for row in _read_block(fd, start, header):
+            if (ts_from is None or row[0] >= ts_from) and (ts_to is None or row[0] < ts_to):
+                yield row
+
+
+def _read_tail(filename, size):
+    """
+    return the complete rows of the tail file if it follows a data file of size bytes, else None
+    """
+    try:
+        with open(filename, 'rb') as fd:
+            data = fd.read()
+    except IOError:
+        return None
+    if len(data) < TAIL_HEADER.size or TAIL_HEADER.unpack(data[:TAIL_HEADER.size]) != (TAIL_MAGIC, size):
+        return None
+    data = data[TAIL_HEADER.size:]
+    data = data[:len(data) - len(data) % TAIL_ROW.size]
+    return list(TAIL_ROW.iter_unpack(data))
+
+
+def _blocks(fd, end=None):
+    """
+    yield (offset, header) for every complete block, front to back.
+    """
+    if end is None:
+        end = os.fstat(fd.fileno()).st_size
+    pos = 0
+    while pos + HEADER.size + FOOTER.size <= end:
+        fd.seek(pos)
+        header = HEADER.unpack(fd.read(HEADER.size))
+        if header[0] != MAGIC or pos + HEADER.size + header[2] + FOOTER.size > end:
+            return
+        yield pos, header
+        pos += HEADER.size + header[2] + FOOTER.size
+
+
+def _block_before(fd, end):
+    """
+    return (offset, header) of the block that ends at end, or None if there
+    is no valid block there. A file without blocks yields (0, None).
+    """
+    if end == 0:
+        return 0, None
+    if end < HEADER.size + FOOTER.size:
+        return None
+    fd.seek(end - FOOTER.size)
+    size, = FOOTER.unpack(fd.read(FOOTER.size))
+    start = end - FOOTER.size - size - HEADER.size
+    if start < 0:
+        return None
+    fd.seek(start)
+    header = HEADER.unpack(fd.read(HEADER.size))
+    if header[0] != MAGIC or header[2] != size:
+        return None
+    return start, header
+
+
+def _rblocks(fd, end=None):
+    """
+    yield (offset, header) for every complete block, back to front.
+    """
+    if end is None:
+        end = os.fstat(fd.fileno()).st_size
+    while end > 0:
+        block = _block_before(fd, end)
+        if block is None:
+            # damaged tail, fall back to a forward scan
+            yield from list(_blocks(fd, end))[::-1]
+            return
+        yield block
+        end = block[0]
+
+
+def _read_block(fd, start, header):
+    magic, n, size, min_ts, max_ts = header
+    fd.seek(start + HEADER.size)
+    data = _unshuffle(zlib.decompress(fd.read(size)), 3 * n)
+    ts = _decode_timestamps(data[:8*n], n)
+    prices = _decode_xor(data[8*n:16*n], n)
+    vols = _decode_xor(data[16*n:], n)
+    return list(zip(ts, prices, vols))
+
+
+def _encode_block(rows):
+    n = len(rows)
+    ts, prices, vols = zip(*rows)
+    data = _encode_timestamps(ts) + _encode_xor(prices) + _encode_xor(vols)
+    payload = zlib.compress(_shuffle(data))
+    return HEADER.pack(MAGIC, n, len(payload), min(ts), max(ts)) + payload + FOOTER.pack(len(payload))
+
+
+def _shuffle(data):
+    """
+    group the n-th bytes of all 8-byte words together, which compresses far
+    better since the high bytes of small deltas are all zero.
+    """
+    return b''.join(data[i::8] for i in range(8))
+
+
+def _unshuffle(data, n_words):
+    out = bytearray(len(data))
+    for i in range(8):
+        out[i::8] = data[i*n_words:(i+1)*n_words]
+    return bytes(out)
+
+
+def _to_bits(values):
+    n = len(values)
+    return struct.unpack(b"<%dQ" % n, struct.pack(b"<%dd" % n, *values))
+
+
+def _from_bits(bits):
+    n = len(bits)
+    return struct.unpack(b"<%dd" % n, struct.pack(b"<%dQ" % n, *bits))
+
+
+def _zigzag(x):
+    if x >= 1 << 63:
+        x -= 1 << 64
+    return ((x << 1) ^ (x >> 63)) & MASK
+
+
+def _unzigzag(z):
+    return ((z >> 1) ^ -(z & 1)) & MASK
+
+
+def _encode_timestamps(timestamps):
+    out = []
+    prev = prev_delta = 0
+    for bits in _to_bits(timestamps):
+        delta = (bits - prev) & MASK
+        out.append(_zigzag((delta - prev_delta) & MASK))
+        prev, prev_delta = bits, delta
+    return struct.pack(b"<%dQ" % len(out), *out)
+
+
+def _decode_timestamps(data, n):
+    out = []
+    prev = prev_delta = 0
+    for z in struct.unpack(b"<%dQ" % n, data):
+        prev_delta = (prev_delta + _unzigzag(z)) & MASK
+        prev = (prev + prev_delta) & MASK
+        out.append(prev)
+    return _from_bits(out)
+
+
+def _encode_xor(values):
+    out = []
+    prev = 0
+    for bits in _to_bits(values):
+        out.append(bits ^ prev)
+        prev = bits
+    return struct.pack(b"<%dQ" % len(out), *out)
+
+
+def _decode_xor(data, n):
+    out = []
+    prev = 0
+    for x in struct.unpack(b"<%dQ" % n, data):
+        prev ^= x
+        out.append(prev)
+    return _from_bits(out)
+
+
+class ColumnarReader(object):
+    """
+    Read-only snapshot of a columnar file, for use in other processes while a watcher appends to it.
+
+    The snapshot holds the complete blocks and the flushed rows of the tail
+    file at the time the reader was opened.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = open(filename, 'rb')
+        self.end = os.fstat(self.fd.fileno()).st_size
+        if _block_before(self.fd, self.end) is None:
+            # a block is being written
+            end = 0
+            for start, header in _blocks(self.fd, self.end):
+                end = start + HEADER.size + header[2] + FOOTER.size
+            self.end = end
+        # when the tail was already emptied for a newer block, the snapshot ends before that block
+        self.tail = _read_tail(filename + TAIL_SUFFIX, self.end) or []
+
+    def close(self):
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lines(self):
+        for start, header in _blocks(self.fd, self.end):
+            yield from _read_block(self.fd, start, header)
+        yield from self.tail
+
+    def rlines(self):
+        yield from self.tail[::-1]
+        for start, header in _rblocks(self.fd, self.end):
+            yield from _read_block(self.fd, start, header)[::-1]
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+        """
+        yield from _range(self.fd, self.end, ts_from, ts_to)
+        for row in self.tail:
+            if (ts_from is None or row[0] >= ts_from) and (ts_to is None or row[0] < ts_to):
+                yield row
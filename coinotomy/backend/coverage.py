@@ -0,0 +1,140 @@
+"""
+Time ranges for which a watcher collected all trades, per symbol.
+
+Watcher.run extends the index after every successful tick with the range from
+the previous tick, see Watcher.covered_until(), once the trades of the tick are
+committed to disk. The chain is broken by a restart or by a tick that raised,
+so outages show up as gaps. The index is stored next to the trade file, for
+example kraken.btc_usd.coverage, as a json list of merged [start, end)
+intervals.
+
+    coverage("coinotomy_data/kraken.btc_usd", ts_from, ts_to)  # 1.0 when complete
+    incomplete("coinotomy_data", ts_from, ts_to)  # {symbol: fraction} of the others
+"""
+
+import bisect
+import json
+import os
+import os.path
+
+SUFFIX = '.coverage'
+
+
+class CoverageIndex(object):
+    """
+    Sorted, disjoint [start, end) intervals, written on flush() if they changed.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.starts = []
+        self.ends = []
+        self.changed = False
+        try:
+            with open(filename, 'r') as fd:
+                for start, end in json.load(fd):
+                    self.add(start, end)
+        except (IOError, ValueError):
+            pass
+        self.changed = False
+
+    def add(self, start, end):
+        """
+        mark [start, end) as collected
+        """
+        if end <= start:
+            return
+        # the intervals that overlap or touch [start, end) are merged into it
+        lo = bisect.bisect_left(self.ends, start)
+        hi = bisect.bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+        self.changed = True
+
+    def flush(self):
+        if not self.changed:
+            return
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as fd:
+            json.dump(self.intervals(), fd)
+        os.replace(tmp, self.filename)
+        self.changed = False
+
+    def intervals(self, ts_from=None, ts_to=None):
+        """
+        return the [start, end] intervals, clipped to ts_from and ts_to
+        """
+        lo = 0 if ts_from is None else bisect.bisect_right(self.ends, ts_from)
+        hi = len(self.starts) if ts_to is None else bisect.bisect_left(self.starts, ts_to)
+        intervals = [[start, end] for start, end in zip(self.starts[lo:hi], self.ends[lo:hi])]
+        if intervals and ts_from is not None:
+            intervals[0][0] = max(intervals[0][0], ts_from)
+        if intervals and ts_to is not None:
+            intervals[-1][1] = min(intervals[-1][1], ts_to)
+        return intervals
+
+    def covered(self, ts_from, ts_to):
+        """
+        return the number of seconds of [ts_from, ts_to) that were collected
+        """
+        return sum(end - start for start, end in self.intervals(ts_from, ts_to))
+
+    def coverage(self, ts_from, ts_to):
+        """
+        return the fraction of [ts_from, ts_to) that was collected
+        """
+        if ts_to <= ts_from:
+            return 1.0
+        return self.covered(ts_from, ts_to) / (ts_to - ts_from)
+
+    def gaps(self, min_duration=0, ts_from=None, ts_to=None):
+        """
+        return the [start, end] ranges of more than min_duration seconds that
+        weren't collected, between ts_from and ts_to (by default the first and
+        last collected timestamp)
+        """
+        if ts_from is None:
+            ts_from = self.starts[0] if self.starts else 0
+        if ts_to is None:
+            ts_to = self.ends[-1] if self.ends else 0
+
+        gaps = []
+        position = ts_from
+        for start, end in self.intervals(ts_from, ts_to) + [[ts_to, ts_to]]:
+            if start - position > min_duration:
+                gaps.append([position, start])
+            position = max(position, end)
+        return gaps
+
+
+def load(name):
+    """
+    return the coverage index of the symbol stored under name
+    """
+    return CoverageIndex(os.path.expandvars(name) + SUFFIX)
+
+
+def coverage(name, ts_from, ts_to):
+    return load(name).coverage(ts_from, ts_to)
+
+
+def gaps(name, min_duration=0, ts_from=None, ts_to=None):
+    return load(name).gaps(min_duration, ts_from, ts_to)
+
+
+def incomplete(directory, ts_from, ts_to):
+    """
+    return {symbol: fraction collected} for the symbols with a coverage index
+    in directory that weren't collected for all of [ts_from, ts_to)
+    """
+    result = {}
+    for f in sorted(os.listdir(directory)):
+        if f.endswith(SUFFIX):
+            symbol = f[:-len(SUFFIX)]
+            fraction = coverage(os.path.join(directory, symbol), ts_from, ts_to)
+            if fraction < 1:
+                result[symbol] = fraction
+    return result
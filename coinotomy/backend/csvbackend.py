@@ -1,15 +1,35 @@
 import os
 import os.path
 
+from coinotomy.backend.checkpoint import Checkpoint
+from coinotomy.backend.csvindex import CsvIndex
+from coinotomy.backend.filepool import POOL, FileReader
+from coinotomy.backend import prefixsum
+from coinotomy.backend.prefixsum import SUFFIX, PrefixSums, read_totals, vwap
 from coinotomy.utils.reservefileiterator import ReserveLineIterator
 
 READ_SIZE = 16*1024  # 16K
+WRITE_BUFFER_SIZE = 64*1024  # 64K, flushing is up to the caller
+ARRAY_READ_SIZE = 4*1024*1024  # 4M
+ARRAY_CHUNK_ROWS = 1024*1024
 
 class CsvStorageBackend(object):
     def __init__(self, name):
         self.template = os.path.expandvars(name)
         assert self.template
-        self.fd = open(self._get_filename(), 'ab', 1)  # line buffered
+        self.pool = POOL
+        self.loaded = True
+        with self._open() as fd:
+            self.offset = fd.tell()
+        # the time index is loaded on the first range query, and only written
+        # by the instance that appends to the file
+        self.index = CsvIndex(self._get_filename() + '.idx')
+        self.writer = False
+        self.prefix_sums = None
+        if prefixsum.ENABLED:
+            self.prefix_sums = PrefixSums(self._get_filename() + SUFFIX)
+            self.prefix_sums.open(self._get_filename(), self._read_sum_rows)
+        self.checkpoint = Checkpoint(self.template + '.checkpoint')
 
     def __del__(self):
         self.unload()
@@ -19,22 +39,119 @@ class CsvStorageBackend(object):
         return ".csv"
 
     def unload(self):
-        if self.fd:
-            self.fd.close()
-        self.fd = None
+        if self.loaded:
+            self.pool.close(self._get_filename())
+            if self.writer:
+                self.index.flush()
+            if self.prefix_sums is not None:
+                self.prefix_sums.flush()
+            self.checkpoint.write(self.offset)
+        self.loaded = False
 
     def append(self, timestamp, price, vol):
         row = self._format_row(timestamp, price, vol) + b'\n'
-        self.fd.write(row)
+        # index and sum the values as stored, the timestamp is rounded
+        stored = _parse_row(row)
+        self.writer = True
+        if self.index.loaded:
+            self.index.add(self.offset, stored[0])
+        self.offset += len(row)
+        if self.prefix_sums is not None:
+            self.prefix_sums.add(self.offset, *stored)
+        with self._open() as fd:
+            fd.write(row)
+
+    def append_many(self, trades):
+        """
+        append an iterable of (timestamp, price, vol) tuples with a single write
+        """
+        rows = []
+        indexed = self.index.loaded
+        sums = self.prefix_sums
+        for ts, p, v in trades:
+            row = self._format_row(ts, p, v) + b'\n'
+            stored = _parse_row(row)
+            if indexed:
+                self.index.add(self.offset, stored[0])
+            self.offset += len(row)
+            if sums is not None:
+                sums.add(self.offset, *stored)
+            rows.append(row)
+        if rows:
+            self.writer = True
+            with self._open() as fd:
+                fd.write(b''.join(rows))
 
     def flush(self):
-        self.fd.flush()
+        self._flush()
+        self.checkpoint.write(self.offset)
+
+    def sync(self):
+        """
+        flush and fsync the trades to disk
+        """
+        self._flush()
+        self.pool.sync(self._get_filename())
+        self.checkpoint.write(self.offset, fsync=True)
+
+    def _flush(self):
+        self.pool.flush(self._get_filename())
+        if self.writer:
+            self.index.flush()
+        if self.prefix_sums is not None:
+            self.prefix_sums.flush()
+
+    def save_state(self, state):
+        """
+        store the resume state of a watcher, written on the next flush()
+        """
+        self.checkpoint.set(state)
+
+    def load_state(self):
+        """
+        return the last saved resume state, or None if it is missing or outdated
+        """
+        return self.checkpoint.load(self.offset)
+
+    def reindex(self):
+        """
+        rebuild the time index from scratch
+        """
+        self.pool.flush(self._get_filename())
+        self.index.rebuild(self._get_filename(), self._parse_timestamp)
+        self.index.flush()
+
+    def volume(self, ts_from=None, ts_to=None):
+        """
+        return the total volume of the trades with ts_from <= timestamp < ts_to
+        """
+        return self._totals(ts_from, ts_to)[0]
+
+    def vwap(self, ts_from=None, ts_to=None):
+        """
+        return the volume weighted average price of the trades with ts_from <= timestamp < ts_to,
+        or None if their volume is zero
+        """
+        return vwap(*self._totals(ts_from, ts_to))
+
+    def _totals(self, ts_from, ts_to):
+        self._flush()
+        with open(self._get_filename(), 'rb') as fd:
+            return read_totals(self._get_filename() + SUFFIX, fd, self._read_sum_rows, ts_from, ts_to)
 
-    def _format_row(self, timestamp, price, vol):
+    @classmethod
+    def roundtrip(cls, timestamp, price, vol):
+        """
+        return a trade as it will be read back from this backend
+        """
+        return _parse_row(cls._format_row(timestamp, price, vol))
+
+    @classmethod
+    def _format_row(cls, timestamp, price, vol):
         return bytes("{},{},{}".format(
-            self._format(timestamp, 4),
-            self._format(price, 8),
-            self._format(vol, 8)), 'ascii')
+            cls._format(timestamp, 4),
+            cls._format(price, 8),
+            cls._format(vol, 8)), 'ascii')
 
     def _unformat_row(self, row):
 
@@ -46,7 +163,30 @@ class CsvStorageBackend(object):
             raise
         return float(ts), float(p), float(v)
 
-    def _format(self, f, ndigits):
+    @staticmethod
+    def _parse_timestamp(row):
+        return float(row.split(b',', 1)[0])
+
+    @staticmethod
+    def _read_sum_rows(fd, offset):
+        """
+        yield (end offset, timestamp, price, vol) for the complete rows from offset
+        """
+        fd.seek(offset)
+        for line in fd:
+            if not line.endswith(b'\n'):
+                return  # partially written row
+            offset += len(line)
+            if not line.strip():
+                continue
+            try:
+                row = _parse_row(line)
+            except ValueError:
+                continue  # damaged row, leave it out of the sums
+            yield (offset,) + row
+
+    @staticmethod
+    def _format(f, ndigits):
         str = "%%.%sf" % ndigits % f
 
         while -1 != str.find('.') and str[-1] in "0.":
@@ -57,50 +197,285 @@ class CsvStorageBackend(object):
     def _get_filename(self):
         return self.template + self.extension()
 
+    def _open(self):
+        return self.pool.open(self._get_filename(), WRITE_BUFFER_SIZE)
+
+    def _index(self):
+        """
+        return the time index, loading it on first use
+        """
+        if not self.index.loaded:
+            self.pool.flush(self._get_filename())
+            self.index.open(self._get_filename(), self._parse_timestamp)
+        return self.index
+
     def lines(self):
-        self.fd.flush()
+        self.pool.flush(self._get_filename())
         unformat = self._unformat_row
 
-        class iterator:
-            def __init__(self, filename):
-                self.fd = open(filename, 'rb')
+        class iterator(FileReader):
+            def _next(self):
+                while True:
+                    line = self.fd.readline()
+                    if not line:
+                        raise StopIteration()
+
+                    if not line.strip():
+                        continue  # probably the last line
 
-            def __iter__(self):
-                return self
+                    return unformat(line)
 
-            def __exit__(self):
-                self.fd.close()
+        return iterator(self._get_filename())
 
-            def __next__(self):
-                line = self.fd.readline()
-                if not line:
-                    raise StopIteration()
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
 
-                if not line.strip():
-                    return self.__next__()  # probably the last line
+        Reading starts at the closest index entry before ts_from, so this relies
+        on the timestamps in the file being non-decreasing.
+        """
+        self.flush()
+        unformat = self._unformat_row
+        start = 0 if ts_from is None else self._index().find(ts_from)
+
+        class iterator(FileReader):
+            def __init__(self, filename):
+                FileReader.__init__(self, filename)
+                self.fd.seek(start)
+
+            def _next(self):
+                while True:
+                    line = self.fd.readline()
+                    if not line:
+                        raise StopIteration()
 
-                return unformat(line)
+                    if not line.strip():
+                        continue  # probably the last line
+
+                    row = unformat(line)
+                    if ts_to is not None and row[0] >= ts_to:
+                        raise StopIteration()
+                    if ts_from is None or row[0] >= ts_from:
+                        return row
 
         return iterator(self._get_filename())
 
     def rlines(self):
-        self.fd.flush()
+        self.pool.flush(self._get_filename())
         unformat = self._unformat_row
 
-        class iterator:
+        class iterator(FileReader):
             def __init__(self, filename):
-                self.fd = open(filename, 'rb')
-                self.reverse_line_iterator = ReserveLineIterator(self.fd, b'\n')
-                self.iterator = iter(self.reverse_line_iterator)
-
-            def __iter__(self):
-                return self
+                FileReader.__init__(self, filename)
+                self.iterator = ReserveLineIterator(self.fd, b'\n')
 
-            def __exit__(self):
-                self.fd.close()
-
-            def __next__(self):
+            def _next(self):
                 return unformat(next(self.iterator))
 
+            def close(self):
+                self.iterator.close()
+                FileReader.close(self)
+
         return iterator(self._get_filename())
 
+    def rlines_batches(self):
+        """
+        yield lists of trades, newest first, one list per block read from the end of the file
+        """
+        self.pool.flush(self._get_filename())
+        with open(self._get_filename(), 'rb') as fd:
+            for batch in ReserveLineIterator(fd, b'\n').batches():
+                yield [self._unformat_row(line) for line in batch]
+
+    def read_arrays(self, ts_from=None, ts_to=None, chunk_rows=ARRAY_CHUNK_ROWS):
+        """
+        Yield (timestamps, prices, volumes) tuples of float64 numpy arrays with
+        chunk_rows trades each (the last chunk may be shorter), for all trades
+        with ts_from <= timestamp < ts_to.
+
+        The file is parsed in large blocks with numpy instead of row by row. Like
+        range(), this relies on the timestamps in the file being non-decreasing.
+        """
+        self.flush()
+        start = 0 if ts_from is None else self._index().find(ts_from)
+        with open(self._get_filename(), 'rb') as fd:
+            yield from _read_arrays(fd, self._get_filename(), start, None, ts_from, ts_to, chunk_rows)
+
+
+def _read_arrays(fd, filename, start, end, ts_from, ts_to, chunk_rows):
+    """
+    yield (timestamps, prices, volumes) chunks of the trades with ts_from <= timestamp < ts_to
+    in the rows of fd from byte start to byte end (or the last complete row)
+    """
+    import numpy
+
+    def parse():
+        pos = start
+        tail = b''
+        while end is None or pos < end:
+            # seek every block, other iterators may share the file
+            fd.seek(pos)
+            block = fd.read(ARRAY_READ_SIZE if end is None else min(ARRAY_READ_SIZE, end - pos))
+            if not block:
+                return  # a trailing row without newline is still being written
+            pos += len(block)
+            block = tail + block
+            cut = block.rfind(b'\n') + 1
+            block, tail = block[:cut], block[cut:]
+
+            rows = _parse_block(block, filename)
+
+            if ts_from is not None:
+                rows = rows[rows[:, 0] >= ts_from]
+            if ts_to is not None:
+                stop = numpy.searchsorted(rows[:, 0], ts_to, 'left')
+                if stop < len(rows):
+                    yield rows[:stop]
+                    return
+            yield rows
+
+    pending = []
+    n_pending = 0
+    for rows in parse():
+        pending.append(rows)
+        n_pending += len(rows)
+        if n_pending < chunk_rows:
+            continue
+
+        rows = numpy.concatenate(pending)
+        for i in range(0, len(rows) - chunk_rows + 1, chunk_rows):
+            yield _columns(rows[i:i + chunk_rows])
+        rest = rows[len(rows) - len(rows) % chunk_rows:]
+        pending = [rest]
+        n_pending = len(rest)
+
+    if n_pending:
+        yield _columns(numpy.concatenate(pending))
+
+
+def _parse_block(block, filename):
+    """
+    return the rows of block as an (n, 3) float64 array, parsed by the C reader of numpy
+    """
+    import io
+    import numpy
+
+    if not block.strip():
+        return numpy.zeros((0, 3))
+    try:
+        rows = numpy.loadtxt(io.BytesIO(block), delimiter=',', dtype=numpy.float64, ndmin=2)
+    except ValueError:
+        rows = None
+    if rows is None or rows.shape[1] != 3:
+        raise ValueError("damaged row in %s" % filename)
+    return rows
+
+
+def _columns(rows):
+    return rows[:, 0].copy(), rows[:, 1].copy(), rows[:, 2].copy()
+
+
+class CsvReader(object):
+    """
+    Read-only snapshot of a csv file, for use in other processes while a watcher appends to it.
+
+    The snapshot ends after the last complete line at the time the reader was
+    opened. Rows appended later and a half written row are not returned.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = open(filename, 'rb')
+        self.end = self._complete_end(os.fstat(self.fd.fileno()).st_size)
+        self.index = CsvIndex(filename + '.idx')
+        self.index.load()
+
+    def close(self):
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lines(self):
+        return self._read(0, None, None)
+
+    def volume(self, ts_from=None, ts_to=None):
+        """
+        return the total volume of the trades with ts_from <= timestamp < ts_to
+        """
+        return self._totals(ts_from, ts_to)[0]
+
+    def vwap(self, ts_from=None, ts_to=None):
+        """
+        return the volume weighted average price of the trades with ts_from <= timestamp < ts_to,
+        or None if their volume is zero
+        """
+        return vwap(*self._totals(ts_from, ts_to))
+
+    def _totals(self, ts_from, ts_to):
+        return read_totals(self.filename + SUFFIX, self.fd, CsvStorageBackend._read_sum_rows, ts_from, ts_to, self.end)
+
+    def read_arrays(self, ts_from=None, ts_to=None, chunk_rows=ARRAY_CHUNK_ROWS):
+        """
+        Yield (timestamps, prices, volumes) chunks of float64 numpy arrays, see
+        CsvStorageBackend.read_arrays().
+        """
+        start = 0 if ts_from is None else self._find(ts_from)
+        return _read_arrays(self.fd, self.filename, start, self.end, ts_from, ts_to, chunk_rows)
+
+    def rlines(self):
+        for line in ReserveLineIterator(self.fd, b'\n', end=self.end):
+            yield _parse_row(line)
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+        """
+        start = 0 if ts_from is None else self._find(ts_from)
+        return self._read(start, ts_from, ts_to)
+
+    def _find(self, timestamp):
+        offset = min(self.index.find(timestamp), self.end)
+        if offset > 0:
+            # the index may be missing or being rebuilt, only trust it if it points at a row
+            self.fd.seek(offset - 1)
+            if self.fd.read(1) != b'\n':
+                return 0
+        return offset
+
+    def _read(self, pos, ts_from, ts_to):
+        tail = b''
+        while pos < self.end:
+            # seek every block, other iterators may share the file
+            size = min(READ_SIZE, self.end - pos)
+            self.fd.seek(pos)
+            rows = (tail + self.fd.read(size)).split(b'\n')
+            pos += size
+            tail = rows.pop()
+            for line in rows:
+                if not line.strip():
+                    continue
+                row = _parse_row(line)
+                if ts_to is not None and row[0] >= ts_to:
+                    return
+                if ts_from is None or row[0] >= ts_from:
+                    yield row
+
+    def _complete_end(self, size):
+        end = size
+        while end > 0:
+            start = max(0, end - READ_SIZE)
+            self.fd.seek(start)
+            i = self.fd.read(end - start).rfind(b'\n')
+            if i >= 0:
+                return start + i + 1
+            end = start
+        return 0
+
+
+def _parse_row(line):
+    ts, p, v = line.split(b',')
+    return float(ts), float(p), float(v)
@@ -0,0 +1,147 @@
+import bisect
+import os
+import os.path
+import struct
+
+ENTRY = struct.Struct(b"<dQ")  # timestamp, byte offset
+
+# add an index entry every N rows or every M bytes, whichever comes first
+INDEX_EVERY_ROWS = 1024
+INDEX_EVERY_BYTES = 64*1024  # 64K
+
+
+class CsvIndex(object):
+    """
+    Sparse (timestamp, byte offset) index over a csv file.
+
+    The index is kept in memory and mirrored in a sidecar file that only ever
+    grows. When the sidecar is missing or doesn't match the csv file it is
+    rebuilt by scanning the csv file once. Only flush() writes the sidecar, so
+    an index that is opened but never flushed leaves the file alone.
+    """
+
+    def __init__(self, filename, every_rows=INDEX_EVERY_ROWS, every_bytes=INDEX_EVERY_BYTES):
+        self.filename = filename
+        self.every_rows = every_rows
+        self.every_bytes = every_bytes
+        self.timestamps = []
+        self.offsets = []
+        self.pending = []
+        self.rows_since_entry = 0
+        self.loaded = False
+        self.rewrite = False  # the sidecar is stale, flush() replaces it
+
+    def open(self, csv_filename, parse_timestamp):
+        """
+        load the sidecar, rebuilding the index if it is stale, then index the
+        rows that were appended after the last entry.
+        """
+        self._load()
+        if not self._is_valid(csv_filename, parse_timestamp):
+            self.rebuild(csv_filename, parse_timestamp)
+            return
+
+        self.rows_since_entry = 0
+        self._scan(csv_filename, parse_timestamp, self.offsets[-1] if self.offsets else 0)
+        self.loaded = True
+
+    def rebuild(self, csv_filename, parse_timestamp):
+        self.timestamps = []
+        self.offsets = []
+        self.pending = []
+        self.rows_since_entry = 0
+        self._scan(csv_filename, parse_timestamp, 0)
+        self.loaded = True
+        self.rewrite = True
+
+    def add(self, offset, timestamp):
+        """
+        called for every row appended to the csv file, with the offset of its first byte.
+        """
+        if not self.offsets \
+                or self.rows_since_entry >= self.every_rows \
+                or offset - self.offsets[-1] >= self.every_bytes:
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+            self.pending.append(ENTRY.pack(timestamp, offset))
+            self.rows_since_entry = 0
+        self.rows_since_entry += 1
+
+    def flush(self):
+        if self.rewrite:
+            tmp = self.filename + '.tmp'
+            with open(tmp, 'wb') as fd:
+                fd.write(b''.join(ENTRY.pack(ts, offset) for ts, offset in zip(self.timestamps, self.offsets)))
+            os.replace(tmp, self.filename)
+            self.rewrite = False
+        elif self.pending:
+            with open(self.filename, 'ab') as fd:
+                fd.write(b''.join(self.pending))
+        self.pending = []
+
+    def find(self, timestamp):
+        """
+        return a byte offset at or before the first row with a timestamp >= timestamp.
+        """
+        i = bisect.bisect_left(self.timestamps, timestamp)
+        if i == 0:
+            return 0
+        return self.offsets[i - 1]
+
+    def load(self):
+        """
+        load the sidecar as it is, for readers that must not modify it
+        """
+        self._load()
+        self.loaded = True
+
+    def _load(self):
+        self.timestamps = []
+        self.offsets = []
+        self.pending = []
+        if not os.path.exists(self.filename):
+            return
+
+        with open(self.filename, 'rb') as fd:
+            data = fd.read()
+        data = data[:len(data) - len(data) % ENTRY.size]
+        for ts, offset in ENTRY.iter_unpack(data):
+            self.timestamps.append(ts)
+            self.offsets.append(offset)
+
+    def _is_valid(self, csv_filename, parse_timestamp):
+        size = os.path.getsize(csv_filename)
+        if not self.offsets:
+            # an empty index is only valid for an empty file
+            return size == 0
+        if self.offsets[0] != 0 or self.offsets[-1] >= size:
+            return False
+
+        with open(csv_filename, 'rb') as fd:
+            fd.seek(self.offsets[-1])
+            line = fd.readline()
+        try:
+            return parse_timestamp(line) == self.timestamps[-1]
+        except ValueError:
+            return False
+
+    def _scan(self, csv_filename, parse_timestamp, offset):
+        """
+        index all complete rows starting at offset. If offset is the last
+        entry in the index, that row is counted but not indexed again.
+        """
+        indexed = bool(self.offsets) and self.offsets[-1] == offset
+        with open(csv_filename, 'rb') as fd:
+            fd.seek(offset)
+            for line in fd:
+                if not line.endswith(b'\n'):
+                    break  # partially written row
+                if indexed:
+                    self.rows_since_entry += 1
+                    indexed = False
+                elif line.strip():
+                    try:
+                        self.add(offset, parse_timestamp(line))
+                    except ValueError:
+                        pass  # damaged row, leave it out of the index
+                offset += len(line)
@@ -0,0 +1,62 @@
+import collections
+
+# seconds of stored trades that are remembered, counted from the newest one
+DEDUP_WINDOW = 60
+
+
+class DedupBackend(object):
+    """
+    Storage backend wrapper that drops trades which were already stored when it was created.
+
+    Watchers that resume from a timestamp re-fetch the trades at (or shortly
+    before) the newest stored one. A fingerprint of every trade stored within
+    `window` seconds of the newest one is counted on creation, and appended
+    trades up to that newest timestamp are dropped when they match. Since it is
+    a multiset, a page with two identical trades of which one was stored still
+    adds the other. Trades after the newest stored one are always kept, even
+    when identical, so pages that overlap each other must be handled by the
+    watcher. Trades are compared as the backend would read them back.
+
+    Everything not defined here is passed to the wrapped backend.
+    """
+
+    def __init__(self, backend, window=DEDUP_WINDOW):
+        self.backend = backend
+        self.roundtrip = getattr(backend, 'roundtrip', None)
+        self.dropped = 0
+
+        self.seen = collections.Counter()  # hash of a stored trade -> number of times stored
+        self.newest = None  # timestamp of the newest stored trade
+        for row in backend.rlines():
+            if self.newest is None:
+                self.newest = row[0]
+            if row[0] < self.newest - window:
+                break
+            self.seen[hash(tuple(row))] += 1
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def append(self, timestamp, price, vol):
+        for row in self._filter([(timestamp, price, vol)]):
+            self.backend.append(*row)
+
+    def append_many(self, trades):
+        self.backend.append_many(self._filter(trades))
+
+    def _filter(self, trades):
+        if not self.seen:
+            return trades
+
+        new = []
+        batch = collections.Counter()
+        for row in trades:
+            stored = self.roundtrip(*row) if self.roundtrip else row
+            if stored[0] <= self.newest:
+                key = hash(tuple(stored))
+                batch[key] += 1
+                if batch[key] <= self.seen[key]:
+                    self.dropped += 1
+                    continue
+            new.append(row)
+        return new
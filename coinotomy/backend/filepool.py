@@ -0,0 +1,132 @@
+import collections
+import contextlib
+import io
+import os
+import threading
+
+# number of idle write handles kept open, shared by all backends in the process
+MAX_OPEN_FILES = 64
+
+
+class FilePool(object):
+    """
+    LRU pool of append handles, shared by all file based backends.
+
+    Backends don't keep their file open, they borrow the handle from the pool
+    for every write with open(). Handles are opened on demand, and the least
+    recently used idle handles are flushed and closed once more than max_open
+    are open, so the number of open files scales with the number of active
+    symbols instead of the number of configured ones.
+    """
+
+    def __init__(self, max_open=MAX_OPEN_FILES):
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        self.files = collections.OrderedDict()  # filename -> [fd, number of users, closing]
+
+    @contextlib.contextmanager
+    def open(self, filename, buffer_size=io.DEFAULT_BUFFER_SIZE):
+        """
+        borrow the append handle of filename, it isn't evicted until it is returned
+        """
+        with self.lock:
+            entry = self.files.pop(filename, None)
+            if entry is None:
+                entry = [open(filename, 'ab', buffer_size), 0, False]
+            entry[1] += 1
+            self.files[filename] = entry
+            self._evict()
+        try:
+            yield entry[0]
+        finally:
+            with self.lock:
+                entry[1] -= 1
+                if entry[2] and not entry[1]:
+                    entry[0].close()
+
+    def flush(self, filename):
+        """
+        write the buffered data of filename to the os, if it is open
+        """
+        with self.lock:
+            entry = self.files.get(filename)
+            if entry is not None:
+                entry[0].flush()
+
+    def sync(self, filename):
+        """
+        flush and fsync filename
+        """
+        with self.open(filename) as fd:
+            fd.flush()
+            os.fsync(fd.fileno())
+
+    def close(self, filename):
+        """
+        flush and close the handle of filename, a borrowed handle is closed when it is returned
+        """
+        with self.lock:
+            entry = self.files.pop(filename, None)
+            if entry is None:
+                return
+            if entry[1]:
+                entry[2] = True
+            else:
+                entry[0].close()
+
+    def __len__(self):
+        return len(self.files)
+
+    def _evict(self):
+        excess = len(self.files) - self.max_open
+        for filename in list(self.files):
+            if excess <= 0:
+                break
+            fd, users, closing = self.files[filename]
+            if users:
+                continue
+            fd.close()
+            del self.files[filename]
+            excess -= 1
+
+
+POOL = FilePool()
+
+
+class FileReader(object):
+    """
+    Base class for the iterators returned by lines() and friends.
+
+    The file is closed when the iterator is exhausted, when it is used as a
+    context manager and left, or when close() is called:
+
+        with backend.lines() as lines:
+            first = next(lines)
+    """
+
+    def __init__(self, filename):
+        self.fd = open(filename, 'rb')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.fd.closed:
+            raise StopIteration()
+        try:
+            return self._next()
+        except StopIteration:
+            self.close()
+            raise
+
+    def _next(self):
+        raise NotImplementedError()
+
+    def close(self):
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,172 @@
+import concurrent.futures
+import logging
+import threading
+import time
+
+# flush after every tick of the watcher
+POLICY_TICK = 'tick'
+# flush all backends with new trades every interval seconds, from one thread
+POLICY_INTERVAL = 'interval'
+# flush a backend once it holds max_rows unflushed trades
+POLICY_ROWS = 'rows'
+
+# threads that fsync the backends of one group commit in parallel
+SYNC_THREADS = 32
+
+log = logging.getLogger("groupcommit")
+
+
+class GroupCommitter(object):
+    """
+    Decides when the backends of all watchers are flushed, and whether they are fsynced.
+
+    Backends are wrapped with wrap(). With POLICY_INTERVAL, a single background
+    thread commits all wrapped backends that received trades since the last
+    commit, which bounds the data lost in a crash to interval seconds while
+    turning hundreds of small writes per second into a few large ones. With
+    fsync, the backends of a commit are synced by up to sync_threads threads
+    at once, since a single thread would wait for every disk flush in turn.
+    """
+
+    def __init__(self, policy=POLICY_TICK, interval=0.5, max_rows=10000, fsync=False, sync_threads=SYNC_THREADS):
+        assert policy in (POLICY_TICK, POLICY_INTERVAL, POLICY_ROWS)
+        self.policy = policy
+        self.interval = interval
+        self.max_rows = max_rows
+        self.fsync = fsync
+        self.sync_threads = sync_threads
+
+        self.lock = threading.Lock()
+        self.backends = []
+        self.thread = None
+        self.executor = None
+
+    def wrap(self, backend):
+        wrapped = GroupCommitBackend(self, backend)
+        with self.lock:
+            self.backends.append(wrapped)
+            if self.policy == POLICY_INTERVAL and self.thread is None:
+                self.thread = threading.Thread(target=self.run, args=(), daemon=True)
+                self.thread.start()
+        return wrapped
+
+    def commit_all(self):
+        with self.lock:
+            backends = [backend for backend in self.backends if backend.dirty]
+        if not self.fsync or len(backends) < 2:
+            for backend in backends:
+                backend.commit()
+            return
+
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.sync_threads, "groupcommit")
+        # fsync releases the gil, so the threads wait for the disk together
+        for future in [self.executor.submit(backend.commit) for backend in backends]:
+            future.result()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.commit_all()
+            except:
+                log.exception("Exception while committing backends")
+
+    def _remove(self, backend):
+        with self.lock:
+            if backend in self.backends:
+                self.backends.remove(backend)
+
+
+class GroupCommitBackend(object):
+    """
+    Storage backend wrapper that leaves flushing to a GroupCommitter.
+
+    All calls are serialized with a lock, since the committer may flush from
+    another thread. Everything not defined here is passed to the wrapped backend.
+    """
+
+    def __init__(self, committer, backend):
+        self.committer = committer
+        self.backend = backend
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.pending_rows = 0
+        self.committed = []  # callbacks for the next commit
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def unload(self):
+        self.committer._remove(self)
+        with self.lock:
+            self.commit()
+            self.backend.unload()
+
+    def append(self, timestamp, price, vol):
+        with self.lock:
+            self.backend.append(timestamp, price, vol)
+            self._appended(1)
+
+    def append_many(self, trades):
+        trades = list(trades)
+        with self.lock:
+            self.backend.append_many(trades)
+            self._appended(len(trades))
+
+    def save_state(self, state):
+        with self.lock:
+            self.backend.save_state(state)
+            self.dirty = self.dirty or state is not None
+
+    def flush(self):
+        """
+        called by the watcher after every tick, only commits with POLICY_TICK
+        """
+        if self.committer.policy == POLICY_TICK:
+            self.commit()
+
+    def when_committed(self, callback):
+        """
+        call callback() once the trades appended so far are committed, right away if they are
+        """
+        with self.lock:
+            if self.dirty:
+                self.committed.append(callback)
+            else:
+                callback()
+
+    def commit(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            if self.committer.fsync:
+                self.backend.sync()
+            else:
+                self.backend.flush()
+            self.dirty = False
+            self.pending_rows = 0
+            callbacks, self.committed = self.committed, []
+            for callback in callbacks:
+                callback()
+
+    def lines(self):
+        with self.lock:
+            self.backend.flush()
+            return self.backend.lines()
+
+    def rlines(self):
+        with self.lock:
+            self.backend.flush()
+            return self.backend.rlines()
+
+    def range(self, ts_from=None, ts_to=None):
+        with self.lock:
+            self.backend.flush()
+            return self.backend.range(ts_from, ts_to)
+
+    def _appended(self, n):
+        self.dirty = True
+        self.pending_rows += n
+        if self.committer.policy == POLICY_ROWS and self.pending_rows >= self.committer.max_rows:
+            self.commit()
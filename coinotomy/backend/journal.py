@@ -0,0 +1,426 @@
+import collections
+import functools
+import json
+import logging
+import os
+import os.path
+import shutil
+import struct
+import threading
+
+from coinotomy.backend.checkpoint import Checkpoint
+from coinotomy.backend.columnarbackend import TAIL_SUFFIX
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.reader import open_reader
+
+RECORD = struct.Struct(b"<Iddd")  # symbol id, timestamp, price, volume
+WRITE_BUFFER_SIZE = 64*1024  # 64K, flushing is up to the caller
+
+# seconds between two background compactions
+COMPACT_INTERVAL = 60
+# uncompacted trades kept in memory before a compaction is started early
+MAX_TAIL_ROWS = 1024*1024
+
+SYMBOLS_FILE = "journal.symbols"
+MANIFEST_FILE = "journal.manifest"
+SEGMENT_FILE = "journal.%08d.log"
+
+log = logging.getLogger("journal")
+
+
+class Journal(object):
+    """
+    Append-only log shared by all watchers that store trades in one directory.
+
+    Trades of all symbols are appended to the current segment file as fixed
+    size records tagged with a symbol id (ids are assigned in journal.symbols).
+    A background thread regularly closes the segment and compacts it: the
+    trades are appended to one file per symbol, written with target_class,
+    after which the segment is deleted. Uncompacted trades are kept in memory,
+    so readers can combine them with a snapshot of the compacted files; once
+    more than max_tail_rows are kept, the compaction starts early. target_class
+    must have a snapshot reader in coinotomy.backend.reader.
+
+    Trades are stored as target_class will read them back, so they don't
+    change when they are compacted.
+
+    journal.manifest records the last compacted segment and the number of rows
+    and size of every compacted file. After a crash during compaction the files
+    are truncated to the manifest and the segment is compacted again.
+    """
+
+    journals = {}
+    journals_lock = threading.Lock()
+
+    def __init__(self, directory, target_class=PackStorageBackend, interval=COMPACT_INTERVAL,
+                 max_tail_rows=MAX_TAIL_ROWS):
+        self.directory = directory
+        self.target_class = target_class
+        self.interval = interval
+        self.max_tail_rows = max_tail_rows
+
+        # protects everything below, target_lock is taken first when both are needed
+        self.lock = threading.RLock()
+        # serializes access to the compacted files between compactor and readers
+        self.target_lock = threading.Lock()
+        # serializes fsyncs of the segment, taken before lock
+        self.sync_lock = threading.Lock()
+
+        self.symbols = self._load_symbols()
+        self.symbol_ids = {name: i for i, name in enumerate(self.symbols)}
+        self.manifest = self._load_manifest()
+        self.tail = collections.OrderedDict()  # segment -> {symbol id: [trades]}
+        self.tail_rows = 0
+
+        self._recover()
+        self.segment = max([self.manifest['segment']] + list(self.tail)) + 1
+        self.tail[self.segment] = collections.defaultdict(list)
+        self.fd = open(self._path(SEGMENT_FILE % self.segment), 'ab', WRITE_BUFFER_SIZE)
+        self.written = 0  # bytes appended to the journal since it was opened
+        self.synced = 0  # bytes of those that were fsynced
+
+        self.stopped = threading.Event()
+        self.wakeup = threading.Event()
+        self.thread = None
+        if interval:
+            self.thread = threading.Thread(target=self.run, args=(), daemon=True)
+            self.thread.start()
+
+    @classmethod
+    def get(cls, directory, target_class=PackStorageBackend):
+        """
+        return the journal of directory, opening it on first use
+        """
+        directory = os.path.abspath(directory)
+        with cls.journals_lock:
+            journal = cls.journals.get(directory)
+            if journal is None:
+                journal = cls.journals[directory] = cls(directory, target_class)
+            assert journal.target_class is target_class
+            return journal
+
+    def close(self):
+        self.stopped.set()
+        self.wakeup.set()
+        with self.journals_lock:
+            if self.journals.get(self.directory) is self:
+                del self.journals[self.directory]
+        with self.sync_lock, self.lock:
+            if self.fd:
+                self.fd.close()
+            self.fd = None
+
+    def symbol_id(self, name):
+        with self.lock:
+            if name not in self.symbol_ids:
+                with open(self._path(SYMBOLS_FILE), 'a') as fd:
+                    fd.write(name + '\n')
+                    fd.flush()
+                    os.fsync(fd.fileno())
+                self.symbol_ids[name] = len(self.symbols)
+                self.symbols.append(name)
+            return self.symbol_ids[name]
+
+    def roundtrip(self, timestamp, price, vol):
+        return self.target_class.roundtrip(timestamp, price, vol)
+
+    def append(self, symbol_id, trades):
+        trades = [self.roundtrip(*row) for row in trades]
+        data = b''.join(RECORD.pack(symbol_id, *row) for row in trades)
+        with self.lock:
+            self.fd.write(data)
+            self.written += len(data)
+            self.tail[self.segment][symbol_id].extend(trades)
+            self.tail_rows += len(trades)
+            if self.tail_rows > self.max_tail_rows:
+                self.wakeup.set()
+
+    def flush(self):
+        with self.lock:
+            self.fd.flush()
+
+    def sync(self):
+        """
+        fsync everything appended so far. The backends of all watchers call
+        this, but a single fsync covers the trades of every call that waited
+        for it.
+        """
+        with self.lock:
+            written = self.written
+        with self.sync_lock:
+            if self.synced >= written:
+                return
+            with self.lock:
+                self.fd.flush()
+                written = self.written
+                fd = self.fd
+            # without the lock, so watchers can append meanwhile
+            os.fsync(fd.fileno())
+            self.synced = written
+
+    def rows(self, symbol_id):
+        """
+        return the number of trades of a symbol, compacted or not
+        """
+        with self.lock:
+            compacted = self.manifest['symbols'].get(self.symbols[symbol_id], [0, 0])[0]
+            return compacted + sum(len(tail.get(symbol_id, ())) for tail in self.tail.values())
+
+    def target(self, symbol_id):
+        """
+        open the compacted file of a symbol, callers must hold target_lock
+        """
+        return self.target_class(os.path.join(self.directory, self.symbols[symbol_id]))
+
+    def run(self):
+        while True:
+            self.wakeup.wait(self.interval)
+            self.wakeup.clear()
+            if self.stopped.is_set():
+                return
+            try:
+                self.compact()
+            except:
+                log.exception("Exception while compacting %s", self.directory)
+
+    def compact(self):
+        """
+        close the current segment and move all closed segments into the per-symbol files
+        """
+        with self.sync_lock, self.lock:
+            if any(self.tail[self.segment].values()):
+                # the segment must be on disk before its trades are compacted, see _recover()
+                self.fd.flush()
+                os.fsync(self.fd.fileno())
+                self.synced = self.written
+                self.fd.close()
+                self.segment += 1
+                self.tail[self.segment] = collections.defaultdict(list)
+                self.fd = open(self._path(SEGMENT_FILE % self.segment), 'ab', WRITE_BUFFER_SIZE)
+            closed = [segment for segment in self.tail if segment != self.segment]
+
+        for segment in closed:
+            self._compact_segment(segment)
+
+    def _compact_segment(self, segment):
+        # readers hold a snapshot of the compacted files, so they don't see the appended trades
+        with self.target_lock:
+            with self.lock:
+                trades = self.tail[segment]
+
+            sizes = {}
+            for symbol_id, rows in trades.items():
+                backend = self.target(symbol_id)
+                try:
+                    self._backup_tail(backend._get_filename(), segment)
+                    backend.append_many(rows)
+                    backend.sync()
+                finally:
+                    backend.unload()
+                sizes[symbol_id] = os.path.getsize(backend._get_filename())
+
+            with self.lock:
+                manifest = self.manifest['symbols']
+                for symbol_id, rows in trades.items():
+                    name = self.symbols[symbol_id]
+                    manifest[name] = [manifest.get(name, [0, 0])[0] + len(rows), sizes[symbol_id]]
+                self.manifest['segment'] = segment
+                self._write_manifest()
+                del self.tail[segment]
+                self.tail_rows -= sum(len(rows) for rows in trades.values())
+
+        for symbol_id in trades:
+            self._remove_tail_backup(self._filename(symbol_id), segment)
+        os.unlink(self._path(SEGMENT_FILE % segment))
+
+    def _backup_tail(self, filename, segment):
+        """
+        copy the uncompressed tail of a columnar file before a segment is
+        compacted into it, it isn't covered by the size in the manifest
+        """
+        tail = filename + TAIL_SUFFIX
+        if not os.path.exists(tail):
+            return
+        backup = tail + '.%08d' % segment
+        shutil.copyfile(tail, backup)
+        with open(backup, 'rb') as fd:
+            os.fsync(fd.fileno())
+
+    def _remove_tail_backup(self, filename, segment):
+        backup = filename + TAIL_SUFFIX + '.%08d' % segment
+        if os.path.exists(backup):
+            os.unlink(backup)
+
+    def _recover(self):
+        # undo the writes of an interrupted compaction
+        for symbol_id, name in enumerate(self.symbols):
+            rows, size = self.manifest['symbols'].get(name, [0, 0])
+            filename = self._filename(symbol_id)
+            if os.path.exists(filename) and os.path.getsize(filename) > size:
+                log.warning("truncating %s to its last compacted size", filename)
+                os.truncate(filename, size)
+                for sidecar in (filename + '.idx', filename + '.sums'):
+                    if os.path.exists(sidecar):
+                        os.unlink(sidecar)  # rebuilt when the file is opened
+
+        for f in sorted(os.listdir(self.directory)):
+            tail, _, segment = f.rpartition(TAIL_SUFFIX + '.')
+            if tail and segment.isdigit():
+                if int(segment) > self.manifest['segment']:
+                    # the tail as it was before the segment was compacted into the file
+                    os.replace(self._path(f), self._path(tail + TAIL_SUFFIX))
+                else:
+                    os.unlink(self._path(f))
+
+        for f in sorted(os.listdir(self.directory)):
+            if not (f.startswith("journal.") and f.endswith(".log")):
+                continue
+            segment = int(f.split('.')[1])
+            if segment <= self.manifest['segment']:
+                os.unlink(self._path(f))
+            else:
+                self.tail[segment] = self._read_segment(self._path(f))
+                self.tail_rows += sum(len(rows) for rows in self.tail[segment].values())
+
+    def _read_segment(self, filename):
+        trades = collections.defaultdict(list)
+        with open(filename, 'rb') as fd:
+            data = fd.read()
+        end = len(data) - len(data) % RECORD.size
+        if end != len(data):
+            os.truncate(filename, end)  # torn write at the end
+        for symbol_id, ts, p, v in RECORD.iter_unpack(data[:end]):
+            trades[symbol_id].append((ts, p, v))
+        return trades
+
+    def _load_symbols(self):
+        if not os.path.exists(self._path(SYMBOLS_FILE)):
+            return []
+        with open(self._path(SYMBOLS_FILE), 'r') as fd:
+            return [line.rstrip('\n') for line in fd if line.strip()]
+
+    def _load_manifest(self):
+        try:
+            with open(self._path(MANIFEST_FILE), 'r') as fd:
+                return json.load(fd)
+        except IOError:
+            return {'segment': 0, 'symbols': {}}
+
+    def _write_manifest(self):
+        tmp = self._path(MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w') as fd:
+            json.dump(self.manifest, fd)
+            fd.flush()
+            os.fsync(fd.fileno())
+        os.replace(tmp, self._path(MANIFEST_FILE))
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _filename(self, symbol_id):
+        return os.path.join(self.directory, self.symbols[symbol_id]) + self.target_class.extension()
+
+
+class JournalStorageBackend(object):
+    """
+    Storage backend that writes to the Journal of its directory.
+
+    Reads combine a snapshot of the compacted file of the symbol with its
+    trades that are still in the journal, taken when the read starts.
+    Trades are read back as target_class stores them, for example with float
+    precision for PackStorageBackend, see roundtrip().
+    """
+
+    def __init__(self, name, target_class=PackStorageBackend):
+        self.template = os.path.expandvars(name)
+        assert self.template
+        directory, symbol = os.path.split(self.template)
+        self.journal = Journal.get(directory or '.', target_class)
+        self.symbol_id = self.journal.symbol_id(symbol)
+        self.checkpoint = Checkpoint(self.template + '.checkpoint')
+
+    @classmethod
+    def of(cls, target_class):
+        """
+        return a factory that only takes a name, for use as STORAGE_CLASS
+        """
+        return functools.partial(cls, target_class=target_class)
+
+    def unload(self):
+        self.flush()
+
+    def roundtrip(self, timestamp, price, vol):
+        """
+        return a trade as it will be read back from this backend
+        """
+        return self.journal.roundtrip(timestamp, price, vol)
+
+    def append(self, timestamp, price, vol):
+        self.journal.append(self.symbol_id, [(timestamp, price, vol)])
+
+    def append_many(self, trades):
+        trades = list(trades)
+        if trades:
+            self.journal.append(self.symbol_id, trades)
+
+    def flush(self):
+        self.journal.flush()
+        self.checkpoint.write(self.journal.rows(self.symbol_id))
+
+    def sync(self):
+        """
+        flush and fsync the trades to disk
+        """
+        self.journal.sync()
+        self.checkpoint.write(self.journal.rows(self.symbol_id), fsync=True)
+
+    def save_state(self, state):
+        """
+        store the resume state of a watcher, written on the next flush()
+        """
+        self.checkpoint.set(state)
+
+    def load_state(self):
+        """
+        return the last saved resume state, or None if it is missing or outdated
+        """
+        return self.checkpoint.load(self.journal.rows(self.symbol_id))
+
+    def lines(self):
+        return self._read(lambda reader: reader.lines(), lambda tail: tail, False)
+
+    def rlines(self):
+        return self._read(lambda reader: reader.rlines(), lambda tail: tail[::-1], True)
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+        """
+        def select(tail):
+            return [row for row in tail
+                    if (ts_from is None or row[0] >= ts_from) and (ts_to is None or row[0] < ts_to)]
+
+        return self._read(lambda reader: reader.range(ts_from, ts_to), select, False)
+
+    def _read(self, read_target, read_tail, tail_first):
+        journal = self.journal
+        filename = journal._filename(self.symbol_id)
+
+        with journal.target_lock:
+            with journal.lock:
+                tail = [row for trades in journal.tail.values() for row in trades.get(self.symbol_id, ())]
+            reader = open_reader(filename) if os.path.exists(filename) else None
+
+        parts = [iter(read_tail(tail))]
+        if reader is not None:
+            parts.insert(1 if tail_first else 0, read_target(reader))
+
+        def rows():
+            try:
+                for part in parts:
+                    yield from part
+            finally:
+                if reader is not None:
+                    reader.close()
+
+        return rows()
@@ -0,0 +1,49 @@
+"""
+Advisory lock on the files of a symbol, so tools don't rewrite what a running collector appends to.
+
+main.py takes the lock of every symbol before its backend is opened and holds
+it as long as the watcher runs. Tools that replace trade files, like
+coinotomy.utils.convert, take it without waiting and leave the symbol alone
+when they don't get it, so those tools only work on symbols that aren't being
+collected. The lock is a flock on a file next to the trade file, for example
+kraken.btc_usd.lock, so it is released when the process dies.
+"""
+
+import fcntl
+import os
+import os.path
+
+SUFFIX = '.lock'
+
+
+class OwnerLock(object):
+    def __init__(self, name):
+        self.filename = os.path.expandvars(name) + SUFFIX
+        self.fd = None
+
+    def acquire(self, blocking=True):
+        """
+        take the lock, return False if another process holds it and blocking is False
+        """
+        assert self.fd is None
+        fd = os.open(self.filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self.fd = fd
+        return True
+
+    def release(self):
+        if self.fd is not None:
+            # the file stays, removing it would let two processes lock different files
+            os.close(self.fd)
+            self.fd = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
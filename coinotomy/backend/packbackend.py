@@ -2,8 +2,19 @@ import os
 import os.path
 import struct
 
+from coinotomy.backend.checkpoint import Checkpoint
+from coinotomy.backend.filepool import POOL, FileReader
+from coinotomy.backend import prefixsum
+from coinotomy.backend.prefixsum import SUFFIX, PrefixSums, read_totals, vwap
 from coinotomy.utils.reservefileiterator import ReverseFileIterator
 
+ROW_SIZE = 16
+# numpy dtype of a row, see as_array()
+DTYPE = [('timestamp', '<f8'), ('price', '<f4'), ('volume', '<f4')]
+READ_SIZE = 1024 * ROW_SIZE  # 16K
+WRITE_BUFFER_SIZE = 4096 * ROW_SIZE  # 64K, flushing is up to the caller
+
+
 class PackStorageBackend(object):
     """
     Store trades in packed format. 16 bytes per row.
@@ -17,48 +28,230 @@ class PackStorageBackend(object):
     def __init__(self, name):
         self.template = os.path.expandvars(name)
         assert self.template
-        self.fd = open(self._get_filename(), 'ab', 16)
+        self.pool = POOL
+        self.loaded = True
+        with self._open() as fd:
+            self.size = fd.tell()
+        self.prefix_sums = None
+        if prefixsum.ENABLED:
+            self.prefix_sums = PrefixSums(self._get_filename() + SUFFIX)
+            self.prefix_sums.open(self._get_filename(), self._read_sum_rows)
+        self.checkpoint = Checkpoint(self.template + '.checkpoint')
 
     def __del__(self):
         self.unload()
 
+    @staticmethod
+    def extension():
+        return ".pack"
+
     def unload(self):
-        if self.fd:
-            self.fd.close()
-        self.fd = None
+        if self.loaded:
+            self.flush()
+            self.pool.close(self._get_filename())
+        self.loaded = False
 
     def append(self, timestamp, price, vol):
         row = self._format_row(timestamp, price, vol)
-        self.fd.write(row)
+        with self._open() as fd:
+            fd.write(row)
+        self.size += ROW_SIZE
+        if self.prefix_sums is not None:
+            self.prefix_sums.add(self.size, *self._unformat_row(row))
+
+    def append_many(self, trades):
+        """
+        append an iterable of (timestamp, price, vol) tuples with a single write
+        """
+        values = [x for row in trades for x in row]
+        if values:
+            data = struct.pack(b"<" + b"dff" * (len(values) // 3), *values)
+            with self._open() as fd:
+                fd.write(data)
+            if self.prefix_sums is not None:
+                end = self.size
+                for row in struct.iter_unpack(b"<dff", data):
+                    end += ROW_SIZE
+                    self.prefix_sums.add(end, *row)
+            self.size += len(data)
 
     def flush(self):
-        self.fd.flush()
+        self._flush()
+        self.checkpoint.write(self.size)
+
+    def sync(self):
+        """
+        flush and fsync the trades to disk
+        """
+        self._flush()
+        self.pool.sync(self._get_filename())
+        self.checkpoint.write(self.size, fsync=True)
+
+    def _flush(self):
+        self.pool.flush(self._get_filename())
+        if self.prefix_sums is not None:
+            self.prefix_sums.flush()
+
+    def save_state(self, state):
+        """
+        store the resume state of a watcher, written on the next flush()
+        """
+        self.checkpoint.set(state)
 
-    def _format_row(self, timestamp, price, vol):
+    def load_state(self):
+        """
+        return the last saved resume state, or None if it is missing or outdated
+        """
+        return self.checkpoint.load(self.size)
+
+    def volume(self, ts_from=None, ts_to=None):
+        """
+        return the total volume of the trades with ts_from <= timestamp < ts_to
+        """
+        return self._totals(ts_from, ts_to)[0]
+
+    def vwap(self, ts_from=None, ts_to=None):
+        """
+        return the volume weighted average price of the trades with ts_from <= timestamp < ts_to,
+        or None if their volume is zero
+        """
+        return vwap(*self._totals(ts_from, ts_to))
+
+    def _totals(self, ts_from, ts_to):
+        self._flush()
+        with open(self._get_filename(), 'rb') as fd:
+            return read_totals(self._get_filename() + SUFFIX, fd, self._read_sum_rows, ts_from, ts_to)
+
+    @classmethod
+    def roundtrip(cls, timestamp, price, vol):
+        """
+        return a trade as it will be read back from this backend
+        """
+        return cls._unformat_row(cls._format_row(timestamp, price, vol))
+
+    @staticmethod
+    def _format_row(timestamp, price, vol):
         return struct.pack(b"<dff", timestamp, price, vol)
 
-    def _unformat_row(self, row):
+    @staticmethod
+    def _unformat_row(row):
         return struct.unpack(b"<dff", row)
 
     def _get_filename(self):
-        return self.template + '.pack'
+        return self.template + self.extension()
 
-    def lines(self):
-        self.fd.flush()
-        unformat = self._unformat_row
+    def _open(self):
+        return self.pool.open(self._get_filename(), WRITE_BUFFER_SIZE)
+
+    @staticmethod
+    def _read_sum_rows(fd, offset):
+        """
+        yield (end offset, timestamp, price, vol) for the complete rows from offset
+        """
+        fd.seek(offset)
+        while True:
+            block = fd.read(READ_SIZE)
+            block = block[:len(block) - len(block) % ROW_SIZE]
+            if not block:
+                return
+            for row in struct.iter_unpack(b"<dff", block):
+                offset += ROW_SIZE
+                yield (offset,) + row
+
+    def as_array(self):
+        """
+        Return a read-only numpy.memmap over all trades in this backend.
+        """
+        self.pool.flush(self._get_filename())
+        return self.open_readonly(self.template)
+
+    @classmethod
+    def open_readonly(cls, name):
+        """
+        Map the pack file belonging to name without opening it for writing.
+
+        The result is a structured array with fields timestamp, price and volume.
+        A trailing partial row, as left behind by an interrupted write, is ignored.
+        """
+        import numpy
+
+        dtype = numpy.dtype(DTYPE)
+        filename = os.path.expandvars(name) + cls.extension()
+        rows = os.path.getsize(filename) // ROW_SIZE
+        if rows == 0:
+            # mmap can't map an empty file
+            return numpy.zeros(0, dtype=dtype)
+        return numpy.memmap(filename, dtype=dtype, mode='r', shape=(rows,))
+
+    def first_at_or_after(self, timestamp):
+        """
+        return the first trade with a timestamp >= timestamp, or None
+        """
+        with self.range(timestamp) as rows:
+            return next(rows, None)
 
-        class iterator:
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+
+        The start of the range is found with a binary search, so this relies on
+        the timestamps in the file being non-decreasing.
+        """
+        self.pool.flush(self._get_filename())
+        bisect = self._bisect
+
+        class iterator(FileReader):
             def __init__(self, filename):
-                self.fd = open(filename, 'rb')
+                FileReader.__init__(self, filename)
+                size = os.fstat(self.fd.fileno()).st_size
+                self.end = size - size % ROW_SIZE
+                self.pos = 0
+                if ts_from is not None:
+                    self.pos = bisect(self.fd, ts_from, self.end // ROW_SIZE) * ROW_SIZE
+                self.fd.seek(self.pos)
+                self.rows = iter(())
+
+            def _next(self):
+                row = next(self.rows, None)
+                if row is None:
+                    size = min(READ_SIZE, self.end - self.pos)
+                    if size <= 0:
+                        raise StopIteration()
+                    block = self.fd.read(size)
+                    self.pos += size
+                    self.rows = struct.iter_unpack(b"<dff", block)
+                    row = next(self.rows)
 
-            def __iter__(self):
-                return self
+                if ts_to is not None and row[0] >= ts_to:
+                    raise StopIteration()
+
+                return row
 
-            def __exit__(self):
-                self.fd.close()
+        return iterator(self._get_filename())
 
-            def __next__(self):
-                line = self.fd.read(16)
+    @staticmethod
+    def _bisect(fd, timestamp, n_rows):
+        """
+        return the index of the first row with a timestamp >= timestamp
+        """
+        lo, hi = 0, n_rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            fd.seek(mid * ROW_SIZE)
+            ts, = struct.unpack(b"<d", fd.read(8))
+            if ts < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def lines(self):
+        self.pool.flush(self._get_filename())
+        unformat = self._unformat_row
+
+        class iterator(FileReader):
+            def _next(self):
+                line = self.fd.read(ROW_SIZE)
                 if not line:
                     raise StopIteration()
 
@@ -67,22 +260,97 @@ class PackStorageBackend(object):
         return iterator(self._get_filename())
 
     def rlines(self):
-        self.fd.flush()
+        self.pool.flush(self._get_filename())
         unformat = self._unformat_row
 
-        class iterator:
+        class iterator(FileReader):
             def __init__(self, filename):
-                self.fd = open(filename, 'rb')
-                self.reverse_file_iterator = iter(ReverseFileIterator(self.fd, blocksize=16))
+                FileReader.__init__(self, filename)
+                self.reverse_file_iterator = iter(ReverseFileIterator(self.fd, blocksize=ROW_SIZE))
 
-            def __iter__(self):
-                return self
-
-            def __exit__(self):
-                self.fd.close()
-
-            def __next__(self):
+            def _next(self):
                 return unformat(next(self.reverse_file_iterator))
 
         return iterator(self._get_filename())
 
+
+class PackReader(object):
+    """
+    Read-only snapshot of a pack file, for use in other processes while a watcher appends to it.
+
+    The snapshot holds the complete rows at the time the reader was opened.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.fd = open(filename, 'rb')
+        size = os.fstat(self.fd.fileno()).st_size
+        self.end = size - size % ROW_SIZE
+
+    def close(self):
+        self.fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lines(self):
+        return self.range()
+
+    def volume(self, ts_from=None, ts_to=None):
+        """
+        return the total volume of the trades with ts_from <= timestamp < ts_to
+        """
+        return self._totals(ts_from, ts_to)[0]
+
+    def vwap(self, ts_from=None, ts_to=None):
+        """
+        return the volume weighted average price of the trades with ts_from <= timestamp < ts_to,
+        or None if their volume is zero
+        """
+        return vwap(*self._totals(ts_from, ts_to))
+
+    def _totals(self, ts_from, ts_to):
+        return read_totals(self.filename + SUFFIX, self.fd, PackStorageBackend._read_sum_rows, ts_from, ts_to, self.end)
+
+    def as_array(self):
+        """
+        Return a read-only numpy.memmap over the trades of the snapshot, see PackStorageBackend.open_readonly().
+        """
+        import numpy
+
+        if self.end == 0:
+            return numpy.zeros(0, dtype=numpy.dtype(DTYPE))
+        return numpy.memmap(self.filename, dtype=numpy.dtype(DTYPE), mode='r', shape=(self.end // ROW_SIZE,))
+
+    def rlines(self):
+        end = self.end
+        while end > 0:
+            start = max(0, end - READ_SIZE)
+            self.fd.seek(start)
+            yield from reversed(list(struct.iter_unpack(b"<dff", self.fd.read(end - start))))
+            end = start
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+        """
+        pos = 0
+        if ts_from is not None:
+            pos = PackStorageBackend._bisect(self.fd, ts_from, self.end // ROW_SIZE) * ROW_SIZE
+        return self._read(pos, None, ts_to)
+
+    def _read(self, pos, ts_from, ts_to):
+        while pos < self.end:
+            # seek every block, other iterators may share the file
+            size = min(READ_SIZE, self.end - pos)
+            self.fd.seek(pos)
+            block = self.fd.read(size)
+            pos += size
+            for row in struct.iter_unpack(b"<dff", block):
+                if ts_to is not None and row[0] >= ts_to:
+                    return
+                if ts_from is None or row[0] >= ts_from:
+                    yield row
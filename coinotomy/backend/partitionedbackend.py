@@ -0,0 +1,179 @@
+import calendar
+import functools
+import os
+import os.path
+import time
+
+from coinotomy.backend.checkpoint import Checkpoint
+from coinotomy.backend.packbackend import PackStorageBackend
+
+DAY = 24*60*60
+
+
+class PartitionedStorageBackend(object):
+    """
+    Store trades in one file per UTC day, using another backend for the files.
+
+    kraken.btc_usd becomes a directory with files like kraken.btc_usd/2017-10-18.pack.
+    The partition is picked from the timestamp of every trade, lines() and rlines()
+    chain the partitions, range() only opens the partitions it needs and old data
+    can be dropped per day with drop_before().
+    """
+
+    def __init__(self, name, backend_class=PackStorageBackend):
+        self.template = os.path.expandvars(name)
+        assert self.template
+        self.backend_class = backend_class
+        if not os.path.exists(self.template):
+            os.makedirs(self.template)
+        self.checkpoint = Checkpoint(self.template + '.checkpoint')
+
+        # the partition currently open for writing
+        self.backend = None
+        self.day = None
+        self.day_start = None
+        self.day_end = None
+
+    def __del__(self):
+        self.unload()
+
+    @classmethod
+    def of(cls, backend_class):
+        """
+        return a factory that only takes a name, for use as STORAGE_CLASS
+        """
+        return functools.partial(cls, backend_class=backend_class)
+
+    def unload(self):
+        if self.backend:
+            self.backend.unload()
+            self.checkpoint.write(self._marker())
+        self.backend = None
+        self.day = None
+
+    def roundtrip(self, timestamp, price, vol):
+        """
+        return a trade as it will be read back from this backend
+        """
+        return self.backend_class.roundtrip(timestamp, price, vol)
+
+    def append(self, timestamp, price, vol):
+        self._writer(timestamp).append(timestamp, price, vol)
+
+    def append_many(self, trades):
+        run = []
+        for row in trades:
+            if run and not (self.day_start <= row[0] < self.day_end):
+                self.backend.append_many(run)
+                run = []
+            if not run:
+                self._writer(row[0])
+            run.append(row)
+        if run:
+            self.backend.append_many(run)
+
+    def flush(self):
+        if self.backend:
+            self.backend.flush()
+        self.checkpoint.write(self._marker())
+
+    def sync(self):
+        """
+        flush and fsync the trades to disk
+        """
+        if self.backend:
+            self.backend.sync()
+        self.checkpoint.write(self._marker(), fsync=True)
+
+    def save_state(self, state):
+        """
+        store the resume state of a watcher, written on the next flush()
+        """
+        self.checkpoint.set(state)
+
+    def load_state(self):
+        """
+        return the last saved resume state, or None if it is missing or outdated
+        """
+        return self.checkpoint.load(self._marker())
+
+    def _marker(self):
+        """
+        the newest partition and its size
+        """
+        partitions = self.partitions()
+        if not partitions:
+            return None
+        filename = os.path.join(self.template, partitions[-1] + self.backend_class.extension())
+        return [partitions[-1], os.path.getsize(filename)]
+
+    def partitions(self):
+        """
+        return the names of all partitions, oldest first
+        """
+        extension = self.backend_class.extension()
+        return sorted(f[:-len(extension)] for f in os.listdir(self.template) if f.endswith(extension))
+
+    def drop_before(self, timestamp):
+        """
+        delete all partitions that only hold trades before timestamp
+        """
+        for day in self.partitions():
+            if _day_start(day) + DAY > timestamp:
+                break
+            if day == self.day:
+                self.unload()
+            for f in os.listdir(self.template):
+                if f.split('.')[0] == day:
+                    os.unlink(os.path.join(self.template, f))
+
+    def lines(self):
+        for day in self.partitions():
+            yield from self._read(day, lambda backend: backend.lines())
+
+    def rlines(self):
+        for day in self.partitions()[::-1]:
+            yield from self._read(day, lambda backend: backend.rlines())
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to, skipping
+        partitions outside of the range.
+        """
+        def read(backend):
+            if hasattr(backend, 'range'):
+                return backend.range(ts_from, ts_to)
+            return (row for row in backend.lines()
+                    if (ts_from is None or row[0] >= ts_from) and (ts_to is None or row[0] < ts_to))
+
+        for day in self.partitions():
+            start = _day_start(day)
+            if ts_from is not None and start + DAY <= ts_from:
+                continue
+            if ts_to is not None and start >= ts_to:
+                break
+            yield from self._read(day, read)
+
+    def _read(self, day, read):
+        if day == self.day:
+            yield from read(self.backend)
+            return
+
+        backend = self.backend_class(os.path.join(self.template, day))
+        try:
+            yield from read(backend)
+        finally:
+            backend.unload()
+
+    def _writer(self, timestamp):
+        if self.backend is None or not (self.day_start <= timestamp < self.day_end):
+            self.unload()
+            self.day = time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+            self.day_start = _day_start(self.day)
+            self.day_end = self.day_start + DAY
+            self.backend = self.backend_class(os.path.join(self.template, self.day))
+        return self.backend
+
+
+def _day_start(day):
+    return calendar.timegm(time.strptime(day, '%Y-%m-%d'))
@@ -0,0 +1,193 @@
+"""
+Prefix sums of volume and price * volume, for VWAP and volume queries over any time window.
+
+The sidecar next to a trade file, for example kraken.btc_usd.pack.sums, holds
+a fixed width record after every STRIDE trades:
+
+    timestamp of the trade, end offset of its row in the trade file, cumulative volume, cumulative price * volume
+
+The totals of the trades with timestamp < ts are found with a binary search
+over the records and a scan of at most STRIDE rows of the trade file after the
+last record before ts; a window is the difference of two of these. The rows
+after the last record are always scanned. Like range(), this relies on the
+timestamps in the trade file being non-decreasing.
+
+The sidecar is only maintained when ENABLED is set, from PREFIX_SUMS in the
+config. Without it, queries scan the trade file. The sums are built from the
+values as the backend stores them, so they match what lines() returns. Being
+differences of running totals, the results are exact up to about 1e-16 of the
+total volume of the file.
+"""
+
+import itertools
+import os
+import os.path
+import struct
+
+ENTRY = struct.Struct(b"<dQdd")  # timestamp, end offset, cumulative volume, cumulative price * volume
+SUFFIX = '.sums'
+STRIDE = 64  # trades per record, 0.5 bytes per trade
+
+# set by main.py from PREFIX_SUMS in the config
+ENABLED = False
+
+
+def vwap(volume, price_volume):
+    return price_volume / volume if volume else None
+
+
+def read_totals(filename, data_fd, read_rows, ts_from=None, ts_to=None, end=None):
+    """
+    return (volume, price * volume) of the trades with ts_from <= timestamp < ts_to
+    that end at or before byte end of the trade file open as data_fd.
+
+    read_rows(data_fd, offset) must yield (end offset, timestamp, price, vol) for
+    the complete rows of the trade file from offset on.
+    """
+    if not os.path.exists(filename):
+        return _totals(None, 0, data_fd, read_rows, ts_from, ts_to, end)
+
+    with open(filename, 'rb') as fd:
+        n = os.fstat(fd.fileno()).st_size // ENTRY.size
+        if end is not None:
+            n = _bisect(fd, n, 1, end, right=True)
+        return _totals(fd, n, data_fd, read_rows, ts_from, ts_to, end)
+
+
+def _totals(fd, n, data_fd, read_rows, ts_from, ts_to, end):
+    if ts_from is not None and ts_to is not None and ts_to <= ts_from:
+        return 0.0, 0.0
+    vol_hi, pv_hi = _prefix(fd, n, data_fd, read_rows, ts_to, end)
+    if ts_from is None:
+        return vol_hi, pv_hi
+    vol_lo, pv_lo = _prefix(fd, n, data_fd, read_rows, ts_from, end)
+    return vol_hi - vol_lo, pv_hi - pv_lo
+
+
+def _prefix(fd, n, data_fd, read_rows, ts, end):
+    """
+    return (volume, price * volume) of the trades with timestamp < ts, or of all trades if ts is None,
+    from the first n records of the sidecar fd and the rows after them
+    """
+    k = n if ts is None else _bisect(fd, n, 0, ts)
+    offset, volume, price_volume = _cumulative(fd, k)
+    for row_end, timestamp, price, vol in read_rows(data_fd, offset):
+        if (end is not None and row_end > end) or (ts is not None and timestamp >= ts):
+            break
+        volume += vol
+        price_volume += price * vol
+    return volume, price_volume
+
+
+def _entry(fd, i):
+    fd.seek(i * ENTRY.size)
+    return ENTRY.unpack(fd.read(ENTRY.size))
+
+
+def _cumulative(fd, i):
+    """
+    return (end offset, volume, price * volume) of the trades up to record i
+    """
+    if i == 0:
+        return 0, 0.0, 0.0
+    return _entry(fd, i - 1)[1:]
+
+
+def _bisect(fd, n, field, value, right=False):
+    """
+    return the index of the first entry with entry[field] >= value, or > value if right
+    """
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi) // 2
+        x = _entry(fd, mid)[field]
+        if x < value or (right and x == value):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class PrefixSums(object):
+    """
+    Writing side of a sidecar, owned by the backend of the trade file.
+
+    Records are buffered in memory until flush(). When the sidecar doesn't
+    match the trade file it is rebuilt by scanning the trade file once.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.end = 0  # end offset of the last trade that was added
+        self.volume = 0.0
+        self.price_volume = 0.0
+        self.rows = 0  # trades added since the last record
+        self.pending = []
+
+    def open(self, data_filename, read_rows):
+        """
+        load the last record, rebuilding the sidecar if it is stale, then add
+        the trades that were appended after it.
+
+        read_rows(fd, offset) must yield (end offset, timestamp, price, vol) for
+        the complete rows of the trade file from offset on.
+        """
+        last, previous = self._tail()
+        if last is not None and not self._matches(data_filename, read_rows, last, previous):
+            os.unlink(self.filename)
+            last = None
+
+        if last is None:
+            self.end, self.volume, self.price_volume = 0, 0.0, 0.0
+        else:
+            _, self.end, self.volume, self.price_volume = last
+        self.rows = 0
+
+        with open(data_filename, 'rb') as fd:
+            for end, ts, p, v in read_rows(fd, self.end):
+                self.add(end, ts, p, v)
+        self.flush()
+
+    def add(self, end, timestamp, price, vol):
+        """
+        called for every row appended to the trade file, with the offset after its last byte.
+        """
+        self.end = end
+        self.volume += vol
+        self.price_volume += price * vol
+        self.rows += 1
+        if self.rows == STRIDE:
+            self.pending.append(ENTRY.pack(timestamp, end, self.volume, self.price_volume))
+            self.rows = 0
+
+    def flush(self):
+        if not self.pending:
+            return
+        with open(self.filename, 'ab') as fd:
+            fd.write(b''.join(self.pending))
+        self.pending = []
+
+    def _tail(self):
+        """
+        return the last two records of the sidecar, dropping a partially written one
+        """
+        if not os.path.exists(self.filename):
+            return None, None
+        size = os.path.getsize(self.filename)
+        if size % ENTRY.size:
+            size -= size % ENTRY.size
+            os.truncate(self.filename, size)
+        n = size // ENTRY.size
+        if n == 0:
+            return None, None
+        with open(self.filename, 'rb') as fd:
+            return _entry(fd, n - 1), _entry(fd, n - 2) if n > 1 else None
+
+    @staticmethod
+    def _matches(data_filename, read_rows, last, previous):
+        # the last record must describe the STRIDE-th row after the one before it
+        if last[1] > os.path.getsize(data_filename):
+            return False
+        with open(data_filename, 'rb') as fd:
+            rows = list(itertools.islice(read_rows(fd, previous[1] if previous else 0), STRIDE))
+        return len(rows) == STRIDE and rows[-1][0] == last[1] and rows[-1][1] == last[0]
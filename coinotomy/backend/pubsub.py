@@ -0,0 +1,120 @@
+"""
+Deliver the trades of all watchers to consumers in the same process.
+
+    subscription = BUS.subscribe(["kraken.btc_usd", "bitstamp.btc_usd"])
+    for name, trades in subscription:
+        ...
+
+Watcher.run publishes every batch that is appended to its backend, after
+duplicates were dropped, so consumers see what is stored without reading
+it back from disk. Every subscription has its own bounded queue. A watcher
+never waits for a consumer: when the queue of a subscription is full, the
+batch is dropped for that subscription and counted in its dropped attribute.
+"""
+
+import queue
+import threading
+
+DEFAULT_QUEUE_SIZE = 1024  # batches
+
+
+class Subscription(object):
+    """
+    Queue of (watcher name, trades) batches for one consumer, trades is a
+    tuple shared with the other subscriptions.
+    """
+
+    def __init__(self, bus, names, maxsize):
+        self.bus = bus
+        self.names = None if names is None else frozenset(names)
+        self.queue = queue.Queue(maxsize)
+        self.lock = threading.Lock()
+        self.dropped = 0  # trades in batches that didn't fit in the queue
+
+    def wants(self, name):
+        return self.names is None or name in self.names
+
+    def put(self, name, trades):
+        try:
+            self.queue.put_nowait((name, trades))
+        except queue.Full:
+            with self.lock:
+                self.dropped += len(trades)
+
+    def get(self, timeout=None):
+        """
+        return the next (name, trades) batch, raises queue.Empty after timeout seconds
+        """
+        return self.queue.get(timeout=timeout)
+
+    def get_all(self):
+        """
+        return the batches that are queued, without waiting
+        """
+        batches = []
+        while True:
+            try:
+                batches.append(self.queue.get_nowait())
+            except queue.Empty:
+                return batches
+
+    def __iter__(self):
+        while True:
+            yield self.get()
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class TradeBus(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = []
+
+    def subscribe(self, names=None, maxsize=DEFAULT_QUEUE_SIZE):
+        """
+        return a Subscription to the watchers with the given names, or to all of them
+        """
+        subscription = Subscription(self, names, maxsize)
+        with self.lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+
+    def publish(self, name, trades):
+        # the list is replaced on change, so it can be read without the lock
+        for subscription in self.subscriptions:
+            if subscription.wants(name):
+                subscription.put(name, trades)
+
+
+BUS = TradeBus()
+
+
+class PublishingBackend(object):
+    """
+    Storage backend wrapper that publishes every appended batch to a TradeBus.
+
+    Everything not defined here is passed to the wrapped backend.
+    """
+
+    def __init__(self, backend, bus, name):
+        self.backend = backend
+        self.bus = bus
+        self.name = name
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def append(self, timestamp, price, vol):
+        self.backend.append(timestamp, price, vol)
+        self.bus.publish(self.name, ((timestamp, price, vol),))
+
+    def append_many(self, trades):
+        trades = list(trades)
+        self.backend.append_many(trades)
+        if trades:
+            self.bus.publish(self.name, tuple(trades))
@@ -1,6 +1,11 @@
+import bisect
+
+
 class RamdiskStorageBackend(object):
     def __init__(self):
         self.arr = []
+        self.state = None
+        self.pending_state = None
 
     def unload(self):
         pass
@@ -8,8 +13,23 @@ class RamdiskStorageBackend(object):
     def append(self, timestamp, price, vol):
         self.arr.append((timestamp, price, vol))
 
+    def append_many(self, trades):
+        self.arr.extend(trades)
+
     def flush(self):
-        pass
+        if self.pending_state is not None:
+            self.state = self.pending_state
+        self.pending_state = None
+
+    def sync(self):
+        self.flush()
+
+    def save_state(self, state):
+        if state is not None:
+            self.pending_state = state
+
+    def load_state(self):
+        return self.state
 
     def lines(self):
         for line in self.arr:
@@ -17,4 +37,11 @@ class RamdiskStorageBackend(object):
 
     def rlines(self):
         for line in self.arr[::-1]:
-            yield line
\ No newline at end of file
+            yield line
+
+    def range(self, ts_from=None, ts_to=None):
+        lo = 0 if ts_from is None else bisect.bisect_left(self.arr, (ts_from,))
+        for line in self.arr[lo:]:
+            if ts_to is not None and line[0] >= ts_to:
+                break
+            yield line
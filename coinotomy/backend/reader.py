@@ -0,0 +1,121 @@
+"""
+Read trade files from other processes while the collector keeps writing them.
+
+    with open_reader("coinotomy_data/kraken.btc_usd.pack") as reader:
+        for timestamp, price, vol in reader.range(ts_from, ts_to):
+            ...
+
+A reader only opens the file for reading and never touches the writer, its
+sidecar files or the file handles of the collector. The end of the file is
+captured when the reader is opened, trades appended later (and a row that is
+half written at that moment) are not returned; open a new reader to see them.
+
+The directory of a symbol stored with PartitionedStorageBackend is read with a
+PartitionedReader, which chains the readers of the daily files.
+"""
+
+import os
+import os.path
+
+from coinotomy.backend.columnarbackend import ColumnarStorageBackend, ColumnarReader
+from coinotomy.backend.csvbackend import ARRAY_CHUNK_ROWS, CsvStorageBackend, CsvReader
+from coinotomy.backend.packbackend import PackStorageBackend, PackReader
+from coinotomy.backend.partitionedbackend import DAY, _day_start
+
+READERS = {
+    CsvStorageBackend.extension(): CsvReader,
+    PackStorageBackend.extension(): PackReader,
+    ColumnarStorageBackend.extension(): ColumnarReader,
+}
+
+
+def open_reader(path):
+    """
+    return a snapshot reader for the trade file at path, picked by its extension,
+    or for the partitions in the directory at path
+    """
+    if os.path.isdir(path):
+        return PartitionedReader(path)
+    for extension, reader_class in READERS.items():
+        if path.endswith(extension):
+            return reader_class(path)
+    raise ValueError("don't know how to read %s" % path)
+
+
+class PartitionedReader(object):
+    """
+    Read-only snapshot of the daily files of a PartitionedStorageBackend.
+
+    The partitions are listed when the reader is opened. The newest one, which
+    the collector appends to, is opened right away; older ones are complete
+    and opened when they are read.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.partitions = self.find_partitions(directory)
+        self.newest = open_reader(self.partitions[-1][1]) if self.partitions else None
+
+    @staticmethod
+    def find_partitions(directory):
+        """
+        return (start of the day, path) of the readable partitions in directory, oldest first
+        """
+        partitions = []
+        for f in sorted(os.listdir(directory)):
+            for extension in READERS:
+                if f.endswith(extension):
+                    try:
+                        start = _day_start(f[:-len(extension)])
+                    except ValueError:
+                        continue  # not a partition
+                    partitions.append((start, os.path.join(directory, f)))
+        return partitions
+
+    def close(self):
+        if self.newest is not None:
+            self.newest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lines(self):
+        for reader in self._readers(self.partitions):
+            yield from reader.lines()
+
+    def rlines(self):
+        for reader in self._readers(self.partitions[::-1]):
+            yield from reader.rlines()
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to, skipping
+        partitions outside of the range.
+        """
+        for reader in self._readers(self._select(ts_from, ts_to)):
+            yield from reader.range(ts_from, ts_to)
+
+    def read_arrays(self, ts_from=None, ts_to=None, chunk_rows=ARRAY_CHUNK_ROWS):
+        """
+        Yield (timestamps, prices, volumes) chunks of float64 numpy arrays of up to
+        chunk_rows trades, read per partition with coinotomy.utils.align.iter_arrays().
+        """
+        from coinotomy.utils.align import iter_arrays
+
+        for reader in self._readers(self._select(ts_from, ts_to)):
+            yield from iter_arrays(reader, ts_from, ts_to, chunk_rows)
+
+    def _select(self, ts_from, ts_to):
+        return [(start, path) for start, path in self.partitions
+                if (ts_from is None or start + DAY > ts_from) and (ts_to is None or start < ts_to)]
+
+    def _readers(self, partitions):
+        for start, path in partitions:
+            if path == self.partitions[-1][1]:
+                yield self.newest
+            else:
+                with open_reader(path) as reader:
+                    yield reader
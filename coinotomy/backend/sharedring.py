@@ -0,0 +1,167 @@
+"""
+Live trades in shared memory, for other processes on the same machine.
+
+The collector keeps one ring of the most recent trades per symbol in a
+multiprocessing.shared_memory segment named PREFIX + watcher name, for example
+coinotomy.kraken.btc_usd. Consumers attach with RingReader and poll:
+
+    reader = RingReader("kraken.btc_usd")
+    while True:
+        for timestamp, price, vol in reader.poll():
+            ...
+
+Segment layout: a header with the capacity and the number of trades ever
+written (seq), followed by capacity rows of three little-endian doubles. Trade
+number i is stored in row i % capacity. There is a single writer per segment,
+which writes the row before it increments seq, so readers need no lock; they
+check seq again after copying and drop the rows that were overwritten meanwhile.
+
+poll() copies the new rows out of the segment and unpacks them into tuples,
+so the cost of reading grows with the number of trades like for any other
+queue; what the ring saves is the round trip through the trade files. Every
+ring takes capacity * 24 bytes of /dev/shm, for every watcher.
+"""
+
+import struct
+from multiprocessing import resource_tracker, shared_memory
+
+PREFIX = "coinotomy."
+DEFAULT_CAPACITY = 64*1024
+
+HEADER = struct.Struct(b"<QQ")  # capacity, seq
+ROW = struct.Struct(b"<ddd")
+
+
+def _segment_size(capacity):
+    return HEADER.size + capacity * ROW.size
+
+
+class SharedRing(object):
+    """
+    Writing side of a ring, owned by the collector.
+    """
+
+    def __init__(self, name, capacity=DEFAULT_CAPACITY):
+        try:
+            self.shm = shared_memory.SharedMemory(PREFIX + name, create=True, size=_segment_size(capacity))
+            HEADER.pack_into(self.shm.buf, 0, capacity, 0)
+        except FileExistsError:
+            # left behind by a previous run, continue it so attached readers keep working
+            self.shm = shared_memory.SharedMemory(PREFIX + name)
+            if HEADER.unpack_from(self.shm.buf, 0)[0] != capacity:
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = shared_memory.SharedMemory(PREFIX + name, create=True, size=_segment_size(capacity))
+                HEADER.pack_into(self.shm.buf, 0, capacity, 0)
+        self.capacity, self.seq = HEADER.unpack_from(self.shm.buf, 0)
+
+    def append_many(self, trades):
+        buf = self.shm.buf
+        for row in trades:
+            ROW.pack_into(buf, HEADER.size + (self.seq % self.capacity) * ROW.size, *row)
+            self.seq += 1
+            # publish every row on its own, a reader can't tell a half written batch apart
+            struct.pack_into(b"<Q", buf, 8, self.seq)
+
+    def close(self, unlink=True):
+        if self.shm is None:
+            return
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+        self.shm = None
+
+
+class RingReader(object):
+    """
+    Reading side of a ring, to be used from any local process.
+
+    shared_memory can't map read-only, readers must not write to the segment.
+    """
+
+    def __init__(self, name, from_start=False):
+        self.shm = shared_memory.SharedMemory(PREFIX + name)
+        # the segment belongs to the collector, don't unlink it when this process exits
+        resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.capacity, seq = HEADER.unpack_from(self.shm.buf, 0)
+        self.seq = max(0, seq - self.capacity) if from_start else seq
+        self.missed = 0
+
+    def written(self):
+        """
+        return the number of trades written to the ring so far
+        """
+        return struct.unpack_from(b"<Q", self.shm.buf, 8)[0]
+
+    def poll(self):
+        """
+        return the trades written since the previous call, oldest first.
+
+        Trades that were overwritten before they could be read are skipped and
+        counted in self.missed.
+        """
+        seq = self.written()
+        if seq == self.seq:
+            return []
+
+        start = max(self.seq, seq - self.capacity)
+        rows = self._read(start, seq)
+
+        # rows the writer may have overwritten while they were copied
+        valid_from = self.written() + 1 - self.capacity
+        if valid_from > start:
+            rows = rows[valid_from - start:]
+            start = valid_from
+
+        self.missed += start - self.seq
+        self.seq = seq
+        return rows
+
+    def _read(self, start, end):
+        buf = self.shm.buf
+        first = start % self.capacity
+        n = end - start
+        if first + n <= self.capacity:
+            chunks = [(first, n)]
+        else:
+            chunks = [(first, self.capacity - first), (0, first + n - self.capacity)]
+
+        rows = []
+        for row, count in chunks:
+            offset = HEADER.size + row * ROW.size
+            data = bytes(buf[offset:offset + count * ROW.size])
+            rows.extend(ROW.iter_unpack(data))
+        return rows
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+        self.shm = None
+
+
+class SharedRingBackend(object):
+    """
+    Storage backend wrapper that also publishes every appended trade to a SharedRing.
+
+    Everything not defined here is passed to the wrapped backend.
+    """
+
+    def __init__(self, backend, name, capacity=DEFAULT_CAPACITY):
+        self.backend = backend
+        self.ring = SharedRing(name, capacity)
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def append(self, timestamp, price, vol):
+        self.backend.append(timestamp, price, vol)
+        self.ring.append_many(((timestamp, price, vol),))
+
+    def append_many(self, trades):
+        trades = list(trades)
+        self.backend.append_many(trades)
+        self.ring.append_many(trades)
+
+    def unload(self):
+        self.backend.unload()
+        self.ring.close()
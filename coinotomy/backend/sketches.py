@@ -0,0 +1,386 @@
+"""
+Trade size quantiles and volume-at-price profiles per symbol and UTC day.
+
+Every day is summarized by a mergeable quantile sketch of the trade sizes and
+a volume profile: the volume traded in price buckets of a fixed tick size.
+Finished days are appended to a file next to the trade file, for example
+kraken.btc_usd.sketch, as one json line each; the day in progress is kept in
+memory and rebuilt from its trades on startup, like the bars in
+coinotomy.backend.candles. The first start reads all stored trades, in numpy
+chunks.
+
+    sketch = read_sketch("coinotomy_data/kraken.btc_usd", ts_from, ts_to)
+    sketch.size.quantile(0.99)  # 99th percentile of the trade size
+    sketch.price.buckets()  # [(low, high, volume)], the volume profile
+
+Sketches of several days or symbols are combined with merge(), see aggregate();
+their volume profiles must have the same tick size.
+"""
+
+import itertools
+import json
+import math
+import os
+import os.path
+
+from coinotomy.backend.filepool import POOL
+from coinotomy.utils.reservefileiterator import ReserveLineIterator
+
+DAY = 24*60*60
+
+# relative error of the trade size quantiles
+ACCURACY = 0.005
+# width of the price buckets of the volume profile, in the quote currency
+PRICE_TICK = 1.0
+
+
+class LogSketch(object):
+    """
+    Mergeable quantile sketch with relative error guarantees, after DDSketch.
+
+    Values are counted in buckets whose boundaries grow by a factor gamma, so
+    every value in a bucket is within `accuracy` of the value reported for it.
+    The number of buckets grows with the logarithm of the range of the values,
+    not with their number. Values <= 0 are counted as 0.
+    """
+
+    def __init__(self, accuracy=ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.counts = {}  # bucket index -> weight
+        self.zero = 0.0
+        self.total = 0.0
+
+    def add(self, value, weight=1.0):
+        if value > 0:
+            i = math.ceil(math.log(value) / self.log_gamma)
+            self.counts[i] = self.counts.get(i, 0.0) + weight
+        else:
+            self.zero += weight
+        self.total += weight
+
+    def add_many(self, values, weights=None):
+        """
+        add a numpy array of values, weighing 1 each or as much as the array weights
+        """
+        import numpy
+
+        if weights is None:
+            weights = numpy.ones(len(values))
+        positive = values > 0
+        self.zero += float(weights[~positive].sum())
+        self.total += float(weights.sum())
+        _add_buckets(self.counts, numpy.ceil(numpy.log(values[positive]) / self.log_gamma), weights[positive])
+
+    def merge(self, other):
+        assert self.accuracy == other.accuracy
+        for i, weight in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0.0) + weight
+        self.zero += other.zero
+        self.total += other.total
+
+    def quantile(self, q):
+        """
+        return the value at quantile q (0 <= q <= 1) of the weight, or None if empty
+        """
+        if not self.total:
+            return None
+        rank = q * self.total
+        cumulative = self.zero
+        if self.zero and cumulative >= rank:
+            return 0.0
+        for i in sorted(self.counts):
+            cumulative += self.counts[i]
+            if cumulative >= rank:
+                return self._value(i)
+        return self._value(max(self.counts))
+
+    def buckets(self):
+        """
+        return (low, high, weight) for all buckets with weight, lowest first
+        """
+        return [(self.gamma ** (i - 1), self.gamma ** i, self.counts[i]) for i in sorted(self.counts)]
+
+    def _value(self, i):
+        return 2 * self.gamma ** i / (self.gamma + 1)
+
+    def to_json(self):
+        return {'accuracy': self.accuracy, 'zero': self.zero,
+                'counts': {str(i): weight for i, weight in self.counts.items()}}
+
+    @classmethod
+    def from_json(cls, js):
+        sketch = cls(js['accuracy'])
+        sketch.counts = {int(i): weight for i, weight in js['counts'].items()}
+        sketch.zero = js['zero']
+        sketch.total = sketch.zero + sum(sketch.counts.values())
+        return sketch
+
+
+class PriceProfile(object):
+    """
+    Volume traded at price, in buckets [i * tick, (i + 1) * tick).
+    """
+
+    def __init__(self, tick=PRICE_TICK):
+        self.tick = tick
+        self.counts = {}  # bucket index -> volume
+
+    def add(self, price, vol):
+        i = math.floor(price / self.tick)
+        self.counts[i] = self.counts.get(i, 0.0) + vol
+
+    def add_many(self, prices, vols):
+        """
+        add numpy arrays of prices and volumes
+        """
+        import numpy
+
+        _add_buckets(self.counts, numpy.floor(prices / self.tick), vols)
+
+    def merge(self, other):
+        if not self.counts:
+            self.tick = other.tick
+        elif other.counts and other.tick != self.tick:
+            raise ValueError("can't merge volume profiles with tick sizes %s and %s" % (self.tick, other.tick))
+        for i, vol in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0.0) + vol
+
+    def buckets(self):
+        """
+        return (low, high, volume) for all buckets with volume, lowest first
+        """
+        return [(i * self.tick, (i + 1) * self.tick, self.counts[i]) for i in sorted(self.counts)]
+
+    def to_json(self):
+        return {'tick': self.tick, 'counts': {str(i): vol for i, vol in self.counts.items()}}
+
+    @classmethod
+    def from_json(cls, js):
+        profile = cls(js['tick'])
+        profile.counts = {int(i): vol for i, vol in js['counts'].items()}
+        return profile
+
+
+def _add_buckets(counts, indices, weights):
+    """
+    add the sum of the weights per bucket index to counts
+    """
+    import numpy
+
+    if not len(indices):
+        return
+    buckets, inverse = numpy.unique(indices.astype(numpy.int64), return_inverse=True)
+    for i, weight in zip(buckets.tolist(), numpy.bincount(inverse, weights=weights).tolist()):
+        counts[i] = counts.get(i, 0.0) + weight
+
+
+class DaySketch(object):
+    """
+    The sketches of one day of trades, or of several merged days.
+    """
+
+    def __init__(self, day=None, accuracy=ACCURACY, tick=PRICE_TICK):
+        self.day = day
+        self.trades = 0
+        self.size = LogSketch(accuracy)  # trade sizes, every trade weighs 1
+        self.price = PriceProfile(tick)  # volume at price
+
+    def add(self, price, vol):
+        self.trades += 1
+        self.size.add(vol)
+        self.price.add(price, vol)
+
+    def add_many(self, prices, vols):
+        """
+        add numpy arrays of prices and volumes
+        """
+        self.trades += len(prices)
+        self.size.add_many(vols)
+        self.price.add_many(prices, vols)
+
+    def merge(self, other):
+        self.trades += other.trades
+        self.size.merge(other.size)
+        self.price.merge(other.price)
+
+    def to_json(self):
+        return {'day': self.day, 'trades': self.trades,
+                'size': self.size.to_json(), 'price': self.price.to_json()}
+
+    @classmethod
+    def from_json(cls, js):
+        sketch = cls(js['day'])
+        sketch.trades = js['trades']
+        sketch.size = LogSketch.from_json(js['size'])
+        sketch.price = PriceProfile.from_json(js['price'])
+        return sketch
+
+
+def sketch_filename(name):
+    return os.path.expandvars(name) + '.sketch'
+
+
+def read_days(name, ts_from=None, ts_to=None):
+    """
+    return the written DaySketches of a symbol with ts_from <= day < ts_to
+    """
+    return _select(_read_file(sketch_filename(name)), ts_from, ts_to)
+
+
+def read_sketch(name, ts_from=None, ts_to=None):
+    """
+    return a DaySketch of all written days of a symbol with ts_from <= day < ts_to
+    """
+    return merge_days(read_days(name, ts_from, ts_to))
+
+
+def aggregate(names, ts_from=None, ts_to=None):
+    """
+    return a DaySketch of the written days of several symbols, for example the
+    same pair on several exchanges
+    """
+    return merge_days(day for name in names for day in read_days(name, ts_from, ts_to))
+
+
+def merge_days(days):
+    merged = DaySketch()
+    for day in days:
+        merged.merge(day)
+    return merged
+
+
+def _read_file(filename):
+    if not os.path.exists(filename):
+        return []
+    days = []
+    with open(filename, 'rb') as fd:
+        for line in fd:
+            if line.endswith(b'\n'):
+                days.append(DaySketch.from_json(json.loads(line.decode('ascii'))))
+    return days
+
+
+def _select(days, ts_from, ts_to):
+    return [day for day in days
+            if (ts_from is None or day.day >= ts_from) and (ts_to is None or day.day < ts_to)]
+
+
+class SketchBackend(object):
+    """
+    Storage backend wrapper that maintains a DaySketch per day for the appended trades.
+
+    Everything not defined here is passed to the wrapped backend.
+    """
+
+    def __init__(self, backend, name, accuracy=ACCURACY, tick=PRICE_TICK):
+        self.backend = backend
+        self.filename = sketch_filename(name)
+        self.accuracy = accuracy
+        self.tick = tick
+        self.current = None  # the day in progress
+        self.late = 0  # trades for days that were already written, ignored
+        self.last_day = self._last_written_day()
+        self._replay()
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def append(self, timestamp, price, vol):
+        self.backend.append(timestamp, price, vol)
+        self._add(timestamp, price, vol)
+
+    def append_many(self, trades):
+        trades = list(trades)
+        self.backend.append_many(trades)
+        for row in trades:
+            self._add(*row)
+
+    def flush(self):
+        self.backend.flush()
+        POOL.flush(self.filename)
+
+    def sync(self):
+        self.backend.sync()
+        POOL.sync(self.filename)
+
+    def unload(self):
+        self.backend.unload()
+        POOL.close(self.filename)
+
+    def days(self, ts_from=None, ts_to=None):
+        """
+        return the written DaySketches and the day in progress with ts_from <= day < ts_to
+        """
+        POOL.flush(self.filename)
+        days = _read_file(self.filename)
+        if self.current is not None:
+            days.append(self.current)
+        return _select(days, ts_from, ts_to)
+
+    def sketch(self, ts_from=None, ts_to=None):
+        """
+        return a DaySketch of all days with ts_from <= day < ts_to, including the day in progress
+        """
+        return merge_days(self.days(ts_from, ts_to))
+
+    def _add(self, timestamp, price, vol):
+        sketch = self._sketch(math.floor(timestamp / DAY) * DAY)
+        if sketch is None:
+            self.late += 1
+        else:
+            sketch.add(price, vol)
+
+    def _sketch(self, day):
+        """
+        return the DaySketch for trades of day, starting a new day if needed, or None if day was written
+        """
+        current = self.current
+        if current is not None and day == current.day:
+            return current
+        if (current is None or day > current.day) and (self.last_day is None or day > self.last_day):
+            if current is not None:
+                self._write(current)
+            self.current = DaySketch(day, self.accuracy, self.tick)
+            return self.current
+        return None
+
+    def _write(self, day):
+        with POOL.open(self.filename) as fd:
+            fd.write(json.dumps(day.to_json()).encode('ascii') + b'\n')
+        self.last_day = day.day
+
+    def _last_written_day(self):
+        if not os.path.exists(self.filename) or not os.path.getsize(self.filename):
+            return None
+        with open(self.filename, 'rb') as fd:
+            lines = ReserveLineIterator(fd, b'\n')
+            try:
+                last = list(itertools.islice(lines, 2))
+            finally:
+                lines.close()
+            fd.seek(-1, os.SEEK_END)
+            torn = fd.read(1) != b'\n'
+        if torn:
+            # drop the partially written line
+            os.truncate(self.filename, os.path.getsize(self.filename) - len(last.pop(0)))
+        return json.loads(last[0].decode('ascii'))['day'] if last else None
+
+    def _replay(self):
+        import numpy
+        from coinotomy.utils.align import iter_arrays
+
+        start = None if self.last_day is None else self.last_day + DAY
+        for ts, prices, vols in iter_arrays(self.backend, start):
+            days = numpy.floor(ts / DAY) * DAY
+            # runs of trades of the same day
+            bounds = [0] + (numpy.flatnonzero(numpy.diff(days)) + 1).tolist() + [len(days)]
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                if lo == hi:
+                    continue
+                sketch = self._sketch(int(days[lo]))
+                if sketch is None:
+                    self.late += hi - lo
+                else:
+                    sketch.add_many(prices[lo:hi], vols[lo:hi])
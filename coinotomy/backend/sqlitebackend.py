@@ -0,0 +1,188 @@
+import json
+import os
+import os.path
+import sqlite3
+
+# seconds a writer waits for another connection to finish its transaction
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    n_rows INTEGER NOT NULL DEFAULT 0,
+    state TEXT,
+    state_rows INTEGER
+);
+CREATE TABLE IF NOT EXISTS trades (
+    symbol_id INTEGER NOT NULL,
+    timestamp REAL NOT NULL,
+    seq INTEGER NOT NULL,
+    price REAL NOT NULL,
+    volume REAL NOT NULL,
+    PRIMARY KEY (symbol_id, timestamp, seq)
+) WITHOUT ROWID;
+"""
+
+
+class SqliteStorageBackend(object):
+    """
+    Store trades in one SQLite database per exchange.
+
+    kraken.btc_usd is stored as symbol btc_usd in kraken.sqlite. The database
+    runs in WAL mode, so other processes can read while the watchers write.
+    Trades are clustered on (symbol, timestamp), which makes range() and the
+    newest trade (the first row of rlines()) cheap to find. Trades with the same
+    timestamp keep the order they were appended in.
+
+    Appended trades are kept in memory and written in a single transaction by
+    flush(), together with the saved state of the watcher.
+    """
+
+    def __init__(self, name):
+        self.template = os.path.expandvars(name)
+        assert self.template
+        directory, basename = os.path.split(self.template)
+        exchange, _, symbol = basename.partition('.')
+        self.filename = os.path.join(directory, exchange + self.extension())
+        self.symbol = symbol or exchange
+
+        # the group committer may flush from another thread
+        self.conn = sqlite3.connect(self.filename, timeout=BUSY_TIMEOUT,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            # executescript() would commit the transaction first
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    self.conn.execute(statement)
+            self.conn.execute("INSERT OR IGNORE INTO symbols (name) VALUES (?)", (self.symbol,))
+            self.symbol_id, self.n_rows = self.conn.execute(
+                "SELECT id, n_rows FROM symbols WHERE name = ?", (self.symbol,)).fetchone()
+
+        self.pending = []
+        self.pending_state = None
+
+    def __del__(self):
+        self.unload()
+
+    @staticmethod
+    def extension():
+        return ".sqlite"
+
+    def unload(self):
+        if self.conn:
+            self.flush()
+            self.conn.close()
+        self.conn = None
+
+    def append(self, timestamp, price, vol):
+        self.pending.append((timestamp, price, vol))
+
+    def append_many(self, trades):
+        self.pending.extend(trades)
+
+    def flush(self):
+        """
+        write the appended trades and the saved state in one transaction
+        """
+        self._write(self.pending_state)
+
+    def sync(self):
+        """
+        flush and fsync the trades to disk
+        """
+        self.conn.execute("PRAGMA synchronous=FULL")
+        try:
+            self.flush()
+        finally:
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def save_state(self, state):
+        """
+        store the resume state of a watcher, written on the next flush()
+        """
+        if state is not None:
+            self.pending_state = state
+
+    def load_state(self):
+        """
+        return the last saved resume state, or None if it is missing or outdated
+        """
+        state, state_rows = self.conn.execute(
+            "SELECT state, state_rows FROM symbols WHERE id = ?", (self.symbol_id,)).fetchone()
+        if state is None or state_rows != self.n_rows:
+            return None
+        return json.loads(state)
+
+    @staticmethod
+    def roundtrip(timestamp, price, vol):
+        """
+        return a trade as it will be read back from this backend
+        """
+        return float(timestamp), float(price), float(vol)
+
+    def _get_filename(self):
+        return self.filename
+
+    def lines(self):
+        return self._select("", (), "ASC")
+
+    def rlines(self):
+        return self._select("", (), "DESC")
+
+    def range(self, ts_from=None, ts_to=None):
+        """
+        Iterate over all trades with ts_from <= timestamp < ts_to.
+        """
+        where = ""
+        args = ()
+        if ts_from is not None:
+            where += " AND timestamp >= ?"
+            args += (ts_from,)
+        if ts_to is not None:
+            where += " AND timestamp < ?"
+            args += (ts_to,)
+        return self._select(where, args, "ASC")
+
+    def _select(self, where, args, order):
+        # readers see appended trades that are not flushed yet, but not the pending state
+        self._write(None)
+        cursor = self.conn.execute(
+            "SELECT timestamp, price, volume FROM trades WHERE symbol_id = ?%s "
+            "ORDER BY timestamp %s, seq %s" % (where, order, order),
+            (self.symbol_id,) + args)
+        return iter(cursor)
+
+    def _write(self, state):
+        if not self.pending and state is None:
+            return
+
+        rows = [(self.symbol_id, ts, self.n_rows + i, p, v) for i, (ts, p, v) in enumerate(self.pending)]
+        n_rows = self.n_rows + len(rows)
+        with self._transaction():
+            self.conn.executemany("INSERT INTO trades (symbol_id, timestamp, seq, price, volume) "
+                                  "VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute("UPDATE symbols SET n_rows = ? WHERE id = ?", (n_rows, self.symbol_id))
+            if state is not None:
+                self.conn.execute("UPDATE symbols SET state = ?, state_rows = ? WHERE id = ?",
+                                  (json.dumps(state), n_rows, self.symbol_id))
+
+        self.n_rows = n_rows
+        self.pending = []
+        if state is not None:
+            self.pending_state = None
+
+    def _transaction(self):
+        conn = self.conn
+
+        class transaction:
+            def __enter__(self):
+                # take the write lock up front, so concurrent writers wait instead of failing
+                conn.execute("BEGIN IMMEDIATE")
+
+            def __exit__(self, exc_type, exc_value, traceback):
+                conn.execute("COMMIT" if exc_type is None else "ROLLBACK")
+
+        return transaction()
@@ -1,7 +1,20 @@
+import os.path
+
+
 def generate_n(n):
     return [(i, i / 2.0, i * 2.0) for i in range(n)]
 
 
+def write_trades(directory, backend_class, name, trades):
+    """
+    store trades in a new file of backend_class in directory, return them as they are read back
+    """
+    backend = backend_class(os.path.join(directory, name))
+    backend.append_many(trades)
+    backend.unload()
+    return [backend.roundtrip(*row) for row in trades]
+
+
 class CommonBackend():
 
     def test_file_is_empty(self):
@@ -43,6 +56,27 @@ class CommonBackend():
 
         assert list(self.backend.rlines()) == generate_n(10000)[::-1]
 
+    def test_append_many(self):
+        self.backend.append_many(generate_n(10000))
+
+        assert list(self.backend.lines()) == generate_n(10000)
+        assert list(self.backend.rlines()) == generate_n(10000)[::-1]
+
+    def test_append_many_empty(self):
+        self.backend.append_many([])
+
+        assert [] == list(self.backend.lines())
+
+    def test_append_many_mixed_with_append(self):
+        expected = generate_n(10)
+
+        self.backend.append(*expected[0])
+        self.backend.append_many(expected[1:5])
+        self.backend.append(*expected[5])
+        self.backend.append_many(iter(expected[6:]))
+
+        assert list(self.backend.lines()) == expected
+
     def test_can_append_after_query(self):
         expected = generate_n(10)
         expected_1 = expected[:4]
@@ -81,4 +115,45 @@ class CommonBackend():
 
         self.backend.append(4, 5, 6)
         lines = list(self.backend.lines())
-        self.assertEqual([(1, 2, 3), (4, 5, 6)], lines)
\ No newline at end of file
+        self.assertEqual([(1, 2, 3), (4, 5, 6)], lines)
+
+    def test_state_missing(self):
+        self.assertIsNone(self.backend.load_state())
+
+    def test_state_saved_on_flush(self):
+        self.backend.append(1, 2, 3)
+        self.backend.save_state({'newest_tid': 1})
+        self.assertIsNone(self.backend.load_state())
+
+        self.backend.flush()
+        self.assertEqual({'newest_tid': 1}, self.backend.load_state())
+
+    def test_state_survives_reopen(self):
+        self.backend.append(1, 2, 3)
+        self.backend.save_state({'newest_tid': 1})
+        self.backend.flush()
+
+        self.backend.unload()
+        self.backend = self._create()
+        self.assertEqual({'newest_tid': 1}, self.backend.load_state())
+
+    def test_state_saved_on_sync(self):
+        self.backend.append(1, 2, 3)
+        self.backend.save_state({'newest_tid': 1})
+        self.backend.sync()
+
+        self.backend.unload()
+        self.backend = self._create()
+        self.assertEqual({'newest_tid': 1}, self.backend.load_state())
+
+    def test_state_outdated_by_append(self):
+        self.backend.append(1, 2, 3)
+        self.backend.save_state({'newest_tid': 1})
+        self.backend.flush()
+
+        # trades written without a new checkpoint, e.g. a crash in between
+        self.backend.append(4, 5, 6)
+        self.backend.flush()
+        self.backend.unload()
+        self.backend = self._create()
+        self.assertIsNone(self.backend.load_state())
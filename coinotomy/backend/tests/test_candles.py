@@ -0,0 +1,75 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.candles import CandleBackend, read_bars
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+
+T0 = 1483228800  # 01 Jan 2017 00:00:00 GMT
+
+
+def trades():
+    return [(T0 + 10, 10.0, 1.0), (T0 + 20, 12.0, 1.0), (T0 + 30, 8.0, 2.0),
+            (T0 + 70, 9.0, 1.0), (T0 + 400, 11.0, 4.0)]
+
+
+class TestCandleBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, "ex.pair")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _create(self):
+        return CandleBackend(CsvStorageBackend(self.name), self.name)
+
+    def test_bars(self):
+        backend = CandleBackend(RamdiskStorageBackend(), self.name)
+        backend.append_many(trades()[:3])
+        backend.append(*trades()[3])
+        backend.append(*trades()[4])
+        backend.flush()
+
+        self.assertEqual([(T0, 10.0, 12.0, 8.0, 8.0, 4.0, 9.5, 3),
+                          (T0 + 60, 9.0, 9.0, 9.0, 9.0, 1.0, 9.0, 1),
+                          (T0 + 360, 11.0, 11.0, 11.0, 11.0, 4.0, 11.0, 1)], backend.bars('1m'))
+        self.assertEqual([(T0, 10.0, 12.0, 8.0, 9.0, 5.0, 47 / 5, 4),
+                          (T0 + 300, 11.0, 11.0, 11.0, 11.0, 4.0, 11.0, 1)], backend.bars('5m'))
+        self.assertEqual([(T0, 10.0, 12.0, 8.0, 11.0, 9.0, 91 / 9, 5)], backend.bars('1d'))
+        self.assertEqual(backend.bars('1m')[1:2], backend.bars('1m', T0 + 1, T0 + 360))
+
+        # only completed bars are written
+        self.assertEqual(backend.bars('1m')[:2], read_bars(self.name, '1m'))
+        self.assertEqual([], read_bars(self.name, '1d'))
+        backend.unload()
+
+    def test_resume(self):
+        backend = self._create()
+        backend.append_many(trades()[:4])
+        backend.unload()
+
+        backend = self._create()
+        backend.append(*trades()[4])
+        bars = backend.bars('1m')
+        backend.unload()
+
+        backend = CandleBackend(RamdiskStorageBackend(), self.name + "2")
+        backend.append_many(trades())
+        self.assertEqual(backend.bars('1m'), bars)
+        backend.unload()
+
+    def test_late_trades_are_ignored(self):
+        backend = CandleBackend(RamdiskStorageBackend(), self.name)
+        backend.append_many(trades())
+        backend.append(T0 + 5, 100.0, 1.0)
+
+        self.assertEqual(1, backend.candles['1m'].late)
+        self.assertEqual(0, backend.candles['1d'].late)
+        self.assertEqual(12.0, backend.bars('1m')[0][2])
+        self.assertEqual(100.0, backend.bars('1d')[0][2])
+        backend.unload()
@@ -0,0 +1,48 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.checkpoint import Checkpoint
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.checkpoint = Checkpoint(os.path.join(self.directory, "ex.pair.checkpoint"))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _age(self):
+        # move the modification time back, so a rewrite is visible
+        mtime = os.stat(self.checkpoint.filename).st_mtime_ns - 10**9
+        os.utime(self.checkpoint.filename, ns=(mtime, mtime))
+        return mtime
+
+    def test_write(self):
+        self.checkpoint.set({'since': 1})
+        self.checkpoint.write(10, fsync=True)
+
+        self.assertEqual({'since': 1}, Checkpoint(self.checkpoint.filename).load(10))
+        self.assertIsNone(Checkpoint(self.checkpoint.filename).load(11))
+        self.assertEqual([], [f for f in os.listdir(self.directory) if f.endswith('.tmp')])
+
+    def test_unchanged_state_is_not_rewritten(self):
+        self.checkpoint.set({'since': 1})
+        self.checkpoint.write(10)
+        mtime = self._age()
+
+        self.checkpoint.set({'since': 1})
+        self.checkpoint.write(10)
+        self.assertEqual(mtime, os.stat(self.checkpoint.filename).st_mtime_ns)
+
+        self.checkpoint.set({'since': 1})
+        self.checkpoint.write(11)
+        self.assertEqual({'since': 1}, self.checkpoint.load(11))
+
+        self.checkpoint.set({'since': 2})
+        self.checkpoint.write(11)
+        self.assertEqual({'since': 2}, self.checkpoint.load(11))
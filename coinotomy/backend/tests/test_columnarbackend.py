@@ -0,0 +1,107 @@
+import os.path
+import unittest
+
+from coinotomy.backend.columnarbackend import ColumnarStorageBackend, BLOCK_ROWS, _blocks
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.tests.test_backend_common import CommonBackend, generate_n
+
+
+class TestColumnarBackend(unittest.TestCase, CommonBackend):
+
+    FILENAME = "test3.tmp"
+
+    def _create(self):
+        return ColumnarStorageBackend(self.FILENAME)
+
+    def setUp(self):
+        self.maxDiff = None
+        self.backend = self._create()
+
+    def tearDown(self):
+        self.backend.unload()
+        os.unlink(self.backend._get_filename())
+        os.unlink(self.backend._get_tail_filename())
+        if os.path.exists(self.backend.checkpoint.filename):
+            os.unlink(self.backend.checkpoint.filename)
+
+    def test_lossless(self):
+        lines = [(1505679642.123456, 4123.45678912345, 0.00000001),
+                 (1505679642.123457, -1.5e-300, 1e300),
+                 (1505679641.0, 4123.45678912345, 0.0)]
+        self.backend.append_many(lines)
+
+        self.assertEqual(lines, list(self.backend.lines()))
+        self.assertEqual(lines[::-1], list(self.backend.rlines()))
+
+    def test_blocks(self):
+        self.backend.append_many(generate_n(BLOCK_ROWS * 2 + 10))
+        self.backend.flush()
+        self.backend.append(BLOCK_ROWS * 3, 0, 0)
+
+        expected = generate_n(BLOCK_ROWS * 2 + 10) + [(BLOCK_ROWS * 3, 0, 0)]
+        self.assertEqual(expected, list(self.backend.lines()))
+        self.assertEqual(expected[::-1], list(self.backend.rlines()))
+
+    def test_range(self):
+        self.backend.append_many(generate_n(10000))
+
+        self.assertEqual(generate_n(10000), list(self.backend.range()))
+        self.assertEqual(generate_n(9000)[5000:], list(self.backend.range(5000, 9000)))
+        self.assertEqual(generate_n(10), list(self.backend.range(ts_to=10)))
+        self.assertEqual([], list(self.backend.range(10000)))
+
+    def test_smaller_than_csv(self):
+        trades = [(1505679642 + i * 0.25, 4000 + (i % 7) * 0.01, 0.5) for i in range(10000)]
+        self.backend.append_many(trades)
+        self.backend.flush()
+
+        csv = CsvStorageBackend(self.FILENAME)
+        csv.append_many(trades)
+        csv.unload()
+        try:
+            csv_size = os.path.getsize(csv._get_filename())
+            self.assertLess(os.path.getsize(self.backend._get_filename()) * 5, csv_size)
+        finally:
+            os.unlink(csv._get_filename())
+            if os.path.exists(csv.index.filename):
+                os.unlink(csv.index.filename)
+
+    def test_partial_block_is_discarded(self):
+        self.backend.append_many(generate_n(10))
+        self.backend.flush()
+        self.backend.unload()
+        with open(self.backend._get_filename(), 'ab') as fd:
+            fd.write(b'COL1garbage')
+
+        self.backend = self._create()
+        self.backend.append(10, 5, 20)
+        self.assertEqual(generate_n(11), list(self.backend.lines()))
+        self.assertEqual(generate_n(11)[::-1], list(self.backend.rlines()))
+
+    def test_frequent_flushes_write_full_blocks(self):
+        trades = generate_n(BLOCK_ROWS * 3 + 50)
+        for i in range(0, len(trades), 10):
+            self.backend.append_many(trades[i:i + 10])
+            self.backend.flush()
+
+        with open(self.backend._get_filename(), 'rb') as fd:
+            self.assertEqual([BLOCK_ROWS] * 3, [header[1] for start, header in _blocks(fd)])
+        self.assertEqual(trades, list(self.backend.lines()))
+        self.assertEqual(trades[::-1], list(self.backend.rlines()))
+        self.assertEqual(trades[BLOCK_ROWS * 3 - 5:], list(self.backend.range(BLOCK_ROWS * 3 - 5)))
+
+    def test_tail_survives_reopen(self):
+        self.backend.append_many(generate_n(BLOCK_ROWS + 10))
+        self.backend.flush()
+        self.backend.unload()
+        with open(self.backend._get_tail_filename(), 'ab') as fd:
+            fd.write(b'\0' * 5)  # partially written row
+
+        self.backend = self._create()
+        self.backend.append_many(generate_n(BLOCK_ROWS * 2)[BLOCK_ROWS + 10:])
+        self.backend.unload()
+
+        self.backend = self._create()
+        self.assertEqual(generate_n(BLOCK_ROWS * 2), list(self.backend.lines()))
+        with open(self.backend._get_filename(), 'rb') as fd:
+            self.assertEqual(2, len(list(_blocks(fd))))
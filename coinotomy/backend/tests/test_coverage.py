@@ -0,0 +1,67 @@
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend import coverage
+from coinotomy.backend.coverage import CoverageIndex
+
+
+class TestCoverageIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, "ex.pair")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_merge(self):
+        index = coverage.load(self.name)
+        index.add(10, 20)
+        index.add(20, 30)
+        index.add(50, 60)
+        index.add(40, 45)
+        index.add(70, 70)
+        self.assertEqual([[10, 30], [40, 45], [50, 60]], index.intervals())
+
+        index.add(25, 55)
+        self.assertEqual([[10, 60]], index.intervals())
+        index.add(0, 100)
+        self.assertEqual([[0, 100]], index.intervals())
+
+    def test_queries(self):
+        index = coverage.load(self.name)
+        for start, end in [(0, 100), (150, 200), (500, 1000)]:
+            index.add(start, end)
+
+        self.assertEqual(1.0, index.coverage(10, 90))
+        self.assertEqual(0.5, index.coverage(50, 150))
+        self.assertEqual(0.0, index.coverage(200, 500))
+        self.assertEqual(75, index.covered(50, 175))
+        self.assertEqual([[50, 100], [150, 175]], index.intervals(50, 175))
+
+        self.assertEqual([[100, 150], [200, 500]], index.gaps())
+        self.assertEqual([[200, 500]], index.gaps(min_duration=60))
+        self.assertEqual([[1000, 1200]], index.gaps(ts_from=600, ts_to=1200))
+        self.assertEqual([], CoverageIndex(self.name + ".other").gaps())
+
+    def test_persisted(self):
+        index = coverage.load(self.name)
+        index.add(0, 10)
+        index.add(20, 30)
+        self.assertFalse(os.path.exists(index.filename))
+        index.flush()
+
+        self.assertEqual([[0, 10], [20, 30]], coverage.load(self.name).intervals())
+        self.assertEqual([[10, 20]], coverage.gaps(self.name))
+        self.assertEqual(0.5, coverage.coverage(self.name, 0, 20))
+
+    def test_incomplete(self):
+        for symbol in ("a", "b"):
+            index = coverage.load(os.path.join(self.directory, symbol))
+            index.add(0, 50 if symbol == "a" else 100)
+            index.flush()
+
+        self.assertEqual({'a': 0.5}, coverage.incomplete(self.directory, 0, 100))
+        self.assertEqual({}, coverage.incomplete(self.directory, 0, 50))
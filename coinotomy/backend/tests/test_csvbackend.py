@@ -3,7 +3,7 @@ import unittest
 from math import pi, e
 
 from coinotomy.backend.csvbackend import CsvStorageBackend
-from coinotomy.backend.tests.test_backend_common import CommonBackend
+from coinotomy.backend.tests.test_backend_common import CommonBackend, generate_n
 
 class TestCsvBackend(unittest.TestCase, CommonBackend):
 
@@ -19,6 +19,10 @@ class TestCsvBackend(unittest.TestCase, CommonBackend):
     def tearDown(self):
         self.backend.unload()
         os.unlink(self.backend._get_filename())
+        if os.path.exists(self.backend.checkpoint.filename):
+            os.unlink(self.backend.checkpoint.filename)
+        if os.path.exists(self.backend.index.filename):
+            os.unlink(self.backend.index.filename)
 
     def test_format(self):
         # check if trailing zero's are removed.
@@ -35,3 +39,129 @@ class TestCsvBackend(unittest.TestCase, CommonBackend):
         self.assertEqual(b"2718281828.459,2718281828.45904493,2718281828.45904493",
                          self.backend._format_row(10**9*e, 10**9*e, 10**9*e))
 
+    def test_range(self):
+        self.backend.append_many(generate_n(5000))
+
+        self.assertEqual(generate_n(5000), list(self.backend.range()))
+        self.assertEqual(generate_n(3000)[1000:], list(self.backend.range(1000, 3000)))
+        self.assertEqual(generate_n(5000)[4990:], list(self.backend.range(4989.5)))
+        self.assertEqual(generate_n(10), list(self.backend.range(ts_to=10)))
+        self.assertEqual([], list(self.backend.range(5000)))
+
+    def test_index_is_sparse(self):
+        self.backend.append_many(generate_n(5000))
+        list(self.backend.range(0, 1))
+
+        self.assertEqual(5, len(self.backend.index.offsets))
+        self.assertEqual(0, self.backend.index.offsets[0])
+        self.assertEqual(self.backend.index.find(1024.5), self.backend.index.offsets[1])
+
+    def test_index_is_loaded_lazily(self):
+        self.backend.append_many(generate_n(3000))
+        self.assertFalse(self.backend.index.loaded)
+        self.assertEqual(generate_n(3000)[1000:1100], list(self.backend.range(1000, 1100)))
+        self.assertTrue(self.backend.index.loaded)
+
+        # rows appended after loading are indexed as well
+        self.backend.append_many(generate_n(5000)[3000:])
+        self.assertEqual(generate_n(5000)[4000:4100], list(self.backend.range(4000, 4100)))
+
+    def test_index_survives_reopen(self):
+        self.backend.append_many(generate_n(3000))
+        list(self.backend.range(0, 1))
+        self.backend.unload()
+        self.backend = self._create()
+        self.backend.append_many(generate_n(5000)[3000:])
+        list(self.backend.range(0, 1))
+
+        offsets = self.backend.index.offsets
+        self.backend.reindex()
+        self.assertEqual(offsets, self.backend.index.offsets)
+        self.assertEqual(generate_n(5000)[4000:4100], list(self.backend.range(4000, 4100)))
+
+    def test_stale_index_is_rebuilt(self):
+        self.backend.append_many(generate_n(3000))
+        list(self.backend.range(0, 1))
+        self.backend.unload()
+
+        # replace the csv file behind the index's back
+        os.unlink(self.backend._get_filename())
+        self.backend = self._create()
+        self.backend.append_many(generate_n(100))
+        self.backend.unload()
+        self.backend = self._create()
+
+        self.assertEqual(generate_n(100)[50:], list(self.backend.range(50)))
+        self.assertEqual([0], self.backend.index.offsets)
+
+    def test_index_holds_rounded_timestamps(self):
+        self.backend.index.every_rows = 2
+        self.backend.append(1.0, 1, 1)
+        list(self.backend.range(0, 1))
+        # both are stored as 2
+        self.backend.append(1.99996, 1, 1)
+        self.backend.append_many([(1.99997, 1, 1)])
+
+        rows = list(self.backend.range(1.99998))
+        self.assertEqual(2, len(rows))
+        self.backend.unload()
+
+        # the index is still valid after reopening
+        self.backend = self._create()
+        self.backend.index.every_rows = 2
+        self.assertEqual(rows, list(self.backend.range(1.99998)))
+        self.assertFalse(self.backend.index.rewrite)
+        self.backend.reindex()
+        self.assertEqual(rows, list(self.backend.range(1.99998)))
+
+    def test_only_writer_persists_index(self):
+        self.backend.append_many(generate_n(3000))
+        self.backend.unload()
+        self.assertFalse(os.path.exists(self.backend.index.filename))
+
+        # an instance that only reads keeps the index in memory
+        self.backend = self._create()
+        self.assertEqual(generate_n(3000)[2000:], list(self.backend.range(2000)))
+        self.backend.unload()
+        self.assertFalse(os.path.exists(self.backend.index.filename))
+
+        self.backend = self._create()
+        self.backend.append(3000, 3000, 3000)
+        list(self.backend.range(2000))
+        self.backend.unload()
+        self.assertTrue(os.path.exists(self.backend.index.filename))
+
+    def test_rlines_batches(self):
+        self.backend.append_many(generate_n(10000))
+
+        batches = list(self.backend.rlines_batches())
+        self.assertLess(1, len(batches))
+        self.assertEqual(generate_n(10000)[::-1], [row for batch in batches for row in batch])
+
+    def test_read_arrays(self):
+        self.backend.append_many(generate_n(10000))
+
+        chunks = list(self.backend.read_arrays(chunk_rows=3000))
+        self.assertEqual([3000, 3000, 3000, 1000], [len(ts) for ts, p, v in chunks])
+        rows = [row for ts, p, v in chunks for row in zip(ts.tolist(), p.tolist(), v.tolist())]
+        self.assertEqual(generate_n(10000), rows)
+
+    def test_read_arrays_range(self):
+        self.backend.append_many(generate_n(10000))
+
+        chunks = list(self.backend.read_arrays(2500, 7500, chunk_rows=1000))
+        self.assertEqual(5, len(chunks))
+        ts = [t for chunk in chunks for t in chunk[0].tolist()]
+        self.assertEqual(list(range(2500, 7500)), ts)
+
+        self.assertEqual([], list(self.backend.read_arrays(10000)))
+        self.assertEqual([], list(self.backend.read_arrays(ts_to=0)))
+
+    def test_read_arrays_damaged_row(self):
+        self.backend.append_many(generate_n(10))
+        self.backend.flush()
+        with open(self.backend._get_filename(), 'ab') as fd:
+            fd.write(b'\n10,5\n')
+
+        with self.assertRaises(ValueError):
+            list(self.backend.read_arrays())
@@ -0,0 +1,93 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.dedup import DedupBackend
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.partitionedbackend import PartitionedStorageBackend
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+from coinotomy.backend.tests.test_backend_common import generate_n
+
+
+class TestDedupBackend(unittest.TestCase):
+
+    def test_overlap_is_dropped(self):
+        storage = RamdiskStorageBackend()
+        storage.append_many(generate_n(10))
+        backend = DedupBackend(storage)
+
+        backend.append_many(generate_n(15)[5:])
+        self.assertEqual(generate_n(15), list(backend.lines()))
+        self.assertEqual(5, backend.dropped)
+
+    def test_identical_trades_are_counted(self):
+        storage = RamdiskStorageBackend()
+        storage.append_many([(1, 10, 1), (2, 10, 1), (2, 10, 1)])
+        backend = DedupBackend(storage)
+
+        # the page holds a third trade identical to the two stored ones
+        backend.append_many([(2, 10, 1), (2, 10, 1), (2, 10, 1), (3, 10, 1)])
+        self.assertEqual([(1, 10, 1), (2, 10, 1), (2, 10, 1), (2, 10, 1), (3, 10, 1)], list(backend.lines()))
+
+    def test_only_stored_trades_are_dropped(self):
+        storage = RamdiskStorageBackend()
+        storage.append(1, 10, 1)
+        backend = DedupBackend(storage)
+
+        backend.append_many([(1, 10, 1), (2, 10, 1), (2, 10, 1)])
+        self.assertEqual([(1, 10, 1), (2, 10, 1), (2, 10, 1)], list(backend.lines()))
+
+    def test_identical_trades_on_later_pages_are_kept(self):
+        storage = RamdiskStorageBackend()
+        storage.append(1, 10, 1)
+        backend = DedupBackend(storage)
+
+        # two distinct trades that look the same, fetched on consecutive ticks
+        backend.append_many([(1, 10, 1), (2, 10, 1)])
+        backend.append_many([(2, 10, 1)])
+        self.assertEqual([(1, 10, 1), (2, 10, 1), (2, 10, 1)], list(backend.lines()))
+        self.assertEqual(1, backend.dropped)
+
+    def test_window(self):
+        storage = RamdiskStorageBackend()
+        storage.append_many([(0, 10, 1), (100, 10, 1)])
+        backend = DedupBackend(storage, window=10)
+
+        backend.append_many([(0, 10, 1), (100, 10, 1)])
+        self.assertEqual([(0, 10, 1), (100, 10, 1), (0, 10, 1)], list(backend.lines()))
+
+    def test_compares_stored_representation(self):
+        storage = CsvStorageBackend("test8.tmp")
+        try:
+            storage.append(1.00001, 10.123456789, 1)
+            backend = DedupBackend(storage)
+
+            backend.append(1.00001, 10.123456789, 1)
+            self.assertEqual(1, len(list(backend.lines())))
+        finally:
+            storage.unload()
+            os.unlink(storage._get_filename())
+            if os.path.exists(storage.index.filename):
+                os.unlink(storage.index.filename)
+
+    def test_restart_of_partitioned_backend(self):
+        directory = tempfile.mkdtemp()
+        try:
+            name = os.path.join(directory, "test")
+            storage = PartitionedStorageBackend(name, PackStorageBackend)
+            trades = [(1500000000 + i, 4321.123 + i, 0.1 + i / 7) for i in range(5)]
+            DedupBackend(storage).append_many(trades[:3])
+            storage.unload()
+
+            # after a restart, the first page overlaps the stored trades
+            storage = PartitionedStorageBackend(name, PackStorageBackend)
+            backend = DedupBackend(storage)
+            backend.append_many(trades[1:])
+            self.assertEqual(2, backend.dropped)
+            self.assertEqual(5, len(list(storage.lines())))
+            storage.unload()
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,109 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend import filepool
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.filepool import FilePool
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.tests.test_backend_common import generate_n
+
+
+class TestFilePool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pool = FilePool(max_open=2)
+
+    def tearDown(self):
+        for filename in list(self.pool.files):
+            self.pool.close(filename)
+        shutil.rmtree(self.directory)
+
+    def _file(self, name):
+        return os.path.join(self.directory, name)
+
+    def _open_files(self):
+        return [f for f in filepool.POOL.files if f.startswith(self.directory)]
+
+    def test_evicts_least_recently_used(self):
+        for name in 'abc':
+            with self.pool.open(self._file(name)) as fd:
+                fd.write(name.encode())
+
+        self.assertEqual([self._file('b'), self._file('c')], list(self.pool.files))
+        # the evicted handle was flushed
+        with open(self._file('a'), 'rb') as fd:
+            self.assertEqual(b'a', fd.read())
+
+        with self.pool.open(self._file('b')):
+            pass
+        with self.pool.open(self._file('a')):
+            pass
+        self.assertEqual([self._file('b'), self._file('a')], list(self.pool.files))
+
+    def test_borrowed_handles_are_not_evicted(self):
+        with self.pool.open(self._file('a')) as fd:
+            with self.pool.open(self._file('b')):
+                with self.pool.open(self._file('c')):
+                    self.assertEqual(3, len(self.pool))
+            fd.write(b'a')
+        self.pool.flush(self._file('a'))
+
+        with open(self._file('a'), 'rb') as fd:
+            self.assertEqual(b'a', fd.read())
+
+    def test_borrowed_handle_is_closed_when_returned(self):
+        with self.pool.open(self._file('a')) as fd:
+            self.pool.close(self._file('a'))
+            self.assertEqual(0, len(self.pool))
+            fd.write(b'a')
+        self.assertTrue(fd.closed)
+
+        with open(self._file('a'), 'rb') as fd:
+            self.assertEqual(b'a', fd.read())
+
+    def test_backends_share_the_pool(self):
+        max_open, filepool.POOL.max_open = filepool.POOL.max_open, 2
+        try:
+            backends = [PackStorageBackend(self._file(str(i))) for i in range(10)]
+            for i, backend in enumerate(backends):
+                backend.append_many(generate_n(i))
+            self.assertEqual(2, len(self._open_files()))
+
+            for i, backend in enumerate(backends):
+                self.assertEqual(generate_n(i), list(backend.lines()))
+                backend.unload()
+            self.assertEqual([], self._open_files())
+        finally:
+            filepool.POOL.max_open = max_open
+
+
+class TestFileReader(unittest.TestCase):
+
+    FILENAME = "test7.tmp"
+
+    def setUp(self):
+        self.backend = CsvStorageBackend(self.FILENAME)
+        self.backend.append_many(generate_n(10))
+
+    def tearDown(self):
+        self.backend.unload()
+        os.unlink(self.backend._get_filename())
+        if os.path.exists(self.backend.index.filename):
+            os.unlink(self.backend.index.filename)
+
+    def test_closed_when_exhausted(self):
+        for make in (self.backend.lines, self.backend.rlines, self.backend.range):
+            lines = make()
+            self.assertEqual(10, len(list(lines)))
+            self.assertTrue(lines.fd.closed)
+            self.assertEqual([], list(lines))
+
+    def test_closed_by_context_manager(self):
+        for make in (self.backend.lines, self.backend.rlines, self.backend.range):
+            with make() as lines:
+                next(lines)
+            self.assertTrue(lines.fd.closed)
@@ -0,0 +1,117 @@
+import os.path
+import time
+import unittest
+
+from coinotomy.backend.groupcommit import GroupCommitter, POLICY_TICK, POLICY_INTERVAL, POLICY_ROWS
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+from coinotomy.backend.tests.test_backend_common import CommonBackend, generate_n
+
+
+class CountingBackend(RamdiskStorageBackend):
+    def __init__(self):
+        RamdiskStorageBackend.__init__(self)
+        self.flushes = 0
+        self.syncs = 0
+
+    def flush(self):
+        RamdiskStorageBackend.flush(self)
+        self.flushes += 1
+
+    def sync(self):
+        RamdiskStorageBackend.flush(self)
+        self.syncs += 1
+
+
+class SlowSyncBackend(CountingBackend):
+    def sync(self):
+        time.sleep(0.05)
+        CountingBackend.sync(self)
+
+
+class TestGroupCommitBackend(unittest.TestCase, CommonBackend):
+
+    FILENAME = "test5.tmp"
+
+    def _create(self):
+        return GroupCommitter(POLICY_TICK, fsync=True).wrap(PackStorageBackend(self.FILENAME))
+
+    def setUp(self):
+        self.maxDiff = None
+        self.backend = self._create()
+
+    def tearDown(self):
+        self.backend.unload()
+        os.unlink(self.backend._get_filename())
+        if os.path.exists(self.backend.checkpoint.filename):
+            os.unlink(self.backend.checkpoint.filename)
+
+
+class TestGroupCommitter(unittest.TestCase):
+
+    def test_tick(self):
+        backend = CountingBackend()
+        wrapped = GroupCommitter(POLICY_TICK).wrap(backend)
+
+        wrapped.flush()
+        self.assertEqual(0, backend.flushes)  # nothing to commit
+
+        wrapped.append_many(generate_n(10))
+        wrapped.flush()
+        self.assertEqual(1, backend.flushes)
+
+    def test_rows(self):
+        backend = CountingBackend()
+        wrapped = GroupCommitter(POLICY_ROWS, max_rows=100, fsync=True).wrap(backend)
+
+        for row in generate_n(250):
+            wrapped.append(*row)
+            wrapped.flush()
+        self.assertEqual(2, backend.syncs)
+        self.assertEqual(0, backend.flushes)
+
+        wrapped.unload()
+        self.assertEqual(3, backend.syncs)
+
+    def test_interval(self):
+        committer = GroupCommitter(POLICY_INTERVAL, interval=0.01)
+        backends = [CountingBackend() for _ in range(10)]
+        wrapped = [committer.wrap(backend) for backend in backends]
+
+        for w in wrapped[:5]:
+            w.append_many(generate_n(10))
+            w.save_state({'newest_tid': 10})
+            w.flush()
+        time.sleep(0.2)
+
+        self.assertEqual([1] * 5 + [0] * 5, [backend.flushes for backend in backends])
+        self.assertEqual({'newest_tid': 10}, wrapped[0].load_state())
+
+    def test_parallel_fsync(self):
+        committer = GroupCommitter(POLICY_INTERVAL, interval=3600, fsync=True, sync_threads=10)
+        backends = [SlowSyncBackend() for _ in range(20)]
+        wrapped = [committer.wrap(backend) for backend in backends]
+        for w in wrapped[:19]:
+            w.append_many(generate_n(10))
+
+        started = time.time()
+        committer.commit_all()
+        # 19 syncs of 50 ms on 10 threads take two rounds
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual([1] * 19 + [0], [backend.syncs for backend in backends])
+
+    def test_when_committed(self):
+        committer = GroupCommitter(POLICY_INTERVAL, interval=3600)
+        wrapped = committer.wrap(CountingBackend())
+        called = []
+
+        wrapped.when_committed(lambda: called.append(0))
+        self.assertEqual([0], called)  # nothing pending
+
+        wrapped.append_many(generate_n(10))
+        wrapped.when_committed(lambda: called.append(1))
+        wrapped.flush()
+        self.assertEqual([0], called)
+
+        committer.commit_all()
+        self.assertEqual([0, 1], called)
@@ -0,0 +1,174 @@
+import os
+import os.path
+import shutil
+import tempfile
+import time
+import unittest
+
+from coinotomy.backend.columnarbackend import ColumnarStorageBackend, BLOCK_ROWS
+from coinotomy.backend.journal import Journal, JournalStorageBackend
+from coinotomy.backend.tests.test_backend_common import CommonBackend, generate_n
+
+
+class TestJournalBackend(unittest.TestCase, CommonBackend):
+
+    def _create(self):
+        return JournalStorageBackend(os.path.join(self.directory, "ex.pair"))
+
+    def setUp(self):
+        self.maxDiff = None
+        self.directory = tempfile.mkdtemp()
+        self.backend = self._create()
+
+    def tearDown(self):
+        self.backend.unload()
+        self.backend.journal.close()
+        shutil.rmtree(self.directory)
+
+    def _reopen(self):
+        self.backend.unload()
+        self.backend.journal.close()
+        self.backend = self._create()
+
+    def test_compacted_and_journal_rows_are_merged(self):
+        self.backend.append_many(generate_n(100)[:60])
+        self.backend.journal.compact()
+        self.backend.append_many(generate_n(100)[60:])
+
+        self.assertTrue(os.path.exists(os.path.join(self.directory, "ex.pair.pack")))
+        self.assertEqual(generate_n(100), list(self.backend.lines()))
+        self.assertEqual(generate_n(100)[::-1], list(self.backend.rlines()))
+        self.assertEqual(generate_n(100)[50:70], list(self.backend.range(50, 70)))
+
+    def test_symbols_share_the_journal(self):
+        other = JournalStorageBackend(os.path.join(self.directory, "ex.other"))
+        self.assertIs(self.backend.journal, other.journal)
+
+        self.backend.append_many(generate_n(10))
+        other.append(1, 2, 3)
+        self.backend.journal.compact()
+        other.append(4, 5, 6)
+
+        self.assertEqual(generate_n(10), list(self.backend.lines()))
+        self.assertEqual([(1, 2, 3), (4, 5, 6)], list(other.lines()))
+        segments = [f for f in os.listdir(self.directory) if f.endswith('.log')]
+        self.assertEqual(1, len(segments))
+
+    def test_journal_survives_reopen(self):
+        self.backend.append_many(generate_n(10))
+        self.backend.journal.compact()
+        self.backend.append_many(generate_n(20)[10:])
+        self._reopen()
+
+        self.assertEqual(generate_n(20), list(self.backend.lines()))
+        self.backend.journal.compact()
+        self.assertEqual(generate_n(20), list(self.backend.lines()))
+
+    def test_interrupted_compaction_is_redone(self):
+        self.backend.append_many(generate_n(10))
+        self.backend.journal.compact()
+        self.backend.append_many(generate_n(20)[10:])
+        self.backend.flush()
+
+        # trades written to the compacted file, but the manifest wasn't updated
+        with open(os.path.join(self.directory, "ex.pair.pack"), 'ab') as fd:
+            fd.write(b'\0' * 16 * 10)
+        self._reopen()
+
+        self.assertEqual(generate_n(20), list(self.backend.lines()))
+        self.backend.journal.compact()
+        self.assertEqual(generate_n(20), list(self.backend.lines()))
+
+    def test_open_reader_doesnt_block_compaction(self):
+        self.backend.append_many(generate_n(10))
+        lines = self.backend.lines()
+        self.assertEqual((0, 0, 0), next(lines))
+        self.backend.journal.compact()
+        self.assertEqual(10 * 16, os.path.getsize(os.path.join(self.directory, "ex.pair.pack")))
+
+        # the reader still returns its snapshot, without the compacted trades twice
+        self.assertEqual(generate_n(10)[1:], list(lines))
+        self.assertEqual(generate_n(10), list(self.backend.lines()))
+
+    def test_trades_are_stored_as_compacted(self):
+        trade = (1505679642.123, 4123.456789, 0.1)
+        self.backend.append(*trade)
+        stored = list(self.backend.lines())
+        self.assertEqual([self.backend.roundtrip(*trade)], stored)
+        self.assertNotEqual([trade], stored)
+
+        self.backend.journal.compact()
+        self.assertEqual(stored, list(self.backend.lines()))
+
+    def test_sync_is_shared(self):
+        journal = self.backend.journal
+        self.backend.append_many(generate_n(10))
+        self.backend.sync()
+        self.assertEqual(journal.written, journal.synced)
+
+        synced = journal.synced
+        other = JournalStorageBackend(os.path.join(self.directory, "ex.other"))
+        other.sync()  # nothing new to sync
+        self.assertEqual(synced, journal.synced)
+
+    def test_full_tail_starts_compaction(self):
+        directory = os.path.join(self.directory, "other")
+        os.mkdir(directory)
+        journal = Journal(directory, interval=3600, max_tail_rows=100)
+        try:
+            symbol_id = journal.symbol_id("ex.pair")
+            journal.append(symbol_id, generate_n(50))
+            time.sleep(0.05)
+            self.assertEqual(50, journal.tail_rows)
+
+            journal.append(symbol_id, generate_n(110)[50:])
+            for _ in range(100):
+                if not journal.tail_rows:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(0, journal.tail_rows)
+            self.assertEqual(110 * 16, os.path.getsize(os.path.join(directory, "ex.pair.pack")))
+        finally:
+            journal.close()
+
+
+class TestColumnarJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _assert_lines(self, expected):
+        journal = Journal.get(self.directory, ColumnarStorageBackend)
+        try:
+            lines = list(JournalStorageBackend(os.path.join(self.directory, "ex.pair"), ColumnarStorageBackend).lines())
+        finally:
+            journal.close()
+        # no assertEqual, a diff of the long lists takes minutes
+        self.assertEqual(len(expected), len(lines))
+        self.assertTrue(expected == lines)
+
+    def test_interrupted_compaction_restores_the_tail(self):
+        journal = Journal(self.directory, ColumnarStorageBackend, interval=0)
+        symbol_id = journal.symbol_id("ex.pair")
+        journal.append(symbol_id, generate_n(10))
+        journal.compact()
+        journal.append(symbol_id, generate_n(BLOCK_ROWS + 10)[10:])
+        journal.flush()
+
+        def crash():
+            raise IOError("crash")
+
+        # the trades reach the compacted file, which writes a block, but not the manifest
+        journal._write_manifest = crash
+        with self.assertRaises(IOError):
+            journal.compact()
+        journal.close()
+
+        self._assert_lines(generate_n(BLOCK_ROWS + 10))
+        journal = Journal(self.directory, ColumnarStorageBackend, interval=0)
+        journal.compact()
+        journal.close()
+        self._assert_lines(generate_n(BLOCK_ROWS + 10))
@@ -3,7 +3,7 @@ import struct
 import unittest
 
 from coinotomy.backend.packbackend import PackStorageBackend
-from coinotomy.backend.tests.test_backend_common import CommonBackend
+from coinotomy.backend.tests.test_backend_common import CommonBackend, generate_n
 
 
 def trunc(val):
@@ -24,4 +24,52 @@ class TestPackBackend(unittest.TestCase, CommonBackend):
     def tearDown(self):
         self.backend.unload()
         os.unlink(self.backend._get_filename())
+        if os.path.exists(self.backend.checkpoint.filename):
+            os.unlink(self.backend.checkpoint.filename)
 
+    def test_as_array_empty(self):
+        self.assertEqual(0, len(self.backend.as_array()))
+
+    def test_as_array(self):
+        for ts, p, v in generate_n(100):
+            self.backend.append(ts, p, v)
+
+        arr = self.backend.as_array()
+        self.assertEqual(100, len(arr))
+        self.assertEqual(generate_n(100), [(ts, trunc(p), trunc(v)) for ts, p, v in arr.tolist()])
+        self.assertEqual(sum(range(100)) / 2.0, arr['price'].sum())
+
+    def test_open_readonly_ignores_partial_row(self):
+        for ts, p, v in generate_n(10):
+            self.backend.append(ts, p, v)
+        self.backend.flush()
+        with open(self.backend._get_filename(), 'ab') as fd:
+            fd.write(b'\0' * 5)
+
+        arr = PackStorageBackend.open_readonly(self.FILENAME)
+        self.assertEqual(10, len(arr))
+        self.assertEqual(9, arr['timestamp'][-1])
+
+    def test_range(self):
+        self.backend.append_many(generate_n(5000))
+
+        self.assertEqual(generate_n(5000), list(self.backend.range()))
+        self.assertEqual(generate_n(3000)[1000:], list(self.backend.range(1000, 3000)))
+        self.assertEqual(generate_n(5000)[4990:], list(self.backend.range(4989.5)))
+        self.assertEqual(generate_n(10), list(self.backend.range(ts_to=10)))
+        self.assertEqual([], list(self.backend.range(5000)))
+        self.assertEqual([], list(self.backend.range(10, 10)))
+
+    def test_range_duplicate_timestamps(self):
+        self.backend.append_many([(1, 1, 1), (2, 2, 2), (2, 3, 3), (2, 4, 4), (3, 5, 5)])
+
+        self.assertEqual([(2, 2, 2), (2, 3, 3), (2, 4, 4)], list(self.backend.range(2, 3)))
+
+    def test_first_at_or_after(self):
+        self.assertIsNone(self.backend.first_at_or_after(0))
+
+        self.backend.append_many(generate_n(100))
+
+        self.assertEqual((0, 0, 0), self.backend.first_at_or_after(-1))
+        self.assertEqual((50, 25, 100), self.backend.first_at_or_after(49.1))
+        self.assertIsNone(self.backend.first_at_or_after(100))
@@ -0,0 +1,68 @@
+import os.path
+import shutil
+import unittest
+
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.partitionedbackend import PartitionedStorageBackend, DAY
+from coinotomy.backend.tests.test_backend_common import CommonBackend
+
+T0 = 1483228800  # 01 Jan 2017 00:00:00 GMT
+
+
+def generate_days(n_days, per_day):
+    step = DAY / per_day
+    return [(T0 + i * step, float(i), 1.0) for i in range(n_days * per_day)]
+
+
+class TestPartitionedBackend(unittest.TestCase, CommonBackend):
+
+    FILENAME = "test4.tmp"
+
+    def _create(self):
+        return PartitionedStorageBackend(self.FILENAME, CsvStorageBackend)
+
+    def setUp(self):
+        self.maxDiff = None
+        self.backend = self._create()
+
+    def tearDown(self):
+        self.backend.unload()
+        shutil.rmtree(self.FILENAME)
+        if os.path.exists(self.backend.checkpoint.filename):
+            os.unlink(self.backend.checkpoint.filename)
+
+    def test_one_file_per_day(self):
+        self.backend.append_many(generate_days(3, 10))
+        self.backend.flush()
+
+        self.assertEqual(['2017-01-01', '2017-01-02', '2017-01-03'], self.backend.partitions())
+        self.assertTrue(os.path.exists(os.path.join(self.FILENAME, '2017-01-02.csv')))
+
+    def test_chained_lines(self):
+        trades = generate_days(3, 10)
+        for ts, p, v in trades:
+            self.backend.append(ts, p, v)
+
+        self.assertEqual(trades, list(self.backend.lines()))
+        self.assertEqual(trades[::-1], list(self.backend.rlines()))
+
+        self.backend.unload()
+        self.backend = self._create()
+        self.assertEqual(trades, list(self.backend.lines()))
+
+    def test_range(self):
+        trades = generate_days(5, 10)
+        self.backend.append_many(trades)
+
+        self.assertEqual(trades[15:32], list(self.backend.range(trades[15][0], trades[32][0])))
+        self.assertEqual(trades[40:], list(self.backend.range(T0 + 4 * DAY)))
+        self.assertEqual(trades[:10], list(self.backend.range(ts_to=T0 + DAY)))
+
+    def test_drop_before(self):
+        trades = generate_days(3, 10)
+        self.backend.append_many(trades)
+
+        self.backend.drop_before(T0 + DAY + 1)
+        self.assertEqual(['2017-01-02', '2017-01-03'], self.backend.partitions())
+        self.assertEqual(trades[10:], list(self.backend.lines()))
+        self.assertFalse([f for f in os.listdir(self.FILENAME) if f.startswith('2017-01-01')])
@@ -0,0 +1,147 @@
+import os
+import os.path
+import random
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.csvbackend import CsvReader, CsvStorageBackend
+from coinotomy.backend.packbackend import PackReader, PackStorageBackend
+from coinotomy.backend import prefixsum
+from coinotomy.backend.prefixsum import ENTRY, STRIDE, SUFFIX
+
+
+def trades(n, t0=1000):
+    rnd = random.Random(n)
+    return [(t0 + i // 3, round(rnd.uniform(90, 110), 2), round(rnd.uniform(0, 2), 4)) for i in range(n)]
+
+
+def expected(rows, ts_from, ts_to):
+    selected = [(p, v) for ts, p, v in rows
+                if (ts_from is None or ts >= ts_from) and (ts_to is None or ts < ts_to)]
+    volume = sum(v for p, v in selected)
+    return volume, sum(p * v for p, v in selected) / volume if volume else None
+
+
+class PrefixSumTests(object):
+
+    BACKEND = None
+    READER = None
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, "ex.pair")
+        prefixsum.ENABLED = True
+
+    def tearDown(self):
+        prefixsum.ENABLED = False
+        shutil.rmtree(self.directory)
+
+    def _windows(self):
+        return [(None, None), (None, 1010), (1010, None), (1003, 1004), (1003, 1003), (1020, 1010),
+                (0, 10), (5000, None), (1000.5, 1042.5), (1100, 1250.5), (1200, 1300)]
+
+    def _check(self, backend, rows):
+        for ts_from, ts_to in self._windows():
+            volume, vwap = expected(rows, ts_from, ts_to)
+            self.assertAlmostEqual(volume, backend.volume(ts_from, ts_to), places=6)
+            if vwap is None:
+                self.assertIsNone(backend.vwap(ts_from, ts_to))
+            else:
+                self.assertAlmostEqual(vwap, backend.vwap(ts_from, ts_to), places=6)
+
+    def test_empty(self):
+        backend = self.BACKEND(self.name)
+        self.assertEqual(0, backend.volume())
+        self.assertIsNone(backend.vwap())
+        backend.unload()
+
+    def test_sums(self):
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(500))
+        for row in trades(1000)[500:]:
+            backend.append(*row)
+        # answered before the sums are flushed
+        self._check(backend, list(backend.lines()))
+        backend.unload()
+
+    def test_resume(self):
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(1000)[:500])
+        backend.unload()
+
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(1000)[500:])
+        backend.flush()
+        self._check(backend, list(backend.lines()))
+        self.assertEqual(1000 // STRIDE, os.path.getsize(backend.prefix_sums.filename) // ENTRY.size)
+        backend.unload()
+
+    def test_rows_without_sums_are_added(self):
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(1000))
+        backend.unload()
+        filename = backend.prefix_sums.filename
+        os.truncate(filename, 5 * ENTRY.size + 3)
+
+        backend = self.BACKEND(self.name)
+        self._check(backend, list(backend.lines()))
+        self.assertEqual(1000 // STRIDE, os.path.getsize(filename) // ENTRY.size)
+        backend.unload()
+
+    def test_stale_sums_are_rebuilt(self):
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(1000))
+        backend.unload()
+
+        # the trade file is replaced by a shorter one, for example by a conversion
+        os.unlink(backend._get_filename())
+        backend = self.BACKEND(self.name + '2')
+        backend.append_many(trades(500, t0=2000))
+        backend.unload()
+        os.rename(backend._get_filename(), self.name + self.BACKEND.extension())
+
+        backend = self.BACKEND(self.name)
+        self._check(backend, list(backend.lines()))
+        self.assertEqual(500 // STRIDE, os.path.getsize(backend.prefix_sums.filename) // ENTRY.size)
+        backend.unload()
+
+    def test_reader(self):
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(1000))
+        backend.flush()
+        rows = list(backend.lines())
+        # the sums of the last rows aren't written yet, and rows after the snapshot are ignored
+        os.truncate(backend.prefix_sums.filename, 5 * ENTRY.size)
+
+        with self.READER(backend._get_filename()) as reader:
+            backend.append_many(trades(500, t0=1400))
+            backend.flush()
+            self._check(reader, rows)
+
+        os.unlink(backend.prefix_sums.filename)
+        with self.READER(backend._get_filename()) as reader:
+            self._check(reader, list(backend.lines()))
+        backend.unload()
+
+    def test_disabled(self):
+        prefixsum.ENABLED = False
+        backend = self.BACKEND(self.name)
+        backend.append_many(trades(1000))
+        backend.flush()
+        self.assertFalse(os.path.exists(backend._get_filename() + SUFFIX))
+        # answered by scanning the trade file
+        self._check(backend, list(backend.lines()))
+        with self.READER(backend._get_filename()) as reader:
+            self._check(reader, list(backend.lines()))
+        backend.unload()
+
+
+class TestPackPrefixSums(PrefixSumTests, unittest.TestCase):
+    BACKEND = PackStorageBackend
+    READER = PackReader
+
+
+class TestCsvPrefixSums(PrefixSumTests, unittest.TestCase):
+    BACKEND = CsvStorageBackend
+    READER = CsvReader
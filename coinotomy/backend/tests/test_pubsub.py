@@ -0,0 +1,56 @@
+import queue
+import unittest
+
+from coinotomy.backend.dedup import DedupBackend
+from coinotomy.backend.pubsub import PublishingBackend, TradeBus
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+
+
+class TestTradeBus(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = TradeBus()
+
+    def test_publish(self):
+        everything = self.bus.subscribe()
+        kraken = self.bus.subscribe(["kraken.btc_usd"])
+
+        backend = PublishingBackend(RamdiskStorageBackend(), self.bus, "kraken.btc_usd")
+        backend.append(1, 10, 1)
+        backend.append_many([(2, 11, 1), (3, 12, 1)])
+        backend.append_many([])
+        PublishingBackend(RamdiskStorageBackend(), self.bus, "bitstamp.btc_usd").append(4, 13, 1)
+
+        self.assertEqual([(1, 10, 1), (2, 11, 1), (3, 12, 1)], list(backend.lines()))
+        self.assertEqual([("kraken.btc_usd", ((1, 10, 1),)),
+                          ("kraken.btc_usd", ((2, 11, 1), (3, 12, 1))),
+                          ("bitstamp.btc_usd", ((4, 13, 1),))], everything.get_all())
+        self.assertEqual(("kraken.btc_usd", ((1, 10, 1),)), kraken.get(timeout=1))
+        self.assertEqual(("kraken.btc_usd", ((2, 11, 1), (3, 12, 1))), kraken.get(timeout=1))
+        with self.assertRaises(queue.Empty):
+            kraken.get(timeout=0)
+
+        kraken.close()
+        backend.append(5, 14, 1)
+        self.assertEqual([], kraken.get_all())
+        self.assertEqual(1, len(everything.get_all()))
+
+    def test_full_queue_drops(self):
+        subscription = self.bus.subscribe(maxsize=2)
+        backend = PublishingBackend(RamdiskStorageBackend(), self.bus, "a")
+        for i in range(3):
+            backend.append_many([(i, 1, 1), (i, 2, 1)])
+
+        self.assertEqual(2, len(subscription.get_all()))
+        self.assertEqual(2, subscription.dropped)
+        # the backend still got everything
+        self.assertEqual(6, len(list(backend.lines())))
+
+    def test_after_dedup(self):
+        storage = RamdiskStorageBackend()
+        storage.append_many([(1, 10, 1), (2, 11, 1)])
+        subscription = self.bus.subscribe()
+        backend = DedupBackend(PublishingBackend(storage, self.bus, "a"))
+
+        backend.append_many([(2, 11, 1), (3, 12, 1)])
+        self.assertEqual([("a", ((3, 12, 1),))], subscription.get_all())
@@ -27,3 +27,17 @@ class TestPackBackend(unittest.TestCase, CommonBackend):
     def test_reopen(self):
         pass  # override. Doesn't need to work for RamdiskStorageBackend
 
+    def test_state_survives_reopen(self):
+        pass  # override. Doesn't need to work for RamdiskStorageBackend
+
+    def test_state_saved_on_sync(self):
+        pass  # override. Doesn't need to work for RamdiskStorageBackend
+
+    def test_state_outdated_by_append(self):
+        pass  # override. Doesn't need to work for RamdiskStorageBackend
+
+    def test_range(self):
+        self.backend.append_many([(1, 1, 1), (2, 2, 2), (2, 3, 3), (4, 4, 4)])
+        self.assertEqual([(2, 2, 2), (2, 3, 3)], list(self.backend.range(2, 4)))
+        self.assertEqual([(4, 4, 4)], list(self.backend.range(3)))
+        self.assertEqual([(1, 1, 1)], list(self.backend.range(ts_to=2)))
@@ -0,0 +1,133 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.columnarbackend import ColumnarStorageBackend
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.partitionedbackend import DAY, PartitionedStorageBackend
+from coinotomy.backend.reader import open_reader
+from coinotomy.backend.tests.test_backend_common import generate_n
+from coinotomy.backend.tests.test_partitionedbackend import T0, generate_days
+from coinotomy.utils.align import iter_arrays
+
+
+class ReaderTests():
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = self.backend_class(os.path.join(self.directory, "ex.pair"))
+
+    def tearDown(self):
+        self.backend.unload()
+        shutil.rmtree(self.directory)
+
+    def _open(self):
+        self.backend.flush()
+        return open_reader(self.backend._get_filename())
+
+    def test_empty(self):
+        with self._open() as reader:
+            self.assertEqual([], list(reader.lines()))
+            self.assertEqual([], list(reader.rlines()))
+            self.assertEqual([], list(reader.range(5)))
+
+    def test_read(self):
+        self.backend.append_many(generate_n(5000))
+        with self._open() as reader:
+            self.assertEqual(generate_n(5000), list(reader.lines()))
+            self.assertEqual(generate_n(5000)[::-1], list(reader.rlines()))
+            self.assertEqual(generate_n(3000)[1000:], list(reader.range(1000, 3000)))
+            self.assertEqual(generate_n(5000)[4990:], list(reader.range(4989.5)))
+
+    def test_snapshot(self):
+        self.backend.append_many(generate_n(100))
+        reader = self._open()
+        try:
+            self.backend.append_many(generate_n(200)[100:])
+            self.backend.flush()
+            self.assertEqual(generate_n(100), list(reader.lines()))
+            self.assertEqual(generate_n(100)[::-1], list(reader.rlines()))
+        finally:
+            reader.close()
+
+    def test_partial_write_is_ignored(self):
+        self.backend.append_many(generate_n(100))
+        self.backend.flush()
+        with open(self.backend._get_filename(), 'ab') as fd:
+            fd.write(self.PARTIAL)
+
+        with open_reader(self.backend._get_filename()) as reader:
+            self.assertEqual(generate_n(100), list(reader.lines()))
+            self.assertEqual(generate_n(100)[::-1], list(reader.rlines()))
+            self.assertEqual(generate_n(100)[90:], list(reader.range(90)))
+
+    def test_arrays(self):
+        self.backend.append_many(generate_n(5000))
+        with self._open() as reader:
+            self.backend.append_many(generate_n(6000)[5000:])
+            self.backend.flush()
+            chunks = list(iter_arrays(reader, 1000, 4000, chunk_rows=1024))
+        self.assertEqual([1024, 1024, 952], [len(ts) for ts, p, v in chunks])
+        self.assertEqual(generate_n(4000)[1000:],
+                         [row for ts, p, v in chunks for row in zip(ts.tolist(), p.tolist(), v.tolist())])
+
+    def test_interleaved_iterators(self):
+        self.backend.append_many(generate_n(5000))
+        with self._open() as reader:
+            pairs = list(zip(reader.lines(), reader.rlines()))
+        self.assertEqual(list(zip(generate_n(5000), generate_n(5000)[::-1])), pairs)
+
+
+class TestCsvReader(ReaderTests, unittest.TestCase):
+    backend_class = CsvStorageBackend
+    PARTIAL = b'100,50'
+
+
+class TestPackReader(ReaderTests, unittest.TestCase):
+    backend_class = PackStorageBackend
+    PARTIAL = b'\0' * 5
+
+
+class TestColumnarReader(ReaderTests, unittest.TestCase):
+    backend_class = ColumnarStorageBackend
+    PARTIAL = b'COL1garbage'
+
+
+class TestPartitionedReader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.backend = PartitionedStorageBackend(os.path.join(self.directory, "ex.pair"), PackStorageBackend)
+
+    def tearDown(self):
+        self.backend.unload()
+        shutil.rmtree(self.directory)
+
+    def test_read(self):
+        trades = generate_days(3, 100)
+        self.backend.append_many(trades)
+        self.backend.flush()
+        with open_reader(self.backend.template) as reader:
+            # the snapshot holds neither later trades of the newest day nor new days
+            self.backend.append_many(generate_days(5, 100)[250:])
+            self.backend.flush()
+            self.assertEqual(trades, list(reader.lines()))
+            self.assertEqual(trades[::-1], list(reader.rlines()))
+            self.assertEqual(trades[50:150], list(reader.range(trades[50][0], trades[150][0])))
+            chunks = list(iter_arrays(reader, T0 + 0.5 * DAY, chunk_rows=64))
+        self.assertEqual(trades[50:], [row for ts, p, v in chunks for row in zip(ts.tolist(), p.tolist(), v.tolist())])
+
+    def test_empty(self):
+        with open_reader(self.backend.template) as reader:
+            self.assertEqual([], list(reader.lines()))
+            self.assertEqual([], list(reader.range(5)))
+
+
+class TestOpenReader(unittest.TestCase):
+
+    def test_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            open_reader("ex.pair.txt")
@@ -0,0 +1,76 @@
+import os
+import unittest
+
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+from coinotomy.backend.sharedring import SharedRing, RingReader, SharedRingBackend
+from coinotomy.backend.tests.test_backend_common import generate_n
+
+NAME = "test.%s" % os.getpid()
+
+
+class TestSharedRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = SharedRing(NAME, capacity=10)
+        self.reader = RingReader(NAME)
+
+    def tearDown(self):
+        self.reader.close()
+        self.ring.close()
+
+    def test_poll(self):
+        self.assertEqual([], self.reader.poll())
+
+        self.ring.append_many(generate_n(3))
+        self.assertEqual(generate_n(3), self.reader.poll())
+        self.assertEqual([], self.reader.poll())
+
+        self.ring.append_many(generate_n(5)[3:])
+        self.assertEqual(generate_n(5)[3:], self.reader.poll())
+
+    def test_wraps_around(self):
+        self.ring.append_many(generate_n(8))
+        self.assertEqual(generate_n(8), self.reader.poll())
+
+        self.ring.append_many(generate_n(15)[8:])
+        self.assertEqual(generate_n(15)[8:], self.reader.poll())
+        self.assertEqual(0, self.reader.missed)
+
+    def test_overrun(self):
+        self.ring.append_many(generate_n(25))
+        self.assertEqual(generate_n(25)[16:], self.reader.poll())
+        self.assertEqual(16, self.reader.missed)
+
+    def test_from_start(self):
+        self.ring.append_many(generate_n(4))
+        reader = RingReader(NAME, from_start=True)
+        try:
+            self.assertEqual(generate_n(4), reader.poll())
+            self.assertEqual([], reader.poll())
+        finally:
+            reader.close()
+
+    def test_restart_continues(self):
+        self.ring.append_many(generate_n(4))
+        self.ring.close(unlink=False)
+        self.ring = SharedRing(NAME, capacity=10)
+        self.ring.append_many(generate_n(6)[4:])
+        self.assertEqual(generate_n(6), self.reader.poll())
+
+
+class TestSharedRingBackend(unittest.TestCase):
+
+    def test_publishes_appends(self):
+        storage = RamdiskStorageBackend()
+        backend = SharedRingBackend(storage, NAME, capacity=100)
+        reader = RingReader(NAME)
+        try:
+            backend.append(*generate_n(1)[0])
+            backend.append_many(generate_n(10)[1:])
+            backend.flush()
+
+            self.assertEqual(generate_n(10), reader.poll())
+            self.assertEqual(generate_n(10), list(backend.lines()))
+        finally:
+            reader.close()
+            backend.unload()
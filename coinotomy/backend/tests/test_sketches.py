@@ -0,0 +1,178 @@
+import os
+import os.path
+import random
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+from coinotomy.backend.sketches import (DAY, ACCURACY, LogSketch, PriceProfile, SketchBackend, aggregate, read_days,
+                                        read_sketch)
+
+T0 = 1483228800  # 01 Jan 2017 00:00:00 GMT
+
+
+def trades(days, per_day=1000, seed=0):
+    rnd = random.Random(seed)
+    return [(T0 + d * DAY + i * DAY / per_day, rnd.uniform(900, 1100), rnd.expovariate(1))
+            for d in range(days) for i in range(per_day)]
+
+
+class TestLogSketch(unittest.TestCase):
+
+    def test_quantiles(self):
+        values = [random.Random(1).lognormvariate(0, 2) for _ in range(10000)]
+        sketch = LogSketch()
+        for x in values:
+            sketch.add(x)
+
+        values.sort()
+        for q in (0, 0.01, 0.25, 0.5, 0.9, 0.99, 1):
+            exact = values[max(0, int(q * len(values)) - 1)]
+            self.assertAlmostEqual(exact, sketch.quantile(q), delta=exact * ACCURACY * 1.01)
+        self.assertLess(len(sketch.counts), 3000)
+
+    def test_merge_and_json(self):
+        a, b, both = LogSketch(), LogSketch(), LogSketch()
+        for i in range(1, 100):
+            (a if i % 2 else b).add(i, 2)
+            both.add(i, 2)
+        a.add(0)
+        both.add(0)
+
+        a.merge(LogSketch.from_json(b.to_json()))
+        self.assertEqual(both.counts, a.counts)
+        self.assertEqual(both.total, a.total)
+        self.assertEqual(0.0, a.quantile(0))
+        self.assertIsNone(LogSketch().quantile(0.5))
+
+    def test_buckets(self):
+        sketch = LogSketch(0.01)
+        sketch.add(100, 3)
+        sketch.add(100.1, 1)
+        sketch.add(200, 5)
+        buckets = sketch.buckets()
+        self.assertEqual([4, 5], [weight for low, high, weight in buckets])
+        self.assertTrue(buckets[0][0] < 100 <= 100.1 <= buckets[0][1])
+
+
+    def test_add_many(self):
+        import numpy
+
+        values = [random.Random(2).lognormvariate(0, 2) for _ in range(1000)] + [0.0]
+        one, many = LogSketch(), LogSketch()
+        for x in values:
+            one.add(x, 2)
+        many.add_many(numpy.array(values), numpy.full(len(values), 2.0))
+        self.assertEqual(sorted(one.counts), sorted(many.counts))
+        self.assertEqual(one.zero, many.zero)
+        self.assertAlmostEqual(one.total, many.total)
+
+
+class TestPriceProfile(unittest.TestCase):
+
+    def test_buckets(self):
+        profile = PriceProfile(0.5)
+        profile.add(100.2, 3)
+        profile.add(100.4, 1)
+        profile.add(101, 5)
+        self.assertEqual([(100.0, 100.5, 4), (101.0, 101.5, 5)], profile.buckets())
+
+    def test_merge(self):
+        a, b = PriceProfile(0.5), PriceProfile(0.5)
+        a.add(10, 1)
+        b.add(10.1, 2)
+        a.merge(PriceProfile.from_json(b.to_json()))
+        self.assertEqual([(10.0, 10.5, 3)], a.buckets())
+
+        empty = PriceProfile()
+        empty.merge(a)
+        self.assertEqual(0.5, empty.tick)
+        other = PriceProfile(2)
+        other.add(10, 1)
+        with self.assertRaises(ValueError):
+            a.merge(other)
+
+
+class TestSketchBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.name = os.path.join(self.directory, "ex.pair")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _create(self, name=None):
+        name = name or self.name
+        return SketchBackend(CsvStorageBackend(name), name)
+
+    def test_days(self):
+        backend = SketchBackend(RamdiskStorageBackend(), self.name)
+        backend.append_many(trades(3))
+        backend.flush()
+
+        self.assertEqual([T0, T0 + DAY], [day.day for day in read_days(self.name)])
+        self.assertEqual([T0 + DAY], [day.day for day in read_days(self.name, T0 + 1, T0 + 3 * DAY)])
+        self.assertEqual(3000, backend.sketch().trades)
+        self.assertEqual(2000, read_sketch(self.name).trades)
+
+        expected = sorted(v for ts, p, v in trades(3))[1499]
+        self.assertAlmostEqual(expected, backend.sketch().size.quantile(0.5), delta=expected * ACCURACY * 1.01)
+        volume = sum(v for ts, p, v in trades(3))
+        self.assertAlmostEqual(volume, sum(weight for low, high, weight in backend.sketch().price.buckets()))
+
+        backend.append(T0, 1, 1)
+        self.assertEqual(1, backend.late)
+        backend.unload()
+
+    def test_resume(self):
+        backend = self._create()
+        backend.append_many(trades(2)[:1500])
+        backend.unload()
+
+        backend = self._create()
+        backend.append_many(trades(2)[1500:])
+        resumed = backend.sketch()
+        backend.unload()
+
+        backend = SketchBackend(RamdiskStorageBackend(), self.name + "2")
+        backend.append_many(trades(2))
+        expected = backend.sketch()
+        # the rebuilt day is summed from the trades as stored in the csv file
+        self.assertEqual(expected.trades, resumed.trades)
+        self.assertEqual(sorted(expected.size.counts), sorted(resumed.size.counts))
+        for i, weight in expected.price.counts.items():
+            self.assertAlmostEqual(weight, resumed.price.counts[i], places=6)
+        self.assertEqual(1, len(read_days(self.name)))
+
+    def test_torn_line(self):
+        backend = self._create()
+        backend.append_many(trades(3))
+        backend.unload()
+        filename = self.name + ".sketch"
+        os.truncate(filename, os.path.getsize(filename) - 10)
+
+        # the second day is dropped and rebuilt from the trades
+        backend = self._create()
+        backend.flush()
+        self.assertEqual([T0, T0 + DAY], [day.day for day in read_days(self.name)])
+        self.assertEqual(2000, read_sketch(self.name).trades)
+        backend.unload()
+
+    def test_tick(self):
+        backend = SketchBackend(RamdiskStorageBackend(), self.name, tick=50)
+        backend.append_many(trades(1))
+        self.assertEqual([(900, 950), (950, 1000), (1000, 1050), (1050, 1100)],
+                         [(low, high) for low, high, vol in backend.sketch().price.buckets()])
+        backend.unload()
+
+    def test_aggregate(self):
+        for i, name in enumerate(("a", "b")):
+            backend = SketchBackend(RamdiskStorageBackend(), os.path.join(self.directory, name))
+            backend.append_many(trades(2, seed=i))
+            backend.unload()
+
+        combined = aggregate([os.path.join(self.directory, name) for name in ("a", "b")])
+        self.assertEqual(2000, combined.trades)
@@ -0,0 +1,67 @@
+import os.path
+import unittest
+
+from coinotomy.backend.sqlitebackend import SqliteStorageBackend
+from coinotomy.backend.tests.test_backend_common import CommonBackend, generate_n
+
+
+class TestSqliteBackend(unittest.TestCase, CommonBackend):
+
+    FILENAME = "test6.tmp"
+
+    def _create(self):
+        return SqliteStorageBackend(self.FILENAME)
+
+    def setUp(self):
+        self.maxDiff = None
+        self.backend = self._create()
+
+    def tearDown(self):
+        self.backend.unload()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.backend._get_filename() + suffix):
+                os.unlink(self.backend._get_filename() + suffix)
+
+    def test_one_database_per_exchange(self):
+        other = SqliteStorageBackend(self.FILENAME + ".other")
+        try:
+            self.assertEqual(self.backend._get_filename(), other._get_filename())
+            self.backend.append_many(generate_n(10))
+            other.append(1, 2, 3)
+            self.backend.flush()
+            other.flush()
+
+            self.assertEqual(generate_n(10), list(self.backend.lines()))
+            self.assertEqual([(1, 2, 3)], list(other.lines()))
+        finally:
+            other.unload()
+
+    def test_range(self):
+        self.backend.append_many(generate_n(100))
+
+        self.assertEqual(generate_n(100)[10:20], list(self.backend.range(10, 20)))
+        self.assertEqual(generate_n(100)[90:], list(self.backend.range(90)))
+        self.assertEqual(generate_n(100)[:5], list(self.backend.range(ts_to=5)))
+
+    def test_equal_timestamps_keep_order(self):
+        self.backend.append_many([(1, 3, 1), (1, 2, 1)])
+        self.backend.flush()
+        self.backend.unload()
+        self.backend = self._create()
+        self.backend.append_many([(1, 1, 1), (2, 0, 1)])
+
+        self.assertEqual([(1, 3, 1), (1, 2, 1), (1, 1, 1), (2, 0, 1)], list(self.backend.lines()))
+        self.assertEqual([(2, 0, 1), (1, 1, 1), (1, 2, 1), (1, 3, 1)], list(self.backend.rlines()))
+
+    def test_concurrent_reader(self):
+        self.backend.append_many(generate_n(10))
+        self.backend.flush()
+
+        reader = SqliteStorageBackend(self.FILENAME)
+        try:
+            self.backend.append(10, 5, 20)
+            self.assertEqual(generate_n(10), list(reader.lines()))
+            self.backend.flush()
+            self.assertEqual(generate_n(11), list(reader.lines()))
+        finally:
+            reader.unload()
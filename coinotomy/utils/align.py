@@ -0,0 +1,137 @@
+"""
+Align the trades of several symbols on common timestamps with numpy.
+
+Prices are joined "as of" a timestamp: the price of the last trade at or before
+it, so gaps are forward filled. Every function works on whole arrays with
+searchsorted, there is no Python loop per trade.
+
+A synthetic kraken btc/usd price at every kraken trade:
+
+    ts, btc_eur, _ = read_arrays(PackStorageBackend("kraken.btc_eur"))
+    fx_ts, eur_usd, _ = read_arrays(PackStorageBackend("bitstamp.eur_usd"))
+    btc_usd = btc_eur * asof(fx_ts, eur_usd, ts, max_age=60)
+
+The spread between two exchanges on a 1 second grid:
+
+    at = grid(ts_from, ts_to, 1)
+    prices = align({"kraken": read_arrays(kraken, ts_from, ts_to),
+                    "bitstamp": read_arrays(bitstamp, ts_from, ts_to)}, at)
+    spread = prices["kraken"] - prices["bitstamp"]
+
+Timestamps must be non-decreasing, as they are in the trade files.
+"""
+
+import itertools
+
+import numpy
+
+# rows per chunk of iter_arrays(), and when a backend without bulk reader is read with range()
+CHUNK_ROWS = 64*1024
+
+
+def read_arrays(backend, ts_from=None, ts_to=None):
+    """
+    return (timestamps, prices, volumes) float64 arrays of the trades with ts_from <= timestamp < ts_to
+
+    Pack files are mapped with as_array() and csv files are parsed with
+    read_arrays(), other backends and readers are read with range().
+    """
+    if hasattr(backend, 'as_array'):
+        return _columns(_select(backend.as_array(), ts_from, ts_to))
+
+    chunks = list(iter_arrays(backend, ts_from, ts_to))
+    if not chunks:
+        return numpy.zeros(0), numpy.zeros(0), numpy.zeros(0)
+    return tuple(numpy.concatenate(column) for column in zip(*chunks))
+
+
+def iter_arrays(backend, ts_from=None, ts_to=None, chunk_rows=CHUNK_ROWS):
+    """
+    yield (timestamps, prices, volumes) float64 arrays of up to chunk_rows trades with
+    ts_from <= timestamp < ts_to, read like read_arrays() but without holding all of them
+    """
+    if hasattr(backend, 'as_array'):
+        rows = _select(backend.as_array(), ts_from, ts_to)
+        for i in range(0, len(rows), chunk_rows):
+            yield _columns(rows[i:i + chunk_rows])
+    elif hasattr(backend, 'read_arrays'):
+        yield from backend.read_arrays(ts_from, ts_to, chunk_rows)
+    else:
+        rows = backend.range(ts_from, ts_to)
+        while True:
+            chunk = numpy.array(list(itertools.islice(rows, chunk_rows)), dtype=numpy.float64).reshape(-1, 3)
+            if not len(chunk):
+                break
+            yield chunk[:, 0], chunk[:, 1], chunk[:, 2]
+
+
+def _select(rows, ts_from, ts_to):
+    timestamps = rows['timestamp']
+    lo = 0 if ts_from is None else numpy.searchsorted(timestamps, ts_from, 'left')
+    hi = len(rows) if ts_to is None else numpy.searchsorted(timestamps, ts_to, 'left')
+    return rows[lo:max(lo, hi)]
+
+
+def _columns(rows):
+    return (rows['timestamp'].astype(numpy.float64), rows['price'].astype(numpy.float64),
+            rows['volume'].astype(numpy.float64))
+
+
+def grid(ts_from, ts_to, step):
+    """
+    return the timestamps ts_from, ts_from + step, ... before ts_to
+    """
+    return numpy.arange(ts_from, ts_to, step, dtype=numpy.float64)
+
+
+def asof(timestamps, values, at, max_age=None):
+    """
+    return for every timestamp in at the value of the last trade at or before it.
+
+    The result is NaN before the first trade, and where the last trade is more
+    than max_age seconds old.
+    """
+    at = numpy.asarray(at, dtype=numpy.float64)
+    i = numpy.searchsorted(timestamps, at, 'right') - 1
+    valid = i >= 0
+    if max_age is not None:
+        valid &= at - timestamps[numpy.maximum(i, 0)] <= max_age
+    result = numpy.full(len(at), numpy.nan)
+    result[valid] = numpy.asarray(values, dtype=numpy.float64)[i[valid]]
+    return result
+
+
+def align(series, at, max_age=None):
+    """
+    return {symbol: prices as of at} for series, a mapping of symbols to
+    (timestamps, prices) or (timestamps, prices, volumes) tuples
+    """
+    return {symbol: asof(columns[0], columns[1], at, max_age) for symbol, columns in series.items()}
+
+
+def resample(timestamps, prices, volumes, ts_from, ts_to, step):
+    """
+    return (starts, closes, volumes, vwaps) for the intervals [start, start + step)
+    of grid(ts_from, ts_to, step).
+
+    closes are the prices of the last trade before the end of every interval,
+    forward filled into intervals without trades; vwaps are NaN for those.
+    """
+    starts = grid(ts_from, ts_to, step)
+    # trades before ts_from only count for the forward filled price
+    first = numpy.searchsorted(timestamps, ts_from, 'left')
+    last = numpy.searchsorted(timestamps, ts_to, 'left')
+    bins = ((timestamps[first:last] - ts_from) // step).astype(numpy.int64)
+
+    volume = numpy.bincount(bins, weights=volumes[first:last], minlength=len(starts))[:len(starts)]
+    price_volume = numpy.bincount(bins, weights=prices[first:last] * volumes[first:last],
+                                  minlength=len(starts))[:len(starts)]
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        vwaps = numpy.where(volume > 0, price_volume / volume, numpy.nan)
+
+    # the last trade before the end of an interval, but not later than ts_to
+    ends = numpy.minimum(starts + step, ts_to)
+    i = numpy.searchsorted(timestamps, ends, 'left') - 1
+    closes = numpy.full(len(starts), numpy.nan)
+    closes[i >= 0] = numpy.asarray(prices, dtype=numpy.float64)[i[i >= 0]]
+    return starts, closes, volume, vwaps
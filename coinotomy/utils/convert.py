@@ -0,0 +1,194 @@
+"""
+Convert trade histories between storage backends.
+
+    python -m coinotomy convert --from csv --to pack [--directory DIR] [--workers N] [--keep]
+
+Every file is streamed in chunks into a temporary file of the target backend,
+which is read back and compared against the source (row count and crc32 of the
+rows as the target backend represents them) before it is moved in place with
+os.replace(). Converting a backend to itself compacts it, for example to merge
+the small blocks older versions of ColumnarStorageBackend wrote on every flush.
+
+Files are converted in parallel with a process pool. The source is read with
+a snapshot reader from coinotomy.backend.reader, so its sidecar files are left
+alone. Converting a symbol requires its collector to be stopped: main.py holds
+the OwnerLock (coinotomy.backend.owner) of every symbol it collects for as long
+as it runs, and a symbol is only converted while its lock is free. The lock is
+held until the new file is in place. Symbols that are being collected are
+skipped and reported as failed; convert them again after stopping main.py, and
+switch STORAGE_CLASS before starting it again.
+"""
+
+import argparse
+import itertools
+import logging
+import multiprocessing
+import os
+import os.path
+import struct
+import zlib
+
+from coinotomy.backend.columnarbackend import ColumnarStorageBackend, TAIL_SUFFIX
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.owner import OwnerLock
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.reader import open_reader
+
+BACKENDS = {
+    'csv': CsvStorageBackend,
+    'pack': PackStorageBackend,
+    'columnar': ColumnarStorageBackend,
+}
+
+CHUNK_ROWS = 64*1024
+TMP_SUFFIX = '.converting'
+
+ROW = struct.Struct(b"<ddd")
+
+log = logging.getLogger("convert")
+
+
+class ConversionError(Exception):
+    pass
+
+
+def checksum(rows, crc=0):
+    """
+    return (number of rows, crc32) of an iterable of trades
+    """
+    n = 0
+    for row in rows:
+        crc = zlib.crc32(ROW.pack(*row), crc)
+        n += 1
+    return n, crc
+
+
+def convert_file(template, source_class, target_class, keep=False, chunk_rows=CHUNK_ROWS):
+    """
+    convert the file belonging to template, return the number of rows.
+
+    raises ConversionError if a running collector owns the file.
+    """
+    owner = OwnerLock(template)
+    if not owner.acquire(blocking=False):
+        raise ConversionError("%s is written by a running collector" % template)
+    try:
+        return _convert_file(template, source_class, target_class, keep, chunk_rows)
+    finally:
+        owner.release()
+
+
+def _convert_file(template, source_class, target_class, keep, chunk_rows):
+    tmp_template = template + TMP_SUFFIX
+    _remove(tmp_template, target_class)
+
+    source_file = template + source_class.extension()
+    target_file = template + target_class.extension()
+    tmp_file = tmp_template + target_class.extension()
+
+    size = os.path.getsize(source_file)
+    target = target_class(tmp_template)
+    n_rows, crc = 0, 0
+    try:
+        with open_reader(source_file) as source:
+            lines = source.lines()
+            while True:
+                chunk = list(itertools.islice(lines, chunk_rows))
+                if not chunk:
+                    break
+                target.append_many(chunk)
+                n, crc = checksum((target.roundtrip(*row) for row in chunk), crc)
+                n_rows += n
+    finally:
+        target.unload()
+
+    with open_reader(tmp_file) as verify:
+        written = checksum(verify.lines())
+    if written != (n_rows, crc):
+        _remove(tmp_template, target_class)
+        raise ConversionError("%s: wrote %s rows with crc %s, expected %s rows with crc %s" %
+                              (template, written[0], written[1], n_rows, crc))
+    if os.path.getsize(source_file) != size:
+        _remove(tmp_template, target_class)
+        raise ConversionError("%s was written to during the conversion" % source_file)
+
+    _remove_sidecars(target_file)
+    os.replace(tmp_file, target_file)
+    # the unfinished block of a columnar file belongs to the new file
+    if os.path.exists(tmp_file + TAIL_SUFFIX):
+        os.replace(tmp_file + TAIL_SUFFIX, target_file + TAIL_SUFFIX)
+    _remove(tmp_template, target_class)
+    if not keep and source_file != target_file:
+        os.unlink(source_file)
+        _remove_sidecars(source_file)
+    return n_rows
+
+
+def convert_directory(directory, source_class, target_class, workers=None, keep=False):
+    """
+    convert all files of source_class in directory, return the total number of rows.
+    """
+    extension = source_class.extension()
+    jobs = [(os.path.join(directory, f[:-len(extension)]), source_class, target_class, keep)
+            for f in sorted(os.listdir(directory))
+            if f.endswith(extension) and not f.endswith(TMP_SUFFIX + extension)]
+
+    total = 0
+    failed = 0
+    with multiprocessing.Pool(workers) as pool:
+        for template, n_rows, error in pool.imap_unordered(_convert_job, jobs):
+            if error:
+                failed += 1
+                log.error("failed to convert %s: %s", template, error)
+            else:
+                total += n_rows
+                log.info("converted %s, %s rows", template, n_rows)
+    if failed:
+        raise ConversionError("%s of %s files failed to convert" % (failed, len(jobs)))
+    return total
+
+
+def _convert_job(job):
+    template = job[0]
+    try:
+        return template, convert_file(*job), None
+    except Exception as e:
+        return template, 0, str(e)
+
+
+def _remove(template, backend_class):
+    filename = template + backend_class.extension()
+    if os.path.exists(filename):
+        os.unlink(filename)
+    _remove_sidecars(filename)
+    if os.path.exists(template + '.checkpoint'):
+        os.unlink(template + '.checkpoint')
+
+
+def _remove_sidecars(filename):
+    # indices are rebuilt when a backend is opened
+    for sidecar in (filename + '.idx', filename + '.sums', filename + TAIL_SUFFIX):
+        if os.path.exists(sidecar):
+            os.unlink(sidecar)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog="coinotomy convert",
+                                     description="convert trade histories between storage backends")
+    parser.add_argument('--from', dest='source', choices=sorted(BACKENDS), default='csv')
+    parser.add_argument('--to', dest='target', choices=sorted(BACKENDS), required=True)
+    parser.add_argument('--directory', help="defaults to STORAGE_DIRECTORY from the config")
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of cpus")
+    parser.add_argument('--keep', action='store_true', help="keep the source files")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    directory = args.directory
+    if directory is None:
+        from coinotomy.config.config import STORAGE_DIRECTORY
+        directory = STORAGE_DIRECTORY
+
+    total = convert_directory(directory, BACKENDS[args.source], BACKENDS[args.target],
+                              workers=args.workers, keep=args.keep)
+    log.info("converted %s rows", total)
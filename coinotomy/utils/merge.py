@@ -0,0 +1,82 @@
+"""
+Replay the trades of many symbols as a single stream in timestamp order.
+
+    for timestamp, symbol, price, vol in merge_streams(trade_files("coinotomy_data"), ts_from, ts_to):
+        ...
+
+Every input is read with its own range() iterator, which reads the file in
+blocks, and the iterators are merged with a heap. Memory use depends on the
+number of inputs, not on the number of trades. Close the generator to stop
+early; the files opened for it are closed with it.
+"""
+
+import heapq
+import operator
+import os
+import os.path
+
+from coinotomy.backend.reader import READERS, PartitionedReader, open_reader
+from coinotomy.backend.sqlitebackend import SqliteStorageBackend
+
+
+def trade_files(directory, select=None):
+    """
+    return {symbol: path} for the trade files in directory, optionally only the
+    symbols for which select(symbol) is true.
+
+    The directories of PartitionedStorageBackend are returned as a whole, for
+    JournalStorageBackend only the compacted files are found. Raises ValueError
+    for a SqliteStorageBackend database, which has no snapshot reader.
+    """
+    files = {}
+    for f in sorted(os.listdir(directory)):
+        path = os.path.join(directory, f)
+        if os.path.isdir(path):
+            candidates = [(f, path)] if PartitionedReader.find_partitions(path) else []
+        elif f.endswith(SqliteStorageBackend.extension()):
+            raise ValueError("don't know how to read %s" % path)
+        else:
+            candidates = [(f[:-len(extension)], path) for extension in READERS if f.endswith(extension)]
+        for symbol, path in candidates:
+            if select is None or select(symbol):
+                files[symbol] = path
+    return files
+
+
+def merge_streams(backends, ts_from=None, ts_to=None):
+    """
+    yield (timestamp, symbol, price, vol) for the trades with ts_from <= timestamp < ts_to
+    of all backends, in timestamp order.
+
+    backends maps a symbol to a storage backend, a reader or the path of a
+    trade file. Trades with the same timestamp are yielded in the order of backends.
+    """
+    opened = []
+    streams = []
+    try:
+        for symbol, backend in backends.items():
+            if isinstance(backend, str):
+                backend = open_reader(backend)
+                opened.append(backend)
+            streams.append(_range(backend, ts_from, ts_to))
+
+        tagged = [_tag(symbol, rows) for symbol, rows in zip(backends, streams)]
+        yield from heapq.merge(*tagged, key=operator.itemgetter(0))
+    finally:
+        for rows in streams:
+            if hasattr(rows, 'close'):
+                rows.close()
+        for reader in opened:
+            reader.close()
+
+
+def _tag(symbol, rows):
+    for ts, p, v in rows:
+        yield ts, symbol, p, v
+
+
+def _range(backend, ts_from, ts_to):
+    if hasattr(backend, 'range'):
+        return backend.range(ts_from, ts_to)
+    return (row for row in backend.lines()
+            if (ts_from is None or row[0] >= ts_from) and (ts_to is None or row[0] < ts_to))
@@ -1,4 +1,5 @@
-
+import io
+import mmap
 import os
 
 DEFAULT_BLOCKSIZE = 16*1024
@@ -21,40 +22,89 @@ class ReverseFileIterator():
         self.fd.seek(self.remaining_size)
         return self.fd.read(blocksize)
 
-    def __exit__(self):
-        pass
-
 
 class ReserveLineIterator():
-    def __init__(self, fd, linsep, blocksize=DEFAULT_BLOCKSIZE):
-        self.block_device = ReverseFileIterator(fd, blocksize)
-        self.block_iterator = iter(self.block_device)
-        self.buffer = linsep[:0]
+    """
+    Iterate over the lines of a file from back to front.
+
+    Every block is split once and its lines are handed out from a list, a line
+    spanning several blocks is only joined once. The file is memory mapped if
+    possible. Lines are returned without separator, blank lines are skipped.
+    Only the first `end` bytes are read if end is given.
+    """
+
+    def __init__(self, fd, linsep, blocksize=DEFAULT_BLOCKSIZE, end=None):
+        self.fd = fd
         self.linsep = linsep
+        self.blocksize = blocksize
+        self.end = end
+        self.batch_iterator = self.batches()
+        self.lines = iter(())
 
     def __iter__(self):
         return self
 
-    def _read_more(self):
-        self.buffer = next(self.block_iterator) + self.buffer
-        if self.block_device.remaining_size == 0:
-            self.buffer = self.linsep + self.buffer
-
     def __next__(self):
-        try:
-            last_newline = self.buffer.rindex(self.linsep, 0, -1)
-        except ValueError:
-            self._read_more()
-            return self.__next__()  # probably the last line
+        while True:
+            line = next(self.lines, None)
+            if line is not None:
+                return line
+            self.lines = iter(next(self.batch_iterator))
 
-        last_newline += 1
-        line = self.buffer[last_newline:]
-        self.buffer = self.buffer[:last_newline]
+    def close(self):
+        """
+        release the memory map, the file itself is left open
+        """
+        self.batch_iterator.close()
 
-        if not line.strip():
-            return self.__next__()  # probably the last line
+    def batches(self):
+        """
+        yield lists of lines, newest first. Every list holds the lines that
+        end in one block of the file.
+        """
+        pieces = []  # fragments of the line being read, newest first
+        for block in self._blocks():
+            parts = block.split(self.linsep)
+            if len(parts) == 1:
+                pieces.append(block)
+                continue
 
-        return line
+            pieces.append(parts[-1])
+            lines = [b''.join(reversed(pieces))]
+            lines.extend(parts[-2:0:-1])
+            pieces = [parts[0]]
 
-    def __exit__(self):
-        pass
+            batch = [line for line in lines if line.strip()]
+            if batch:
+                yield batch
+
+        line = b''.join(reversed(pieces))
+        if line.strip():
+            yield [line]
+
+    def _blocks(self):
+        self.fd.seek(0, os.SEEK_END)
+        size = self.fd.tell()
+        if self.end is not None:
+            size = min(size, self.end)
+        if size == 0:
+            return
+
+        try:
+            data = mmap.mmap(self.fd.fileno(), size, access=mmap.ACCESS_READ)
+        except (io.UnsupportedOperation, OSError, ValueError):
+            data = None
+
+        try:
+            end = size
+            while end > 0:
+                start = max(0, end - self.blocksize)
+                if data is not None:
+                    yield data[start:end]
+                else:
+                    self.fd.seek(start)
+                    yield self.fd.read(end - start)
+                end = start
+        finally:
+            if data is not None:
+                data.close()
@@ -0,0 +1,129 @@
+"""
+Run a function over every trade file of a directory with a process pool.
+
+    volumes = scan(STORAGE_DIRECTORY, daily_volume, workers=32)
+    total = scan(STORAGE_DIRECTORY, monotonic_errors, operator.add, initial=0)
+
+fn(symbol, reader) is called once per file in a worker process, with a
+snapshot reader from coinotomy.backend.reader, so it can run next to the
+collector. fn must be picklable: a module level function, or a
+functools.partial object of one. The largest files are handed out first, so
+a few big files don't leave the other workers idle at the end. A symbol stored
+with PartitionedStorageBackend is one job, see trade_files().
+
+The functions below read the trades as numpy arrays in chunks, with
+coinotomy.utils.align.iter_arrays().
+"""
+
+import collections
+import logging
+import multiprocessing
+import os.path
+
+from coinotomy.backend.reader import PartitionedReader, open_reader
+from coinotomy.utils.merge import trade_files
+
+DAY = 24*60*60
+
+log = logging.getLogger("scan")
+
+
+class ScanError(Exception):
+    pass
+
+
+def scan(directory, fn, reducer=None, initial=None, workers=None, select=None):
+    """
+    return {symbol: fn(symbol, reader)} for the trade files in directory, or, with a
+    reducer, reducer(...reducer(initial, result)..., result) over the results.
+
+    Results are reduced in the order they complete, so the reducer should not
+    depend on the order. select(symbol) limits the files, as in trade_files().
+    """
+    files = trade_files(directory, select)
+    jobs = sorted(((symbol, path, fn) for symbol, path in files.items()),
+                  key=lambda job: _size(job[1]), reverse=True)
+
+    results = {}
+    accumulated = initial
+    failed = 0
+    with multiprocessing.Pool(workers) as pool:
+        for symbol, result, error in pool.imap_unordered(_scan_job, jobs):
+            if error:
+                failed += 1
+                log.error("failed to scan %s: %s", symbol, error)
+            elif reducer is None:
+                results[symbol] = result
+            else:
+                accumulated = reducer(accumulated, result)
+    if failed:
+        raise ScanError("%s of %s files failed to scan" % (failed, len(jobs)))
+    return results if reducer is None else accumulated
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(p) for start, p in PartitionedReader.find_partitions(path))
+    return os.path.getsize(path)
+
+
+def _scan_job(job):
+    symbol, path, fn = job
+    try:
+        with open_reader(path) as reader:
+            return symbol, fn(symbol, reader), None
+    except Exception as e:
+        return symbol, None, str(e)
+
+
+def daily_volume(symbol, reader):
+    """
+    return {start of the day (UTC): volume}
+    """
+    import numpy
+    from coinotomy.utils.align import iter_arrays
+
+    volumes = collections.Counter()
+    for ts, p, v in iter_arrays(reader):
+        days, index = numpy.unique(ts - ts % DAY, return_inverse=True)
+        for day, volume in zip(days.tolist(), numpy.bincount(index, weights=v).tolist()):
+            volumes[day] += volume
+    return dict(volumes)
+
+
+def gaps(symbol, reader, min_gap=3600):
+    """
+    return (from, to) for every period of more than min_gap seconds without trades,
+    use functools.partial(gaps, min_gap=...) for another min_gap
+    """
+    import numpy
+
+    found = []
+    for ts in _timestamps(reader):
+        i = numpy.flatnonzero(numpy.diff(ts) > min_gap)
+        found.extend(zip(ts[i].tolist(), ts[i + 1].tolist()))
+    return found
+
+
+def monotonic_errors(symbol, reader):
+    """
+    return the number of trades with a timestamp before the one of the previous trade
+    """
+    import numpy
+
+    return sum(int(numpy.count_nonzero(numpy.diff(ts) < 0)) for ts in _timestamps(reader))
+
+
+def _timestamps(reader):
+    """
+    yield the timestamps of reader in chunks, every chunk starts with the last timestamp of the previous one
+    """
+    import numpy
+    from coinotomy.utils.align import iter_arrays
+
+    previous = None
+    for ts, p, v in iter_arrays(reader):
+        if not len(ts):
+            continue
+        yield ts if previous is None else numpy.concatenate(([previous], ts))
+        previous = ts[-1]
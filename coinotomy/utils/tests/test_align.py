@@ -0,0 +1,75 @@
+import math
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+from coinotomy.utils.align import align, asof, grid, read_arrays, resample
+
+TRADES = [(1.0, 10.0, 1.0), (2.5, 12.0, 1.0), (2.5, 11.0, 2.0), (6.0, 15.0, 0.5)]
+
+
+def nan_list(values):
+    return [None if math.isnan(x) else x for x in values]
+
+
+class TestAlign(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_read_arrays(self):
+        backends = [RamdiskStorageBackend(), CsvStorageBackend(os.path.join(self.directory, "a")),
+                    PackStorageBackend(os.path.join(self.directory, "b"))]
+        for backend in backends:
+            backend.append_many(TRADES)
+            timestamps, prices, volumes = read_arrays(backend, 2, 6)
+            self.assertEqual([2.5, 2.5], timestamps.tolist())
+            self.assertEqual([12.0, 11.0], prices.tolist())
+            self.assertEqual([1.0, 2.0], volumes.tolist())
+            self.assertEqual(4, len(read_arrays(backend)[0]))
+            self.assertEqual(0, len(read_arrays(backend, 7)[0]))
+            backend.unload()
+
+    def test_asof(self):
+        timestamps, prices, _ = (numpy.array(column) for column in zip(*TRADES))
+        self.assertEqual([None, 10.0, 10.0, 11.0, 11.0, 15.0],
+                         nan_list(asof(timestamps, prices, [0, 1, 2, 2.5, 5, 100])))
+        self.assertEqual([None, 10.0, 11.0, None],
+                         nan_list(asof(timestamps, prices, [0, 1, 3, 5], max_age=2)))
+
+    def test_align(self):
+        fx = (numpy.array([0.0, 3.0]), numpy.array([2.0, 3.0]))
+        btc = (numpy.array([1.0, 4.0]), numpy.array([100.0, 200.0]))
+        at = grid(0, 5, 1)
+        self.assertEqual([0, 1, 2, 3, 4], at.tolist())
+
+        prices = align({'fx': fx, 'btc': btc}, at)
+        self.assertEqual([2.0, 2.0, 2.0, 3.0, 3.0], prices['fx'].tolist())
+        self.assertEqual([None, 100.0, 100.0, 100.0, 200.0], nan_list(prices['btc']))
+        self.assertEqual([None, 200.0, 200.0, 300.0, 600.0], nan_list(prices['btc'] * prices['fx']))
+
+    def test_resample(self):
+        timestamps, prices, volumes = (numpy.array(column) for column in zip(*TRADES))
+        starts, closes, volume, vwaps = resample(timestamps, prices, volumes, 2, 7, 2)
+        self.assertEqual([2, 4, 6], starts.tolist())
+        self.assertEqual([11.0, 11.0, 15.0], closes.tolist())
+        self.assertEqual([3.0, 0.0, 0.5], volume.tolist())
+        self.assertEqual([34 / 3, None, 15.0], nan_list(vwaps))
+
+        # the last interval stops at ts_to
+        starts, closes, volume, vwaps = resample(timestamps, prices, volumes, 0, 5, 3)
+        self.assertEqual([0, 3], starts.tolist())
+        self.assertEqual([11.0, 11.0], closes.tolist())
+        self.assertEqual([4.0, 0.0], volume.tolist())
+
+        starts, closes, volume, vwaps = resample(timestamps, prices, volumes, -2, 0, 1)
+        self.assertEqual([None, None], nan_list(closes))
@@ -0,0 +1,109 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.columnarbackend import ColumnarStorageBackend, _encode_block
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.owner import OwnerLock
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.tests.test_backend_common import write_trades
+from coinotomy.utils.convert import convert_file, convert_directory, ConversionError
+
+
+def generate_n(n, offset=0):
+    return [(1505679642 + i * 0.1, 4000 + i / 3.0, 0.5 + i % 10) for i in range(offset, offset + n)]
+
+
+class TestConvert(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _files(self):
+        # the trade files, without sidecars and locks
+        return sorted(f for f in os.listdir(self.directory) if not f.endswith(('.idx', '.sums', '.tail', '.lock')))
+
+    def _read(self, backend_class, name):
+        backend = backend_class(os.path.join(self.directory, name))
+        try:
+            return list(backend.lines())
+        finally:
+            backend.unload()
+
+    def test_csv_to_pack(self):
+        trades = write_trades(self.directory, CsvStorageBackend, 'kraken.btc_usd', generate_n(1000))
+        template = os.path.join(self.directory, 'kraken.btc_usd')
+
+        self.assertEqual(1000, convert_file(template, CsvStorageBackend, PackStorageBackend, chunk_rows=300))
+
+        self.assertEqual(['kraken.btc_usd.pack'], self._files())
+        pack = self._read(PackStorageBackend, 'kraken.btc_usd')
+        self.assertEqual(1000, len(pack))
+        for (ts1, p1, v1), (ts2, p2, v2) in zip(trades, pack):
+            self.assertEqual(ts1, ts2)
+            self.assertAlmostEqual(p1, p2, delta=0.001)
+            self.assertEqual(v1, v2)
+
+    def test_keep_source(self):
+        write_trades(self.directory, CsvStorageBackend, 'a', generate_n(10))
+        convert_file(os.path.join(self.directory, 'a'), CsvStorageBackend, ColumnarStorageBackend, keep=True)
+
+        self.assertEqual(['a.col', 'a.csv'], self._files())
+
+    def test_compaction(self):
+        # a file with a block per trade, as older versions wrote them when flushing often
+        backend = ColumnarStorageBackend(os.path.join(self.directory, 'a'))
+        backend.unload()
+        with open(backend._get_filename(), 'ab') as fd:
+            for row in generate_n(500):
+                fd.write(_encode_block([row]))
+        size = os.path.getsize(backend._get_filename())
+
+        convert_file(os.path.join(self.directory, 'a'), ColumnarStorageBackend, ColumnarStorageBackend)
+
+        self.assertLess(os.path.getsize(backend._get_filename()) * 5, size)
+        self.assertEqual(generate_n(500), self._read(ColumnarStorageBackend, 'a'))
+
+    def test_directory(self):
+        expected = {}
+        for i in range(4):
+            name = 'ex.pair%i' % i
+            expected[name] = write_trades(self.directory, PackStorageBackend, name, generate_n(100 * i))
+
+        self.assertEqual(600, convert_directory(self.directory, PackStorageBackend, ColumnarStorageBackend, workers=2))
+
+        self.assertEqual(sorted(name + '.col' for name in expected), self._files())
+        for name, trades in expected.items():
+            self.assertEqual(trades, self._read(ColumnarStorageBackend, name))
+
+    def test_verification_failure_keeps_source(self):
+        class BrokenBackend(ColumnarStorageBackend):
+            def roundtrip(self, timestamp, price, vol):
+                return timestamp, price + 1, vol
+
+        write_trades(self.directory, CsvStorageBackend, 'a', generate_n(10))
+        with self.assertRaises(ConversionError):
+            convert_file(os.path.join(self.directory, 'a'), CsvStorageBackend, BrokenBackend)
+
+        self.assertEqual(['a.csv'], self._files())
+
+    def test_owned_file_is_skipped(self):
+        trades = write_trades(self.directory, CsvStorageBackend, 'a', generate_n(10))
+        template = os.path.join(self.directory, 'a')
+        index = os.path.join(self.directory, 'a.csv.idx')
+
+        with OwnerLock(template):
+            with self.assertRaises(ConversionError):
+                convert_file(template, CsvStorageBackend, PackStorageBackend)
+        self.assertEqual(['a.csv'], self._files())
+        self.assertEqual(trades, self._read(CsvStorageBackend, 'a'))
+
+        # the source is only read, its sidecars are left alone
+        convert_file(template, CsvStorageBackend, PackStorageBackend, keep=True)
+        self.assertFalse(os.path.exists(index))
+        self.assertEqual(['a.csv', 'a.pack'], self._files())
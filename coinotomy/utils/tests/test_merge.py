@@ -0,0 +1,75 @@
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.partitionedbackend import PartitionedStorageBackend
+from coinotomy.backend.ramdiskbackend import RamdiskStorageBackend
+from coinotomy.backend.sqlitebackend import SqliteStorageBackend
+from coinotomy.backend.tests.test_backend_common import write_trades
+from coinotomy.utils.merge import merge_streams, trade_files
+
+
+class TestMergeStreams(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_merge(self):
+        a = RamdiskStorageBackend()
+        a.append_many([(1, 10, 1), (3, 11, 1), (3, 12, 1), (7, 13, 1)])
+        b = RamdiskStorageBackend()
+        b.append_many([(2, 20, 2), (3, 21, 2), (8, 22, 2)])
+
+        self.assertEqual([(1, 'a', 10, 1), (2, 'b', 20, 2), (3, 'a', 11, 1), (3, 'a', 12, 1),
+                          (3, 'b', 21, 2), (7, 'a', 13, 1), (8, 'b', 22, 2)],
+                         list(merge_streams({'a': a, 'b': b})))
+        self.assertEqual([(3, 'b', 21, 2), (3, 'a', 11, 1), (3, 'a', 12, 1)],
+                         list(merge_streams({'b': b, 'a': a}, 3, 7)))
+        self.assertEqual([], list(merge_streams({})))
+
+    def test_files(self):
+        write_trades(self.directory, CsvStorageBackend, 'kraken.btc_usd', [(i * 2, 100, 1) for i in range(1000)])
+        write_trades(self.directory, PackStorageBackend, 'bitstamp.btc_usd', [(i * 3, 200, 2) for i in range(1000)])
+        write_trades(self.directory, PackStorageBackend, 'kraken.eth_usd', [(i, 10, 1) for i in range(10)])
+
+        files = trade_files(self.directory, lambda symbol: 'btc' in symbol)
+        self.assertEqual(['bitstamp.btc_usd', 'kraken.btc_usd'], sorted(files))
+
+        trades = list(merge_streams(files, 100, 1000))
+        self.assertEqual(len([i for i in range(1000) if 100 <= i * 2 < 1000])
+                         + len([i for i in range(1000) if 100 <= i * 3 < 1000]), len(trades))
+        self.assertEqual(sorted(trades, key=lambda row: row[0]), trades)
+        self.assertEqual((100, 'kraken.btc_usd', 100, 1), trades[0])
+
+    def test_partitioned_files(self):
+        write_trades(self.directory, PartitionedStorageBackend, 'kraken.btc_usd',
+                     [(1500000000 + i * 3600, 100, 1) for i in range(100)])
+        write_trades(self.directory, PackStorageBackend, 'bitstamp.btc_usd', [(1500000000, 200, 2)])
+
+        files = trade_files(self.directory)
+        self.assertEqual({'bitstamp.btc_usd': os.path.join(self.directory, 'bitstamp.btc_usd.pack'),
+                          'kraken.btc_usd': os.path.join(self.directory, 'kraken.btc_usd')}, files)
+        self.assertEqual(101, len(list(merge_streams(files))))
+
+    def test_sqlite_is_refused(self):
+        write_trades(self.directory, SqliteStorageBackend, 'kraken.btc_usd', [(1, 100, 1)])
+        with self.assertRaises(ValueError):
+            trade_files(self.directory)
+
+    def test_close_early(self):
+        write_trades(self.directory, PackStorageBackend, 'a', [(i, 1, 1) for i in range(100)])
+        write_trades(self.directory, PackStorageBackend, 'b', [(i, 1, 1) for i in range(100)])
+
+        trades = merge_streams(trade_files(self.directory))
+        self.assertEqual((0, 'a', 1, 1), next(trades))
+        trades.close()
+        # nothing is left open
+        self.assertEqual([], [f for f in os.listdir('/proc/self/fd')
+                              if os.path.realpath(os.path.join('/proc/self/fd', f)).startswith(self.directory)])
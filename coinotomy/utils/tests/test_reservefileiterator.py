@@ -0,0 +1,54 @@
+import io
+import os
+import tempfile
+import unittest
+
+from coinotomy.utils.reservefileiterator import ReserveLineIterator
+
+
+class TestReserveLineIterator(unittest.TestCase):
+
+    def rlines(self, data, blocksize=7):
+        return list(ReserveLineIterator(io.BytesIO(data), b'\n', blocksize))
+
+    def test_empty(self):
+        self.assertEqual([], self.rlines(b''))
+        self.assertEqual([], self.rlines(b'\n\n\n'))
+
+    def test_lines(self):
+        self.assertEqual([b'3', b'2', b'1'], self.rlines(b'1\n2\n3\n'))
+
+    def test_no_trailing_separator(self):
+        self.assertEqual([b'3', b'2', b'1'], self.rlines(b'1\n2\n3'))
+
+    def test_blank_lines_are_skipped(self):
+        self.assertEqual([b'2', b'1'], self.rlines(b'\n1\n\n\n\n2\n\n'))
+
+    def test_many_blank_lines(self):
+        # used to recurse once per blank line
+        self.assertEqual([b'2', b'1'], self.rlines(b'1\n' + b'\n' * 100000 + b'2\n', blocksize=16))
+
+    def test_line_spanning_blocks(self):
+        long = b'x' * 1000
+        self.assertEqual([b'b', long, b'a'], self.rlines(b'a\n' + long + b'\nb\n', blocksize=10))
+        self.assertEqual([long], self.rlines(long, blocksize=10))
+
+    def test_every_blocksize(self):
+        data = b'1,2,3\n44,55,66\n\n777,888,999\n'
+        expected = [b'777,888,999', b'44,55,66', b'1,2,3']
+        for blocksize in range(1, len(data) + 2):
+            self.assertEqual(expected, self.rlines(data, blocksize))
+
+    def test_batches(self):
+        batches = list(ReserveLineIterator(io.BytesIO(b'1\n2\n3\n4\n'), b'\n', 4).batches())
+        self.assertEqual([[b'4'], [b'3', b'2'], [b'1']], batches)
+
+    def test_mmap(self):
+        with tempfile.NamedTemporaryFile(delete=False) as fd:
+            fd.write(b''.join(b'%i\n' % i for i in range(10000)))
+        try:
+            with open(fd.name, 'rb') as fd:
+                lines = list(ReserveLineIterator(fd, b'\n'))
+            self.assertEqual([b'%i' % i for i in range(10000)][::-1], lines)
+        finally:
+            os.unlink(fd.name)
@@ -0,0 +1,60 @@
+import functools
+import operator
+import shutil
+import tempfile
+import unittest
+
+from coinotomy.backend.csvbackend import CsvStorageBackend
+from coinotomy.backend.packbackend import PackStorageBackend
+from coinotomy.backend.partitionedbackend import PartitionedStorageBackend
+from coinotomy.backend.tests.test_backend_common import write_trades
+from coinotomy.utils.scan import DAY, ScanError, daily_volume, gaps, monotonic_errors, scan
+
+
+def count(symbol, reader):
+    return sum(1 for row in reader.lines())
+
+
+def broken(symbol, reader):
+    if symbol == 'b':
+        raise ValueError("broken")
+    return 1
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        write_trades(self.directory, CsvStorageBackend, 'a', [(i * 600, 1, 1) for i in range(300)])
+        write_trades(self.directory, PackStorageBackend, 'b', [(0, 1, 2), (5000, 1, 2), (4000, 1, 2)])
+        write_trades(self.directory, PackStorageBackend, 'c', [])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_results(self):
+        self.assertEqual({'a': 300, 'b': 3, 'c': 0}, scan(self.directory, count, workers=2))
+        self.assertEqual({'a': 300}, scan(self.directory, count, workers=2, select=lambda symbol: symbol == 'a'))
+
+    def test_reducer(self):
+        self.assertEqual(303, scan(self.directory, count, operator.add, initial=0, workers=2))
+        self.assertEqual(1, scan(self.directory, monotonic_errors, operator.add, initial=0, workers=2))
+
+    def test_per_file_functions(self):
+        volumes = scan(self.directory, daily_volume, workers=2)
+        self.assertEqual({0: 144, DAY: 144, 2 * DAY: 12}, volumes['a'])
+        self.assertEqual({0: 6}, volumes['b'])
+
+        found = scan(self.directory, functools.partial(gaps, min_gap=1000), workers=2)
+        self.assertEqual({'a': [], 'b': [(0, 5000)], 'c': []}, found)
+
+    def test_partitioned(self):
+        write_trades(self.directory, PartitionedStorageBackend, 'd', [(i * 3600, 1, 1) for i in range(100)])
+
+        self.assertEqual(100, scan(self.directory, count, workers=2)['d'])
+        volumes = scan(self.directory, daily_volume, workers=2, select=lambda symbol: symbol == 'd')['d']
+        self.assertEqual({0: 24, DAY: 24, 2 * DAY: 24, 3 * DAY: 24, 4 * DAY: 4}, volumes)
+
+    def test_failure(self):
+        with self.assertRaises(ScanError):
+            scan(self.directory, broken, workers=2)
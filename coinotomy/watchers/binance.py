@@ -30,16 +30,23 @@ class WatcherBinance(Watcher):
     def setup(self, backend):
         self.backend = backend
 
-        # inefficient
+        state = self.backend.load_state()
+        if state is not None:
+            self.newest_tid = state['newest_tid']
+            return
+
+        # no checkpoint, count the trades in the backend. inefficient
         self.newest_tid = 0
         for line in self.backend.lines():
             self.newest_tid += 1
 
+    def state(self):
+        return {'newest_tid': self.newest_tid}
+
     def tick(self):
         trades, self.newest_tid = self.api.more_since_tid(self.newest_tid)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) == MAX_TRADES:
             self.interval = FAST_TIMEOUT
@@ -1,6 +1,7 @@
 import urllib.request
 import json
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 from coinotomy.utils.ticketsystem import TicketSystem
 
@@ -11,6 +12,7 @@ TRADES_TO_QUERY = 1000
 MIN_TRADES_FOR_FAST_TIMEOUT = 950
 
 class WatcherBitfinex(Watcher):
+    dedup_window = DEDUP_WINDOW
     ticket_system = TicketSystem(5)
 
     def __init__(self, name: str, symbol:str):
@@ -33,7 +35,7 @@ class WatcherBitfinex(Watcher):
             self.newest_timestamp = 0
             self.newest_tid = 0
         else:
-            self.newest_timestamp = last_trade[0] + 0.001
+            self.newest_timestamp = last_trade[0]
             self.newest_tid = 0
 
     def tick(self):
@@ -44,8 +46,7 @@ class WatcherBitfinex(Watcher):
         else:
             self.interval = NORMAL_TIMEOUT
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
     def unload(self):
         if self.backend:
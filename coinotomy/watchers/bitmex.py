@@ -3,6 +3,7 @@ import json
 from dateutil import parser
 import datetime
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 from coinotomy.utils.ticketsystem import TicketSystem
 
@@ -16,6 +17,7 @@ MANY_TRADES = 200
 EPOCH = 1483228800
 
 class WatcherBitmex(Watcher):
+    dedup_window = DEDUP_WINDOW
     ticket_system = TicketSystem(1.01)
 
     def __init__(self, name: str, symbol: str):
@@ -32,15 +34,14 @@ class WatcherBitmex(Watcher):
 
         self.newest_ts = EPOCH
         for line in self.backend.rlines():
-            self.newest_ts = line[0] + 0.001
+            self.newest_ts = line[0]
             break
 
     def tick(self):
         self.interval = NORMAL_TIMEOUT
         trades, self.newest_ts, self.newest_tid = self.api.more_since_ts_and_tid(self.newest_ts, self.newest_tid)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) >= MANY_TRADES:
             self.interval = FAST_TIMEOUT
@@ -1,6 +1,7 @@
 import requests
 import json
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 
 MAX_LIMIT = 5000
@@ -9,6 +10,7 @@ FAST_TIMEOUT = 1
 
 
 class WatcherBtcc(Watcher):
+    dedup_window = DEDUP_WINDOW
     def __init__(self, name: str):
         Watcher.__init__(self, "btcc." + name, 2*60)
 
@@ -41,8 +43,7 @@ class WatcherBtcc(Watcher):
             trades, self.newest_tid = self.api.more_since_timestamp(self.newest_timestamp)
             trades = list(filter(lambda row: row[0] >= self.newest_timestamp, trades))
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) == MAX_LIMIT:
             self.interval = FAST_TIMEOUT
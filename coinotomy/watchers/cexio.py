@@ -18,7 +18,13 @@ class WatcherCexio(Watcher):
     def setup(self, backend):
         self.backend = backend
 
-        # count the amount of trades in the backend.
+        state = self.backend.load_state()
+        if state is not None:
+            self.newest_timestamp = state['newest_timestamp']
+            self.newest_tid = state['newest_tid']
+            return
+
+        # no checkpoint, count the amount of trades in the backend.
         # and find the last timestamp
         last_trade = None
         n_trades = 0
@@ -39,6 +45,9 @@ class WatcherCexio(Watcher):
             # then do additional filtering in tick() with the newest_timestamp
             self.newest_tid = n_trades
 
+    def state(self):
+        return {'newest_timestamp': self.newest_timestamp, 'newest_tid': self.newest_tid}
+
     def tick(self):
         # trades filtered by api
         trades, newest_tid = self.api.more_since_tid(self.newest_tid)
@@ -46,8 +55,7 @@ class WatcherCexio(Watcher):
             self.newest_tid = newest_tid
         trades = list(filter(lambda row: row[0] > self.newest_timestamp, trades))
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) == MAX_LIMIT:
             self.interval = FAST_TIMEOUT
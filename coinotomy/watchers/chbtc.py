@@ -1,10 +1,12 @@
 import json
 import urllib.request
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 
 
 class WatcherChbtc(Watcher):
+    dedup_window = DEDUP_WINDOW
     def __init__(self, name):
         Watcher.__init__(self, "chbtc." + name, 10)
 
@@ -31,7 +33,7 @@ class WatcherChbtc(Watcher):
             self.newest_timestamp = 0
             self.newest_tid = 0
         else:
-            self.newest_timestamp = last_trade[0] + 0.0001
+            self.newest_timestamp = last_trade[0]
             self.newest_tid = 0
 
     def tick(self):
@@ -43,9 +45,7 @@ class WatcherChbtc(Watcher):
             trades, self.newest_tid = self.api.more()
             trades = list(filter(lambda row: row[0] >= self.newest_timestamp, trades))
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
     def unload(self):
         if self.backend:
@@ -1,6 +1,7 @@
 import urllib.request
 import json
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 import dateutil.parser
 import datetime
@@ -8,6 +9,7 @@ import pytz
 
 
 class WatcherCoincheck(Watcher):
+    dedup_window = DEDUP_WINDOW
     def __init__(self, name: str):
         Watcher.__init__(self, "coincheck." + name, 10)
 
@@ -28,7 +30,7 @@ class WatcherCoincheck(Watcher):
             self.newest_timestamp = 0
             self.newest_tid = 0
         else:
-            self.newest_timestamp = last_trade[0] + 0.0001
+            self.newest_timestamp = last_trade[0]
             self.newest_tid = 0
 
     def tick(self):
@@ -40,9 +42,7 @@ class WatcherCoincheck(Watcher):
             trades, self.newest_tid = self.api.more()
             trades = list(filter(lambda row: row[0] >= self.newest_timestamp, trades))
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
     def unload(self):
         if self.backend:
@@ -1,11 +1,13 @@
 import urllib.request
 import json
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 
 NORMAL_TIMEOUT = 60*5
 
 class WatcherCoinfloor(Watcher):
+    dedup_window = DEDUP_WINDOW
     def __init__(self, name: str, symbol: str):
         Watcher.__init__(self, "coinfloor." + name, NORMAL_TIMEOUT)
 
@@ -26,7 +28,7 @@ class WatcherCoinfloor(Watcher):
             self.newest_timestamp = 0
             self.newest_tid = 0
         else:
-            self.newest_timestamp = last_trade[0] + 0.0001
+            self.newest_timestamp = last_trade[0]
             self.newest_tid = 0
 
     def tick(self):
@@ -38,9 +40,7 @@ class WatcherCoinfloor(Watcher):
             trades, self.newest_tid = self.api.more()
             trades = list(filter(lambda row: row[0] >= self.newest_timestamp, trades))
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
     def unload(self):
         if self.backend:
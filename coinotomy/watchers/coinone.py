@@ -30,9 +30,7 @@ class WatcherCoinone(Watcher):
     def tick(self):
         trades, self.newest_ts = self.api.more(self.newest_ts)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
     def unload(self):
         if self.backend:
@@ -1,8 +1,16 @@
+import functools
 import logging
 import time
 
+from coinotomy.backend.dedup import DedupBackend
+from coinotomy.backend.pubsub import BUS, PublishingBackend
+
 
 class Watcher(object):
+    # watchers that resume from a timestamp and may fetch stored trades again
+    # set this to DEDUP_WINDOW, see DedupBackend
+    dedup_window = 0
+
     def __init__(self, name, interval):
         self.name = name
         self.log = logging.getLogger(name)
@@ -14,20 +22,41 @@ class Watcher(object):
     def name(self):
         return self.name
 
-    def run(self, backend):
+    def run(self, backend, coverage=None, bus=BUS):
         self.log.info("starting")
+        # appended trades are also delivered to the subscribers of bus, after deduplication
+        backend = PublishingBackend(backend, bus, self.name)
+        if self.dedup_window:
+            backend = DedupBackend(backend, self.dedup_window)
         self.setup(backend)
 
         first = True
+        # start of the range collected by the current chain of successful ticks
+        covered_from = None
         while True:
             try:
                 self.wait(first)
+                started = time.time()
+                if covered_from is None:
+                    covered_from = self.covered_until(started)
                 self.tick()
+                backend.save_state(self.state())
                 backend.flush()
+                if coverage is not None:
+                    covered_until = self.covered_until(started)
+                    extend = functools.partial(_extend, coverage, covered_from, covered_until)
+                    # the range is only marked once its trades are on disk, see GroupCommitBackend
+                    when_committed = getattr(backend, 'when_committed', None)
+                    if when_committed is None:
+                        extend()
+                    else:
+                        when_committed(extend)
+                    covered_from = covered_until
             except (KeyboardInterrupt, InterruptedError):
                 backend.flush()
             except:
                 self.log.exception("Exception while processing tick")
+                covered_from = None
             first = False
 
         self.log.info("gracefully shutting down")
@@ -42,6 +71,30 @@ class Watcher(object):
     def unload(self):
         raise NotImplementedError()
 
+    def state(self):
+        """
+        return a json-serializable dict from which setup() can resume, or None.
+
+        The state is checkpointed by the backend after every tick.
+        """
+        return None
+
+    def covered_until(self, started):
+        """
+        return the timestamp before which all trades have been fetched, called
+        before the first tick and after every successful tick.
+
+        started is the time at which the tick started. Watchers that poll the
+        most recent trades have them all up to that moment; watchers that page
+        through history should return their position instead.
+        """
+        return started
+
     def wait(self, first):
         if not first:
             time.sleep(self.interval)
+
+
+def _extend(coverage, start, end):
+    coverage.add(start, end)
+    coverage.flush()
@@ -15,15 +15,22 @@ class WatcherGdax(Watcher):
     def setup(self, backend):
         self.backend = backend
 
-        # determine the last tid, which is just the number of trades.
+        state = self.backend.load_state()
+        if state is not None:
+            self.last_tid = state['last_tid']
+            return
+
+        # no checkpoint, determine the last tid, which is just the number of trades.
         self.last_tid = sum(1 for _ in self.backend.lines())
 
+    def state(self):
+        return {'last_tid': self.last_tid}
+
     def tick(self):
         # trades filtered by api
         trades, self.last_tid = self.api.more(self.last_tid)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) == self.api.MAX_TRADES:
             self.interval = 1
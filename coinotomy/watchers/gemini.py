@@ -52,9 +52,7 @@ class WatcherGemini(Watcher):
         trades, self.newest_timestamp, self.newest_tid, fast_retry = \
             self.api.more_ts(self.newest_timestamp, self.newest_tid)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
         if fast_retry:
             self.interval = NORMAL_TIMEOUT
@@ -2,6 +2,7 @@ import json
 import urllib.request
 
 from coinotomy.utils.ticketsystem import TicketSystem
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 
 NORMAL_TIMEOUT = 1
@@ -9,6 +10,7 @@ SLOW_TIMEOUT = 10*60
 
 
 class WatcherHitbtc(Watcher):
+    dedup_window = DEDUP_WINDOW
     # share rate limiting between all hitbtc instances
     ticket_system = TicketSystem(NORMAL_TIMEOUT)
 
@@ -38,7 +40,7 @@ class WatcherHitbtc(Watcher):
             self.newest_timestamp = 0
             self.newest_tid = 0
         else:
-            self.newest_timestamp = last_trade[0] + 0.0001
+            self.newest_timestamp = last_trade[0]
             self.newest_tid = 0
 
     def tick(self):
@@ -49,9 +51,7 @@ class WatcherHitbtc(Watcher):
         else:
             trades, self.newest_tid = self.api.more_ts(self.newest_timestamp)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
         if len(trades) == HitbtcApi.MAX_TRADES:
             self.interval = NORMAL_TIMEOUT
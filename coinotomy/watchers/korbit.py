@@ -18,19 +18,25 @@ class WatcherKorbit(Watcher):
     def setup(self, backend):
         self.backend = backend
 
-        # find the number of trades in the backend
+        state = self.backend.load_state()
+        if state is not None:
+            self.newest_tid = state['newest_tid']
+            return
+
+        # no checkpoint, find the number of trades in the backend
         self.newest_tid = 0
         for trade in self.backend.lines():
             self.newest_tid += 1
 
+    def state(self):
+        return {'newest_tid': self.newest_tid}
+
     def tick(self):
         self.interval = NORMAL_TIMEOUT
         trades, self.newest_tid = self.api.more(self.newest_tid)
 
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
         if len(trades) and trades[0][0] <= (time.time() - 60*60):
             self.interval = FAST_TIMEOUT
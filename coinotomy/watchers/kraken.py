@@ -18,23 +18,31 @@ class WatcherKraken(Watcher):
 
         self.backend = None
         self.api = KrakenAPI(symbol, self.log)
-        self.newest_timestamp = 0
+        self.last = 0  # the api's 'last' cursor, in ns
 
     def setup(self, backend):
         self.backend = backend
 
-        # determine the timestamp of the last trade
-        self.newest_timestamp = 0
+        # resume from the exact 'last' cursor returned by the api
+        state = self.backend.load_state()
+        if state is not None and 'last' in state:
+            self.last = state['last']
+            return
+
+        # no checkpoint, start from the timestamp of the last trade
+        self.last = 0
         for trade in self.backend.rlines():
-            self.newest_timestamp = trade[0]
+            self.last = int(trade[0] * 1000 * 1000 * 1000)  # seconds to ns
             break
 
+    def state(self):
+        return {'last': self.last}
+
     def tick(self):
         # trades filtered by api
-        trades, self.newest_timestamp = self.api.more_since_ts(self.newest_timestamp)
+        trades, self.last = self.api.more_since(self.last)
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) == MAX_LIMIT:
             self.interval = NORMAL_TIMEOUT
@@ -61,8 +69,14 @@ class KrakenAPI(object):
     }
 
     def more_since_ts(self, since_ts):
-        url = self.URL_SINCE_TS.format(pair=self.symbol,
-                                       since=int(since_ts * 1000 * 1000 * 1000))  # seconds to ns
+        trades, last = self.more_since(int(since_ts * 1000 * 1000 * 1000))  # seconds to ns
+        return trades, last / 1000 / 1000 / 1000  # ns to seconds
+
+    def more_since(self, last):
+        """
+        return (array_of_trades, last) for the trades after the 'last' cursor, in ns
+        """
+        url = self.URL_SINCE_TS.format(pair=self.symbol, since=last)
         html = self._query(url)
         return self._parse_response(html)
 
@@ -73,7 +87,7 @@ class KrakenAPI(object):
 
     def _parse_response(self, html):
         """
-        return (array_of_trades, newest_tid)
+        return (array_of_trades, last)
         """
         js = json.loads(html)
         trades = []
@@ -84,7 +98,7 @@ class KrakenAPI(object):
             ts = float(row[2])
             trades.append((ts, price, amount))
 
-        return trades, float(js["result"]["last"]) / 1000 / 1000 / 1000  # ns to seconds
+        return trades, int(js["result"]["last"])
 
 
 watchers = [
@@ -1,5 +1,6 @@
 import requests
 
+from coinotomy.backend.dedup import DEDUP_WINDOW
 from coinotomy.watchers.common import Watcher
 
 NORMAL_TIMEOUT_INT = 30
@@ -9,6 +10,7 @@ TYPE_CN = 1
 TYPE_INT = 2
 
 class WatcherOkcoin(Watcher):
+    dedup_window = DEDUP_WINDOW
     def __init__(self, name: str, type, symbol: str):
         if type == TYPE_INT:
             Watcher.__init__(self, "okcoin." + name, NORMAL_TIMEOUT_INT)
@@ -32,7 +34,7 @@ class WatcherOkcoin(Watcher):
             self.newest_timestamp = 0
             self.newest_tid = 0
         else:
-            self.newest_timestamp = last_trade[0] + 0.0001
+            self.newest_timestamp = last_trade[0]
             self.newest_tid = 0
 
     def tick(self):
@@ -44,9 +46,7 @@ class WatcherOkcoin(Watcher):
             trades, self.newest_tid = self.api.more()
             trades = list(filter(lambda row: row[0] >= self.newest_timestamp, trades))
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
-        self.backend.flush()
+        self.backend.append_many(trades)
 
     def unload(self):
         if self.backend:
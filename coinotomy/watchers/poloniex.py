@@ -60,8 +60,13 @@ class WatcherPoloniex(Watcher):
                 self.newest_timestamp = trades[-1][0]
             self.interval = NORMAL_TIMEOUT
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
+
+    def covered_until(self, started):
+        if self.interval == FAST_TIMEOUT:
+            # still catching up, the windows before newest_timestamp are complete
+            return self.newest_timestamp
+        return started
 
     def unload(self):
         if self.backend:
@@ -43,7 +43,7 @@ class TestWatcherKraken(unittest.TestCase):
                       (1381311093.9123, 124.01687, 1.0),
                       (1381311094.4288, 123.84, 0.823),
                       (1381431835.1776, 125.85, 1.0)]
-    EXPECTED_NEWEST_TS = 1383581942.406609
+    EXPECTED_LAST = 1383581942406609135
 
     def setUp(self):
         self.backend = RamdiskStorageBackend()
@@ -54,9 +54,25 @@ class TestWatcherKraken(unittest.TestCase):
         del self.api
 
     def test_parse(self):
-        trades, newest_ts = self.api._parse_response(self.SAMPLE_RESPONSE)
+        trades, last = self.api._parse_response(self.SAMPLE_RESPONSE)
         self.assertEqual(trades, self.EXPECTED_PARSE)
-        self.assertEqual(newest_ts, self.EXPECTED_NEWEST_TS)
+        self.assertEqual(last, self.EXPECTED_LAST)
+
+    def test_setup_from_checkpoint(self):
+        self.backend.append_many(self.EXPECTED_PARSE)
+        self.backend.save_state({'last': self.EXPECTED_LAST})
+        self.backend.flush()
+
+        # the cursor is passed back unchanged
+        self.watcher.setup(self.backend)
+        self.assertEqual(self.EXPECTED_LAST, self.watcher.last)
+        self.assertEqual({'last': self.EXPECTED_LAST}, self.watcher.state())
+
+    def test_setup_without_checkpoint(self):
+        self.backend.append_many(self.EXPECTED_PARSE)
+
+        self.watcher.setup(self.backend)
+        self.assertEqual(int(self.EXPECTED_PARSE[-1][0] * 1000 * 1000 * 1000), self.watcher.last)
 
     def test_network_since_ts_0(self):
         trades, newest_ts = self.api.more_since_ts(0)
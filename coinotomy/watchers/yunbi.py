@@ -21,10 +21,17 @@ class WatcherYunbi(Watcher):
     def setup(self, backend):
         self.backend = backend
 
-        # find the last timestamp
+        state = self.backend.load_state()
+        if state is not None:
+            self.newest_timestamp = state['newest_timestamp']
+            self.newest_tid = state['newest_tid']
+            return
+
+        # no checkpoint, find the last timestamp
         last_trade = None
-        for trade in self.backend.lines():
+        for trade in self.backend.rlines():
             last_trade = trade
+            break
 
         # determine the timestamp of the last trade
         if last_trade is None:
@@ -34,6 +41,9 @@ class WatcherYunbi(Watcher):
             self.newest_timestamp = last_trade[0]
             self.newest_tid = None
 
+    def state(self):
+        return {'newest_timestamp': self.newest_timestamp, 'newest_tid': self.newest_tid}
+
     def tick(self):
         # if we don't have the newest td yet, do an request to find what the newest tid is
         # then wait for the next iteration
@@ -46,8 +56,7 @@ class WatcherYunbi(Watcher):
                 return
             self.newest_tid = newest_tid
 
-        for ts, p, v in trades:
-            self.backend.append(ts, p, v)
+        self.backend.append_many(trades)
 
         if len(trades) == MAX_LIMIT:
             self.interval = FAST_TIMEOUT
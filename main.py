@@ -5,6 +5,13 @@ import os
 
 from threading import Thread
 
+from coinotomy.backend import coverage, filepool, prefixsum
+from coinotomy.backend.candles import CandleBackend
+from coinotomy.backend.groupcommit import GroupCommitter, POLICY_TICK
+from coinotomy.backend.owner import OwnerLock
+from coinotomy.backend.sharedring import SharedRingBackend
+from coinotomy.backend.sketches import PRICE_TICK, SketchBackend
+from coinotomy.config import config
 from coinotomy.config.config import STORAGE_CLASS, STORAGE_DIRECTORY, WATCHERS
 
 
@@ -17,9 +24,30 @@ logging.basicConfig(filename=os.path.join(STORAGE_DIRECTORY, 'log.txt'),
 # disable logging for requests module
 logging.getLogger("requests").setLevel(logging.WARNING)
 
+# settings missing from older config files fall back to flushing after every tick
+committer = GroupCommitter(policy=getattr(config, 'FLUSH_POLICY', POLICY_TICK),
+                           interval=getattr(config, 'FLUSH_INTERVAL', 0.5),
+                           max_rows=getattr(config, 'FLUSH_ROWS', 10000),
+                           fsync=getattr(config, 'FSYNC', False))
+shared_ring_capacity = getattr(config, 'SHARED_RING_CAPACITY', 0)
+filepool.POOL.max_open = getattr(config, 'MAX_OPEN_FILES', filepool.MAX_OPEN_FILES)
+prefixsum.ENABLED = getattr(config, 'PREFIX_SUMS', False)
+
 def launch_worker(watcher):
-    backend = STORAGE_CLASS(os.path.join(STORAGE_DIRECTORY, watcher.name))
-    watcher.run(backend)
+    name = os.path.join(STORAGE_DIRECTORY, watcher.name)
+    # held while the watcher runs, waits for a conversion of the files to finish
+    OwnerLock(name).acquire()
+    backend = STORAGE_CLASS(name)
+    if getattr(config, 'CANDLES', False):
+        backend = CandleBackend(backend, name)
+    if getattr(config, 'SKETCHES', False):
+        tick = getattr(config, 'SKETCH_PRICE_TICKS', {}).get(watcher.name,
+                                                            getattr(config, 'SKETCH_PRICE_TICK', PRICE_TICK))
+        backend = SketchBackend(backend, name, tick=tick)
+    backend = committer.wrap(backend)
+    if shared_ring_capacity:
+        backend = SharedRingBackend(backend, watcher.name, shared_ring_capacity)
+    watcher.run(backend, coverage.load(name))
 
 
 def main():